@@ -0,0 +1,462 @@
+"""ASGI serving mode: the main endpoints on FastAPI with non-blocking I/O
+
+    python asgi_server.py
+    uvicorn asgi_server:app --host 0.0.0.0 --port 8000
+
+/generate, /regenerate-title, /regenerate-category, /confirm-post,
+/blacklist and /health answer with the same JSON as remote-server.py, but
+page downloads and Ollama calls go through httpx on the event loop, so a
+request waiting on the model holds a coroutine instead of a thread. HTML
+parsing and disk access run on the stage pool and publishing on the
+publish pool. Every other endpoint is served by the Flask app, mounted
+underneath. Configuration, caches and backend limits are the ones
+remote-server.py sets up.
+"""
+import asyncio
+import contextvars
+import functools
+import importlib.util
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.wsgi import WSGIMiddleware
+
+from http_clients import close_async_clients, get_async_client
+from llm_stream import aread_json_object
+from metrics import CACHE_REQUESTS, ERRORS, REQUEST_SECONDS, STAGE_SECONDS, observe_llm_response
+from page_ingest import PageReader, UnsupportedContent
+from single_flight import AsyncSingleFlight
+from stage_graph import deadline_scope
+
+
+def load_remote_server():
+    """Import remote-server.py, whose file name isn't a valid module name"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'remote-server.py')
+    spec = importlib.util.spec_from_file_location('remote_server', path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules['remote_server'] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+server = load_remote_server()
+logger = logging.getLogger('asgi_server')
+MODEL_NAME = server.MODEL_NAME
+
+generate_flights = AsyncSingleFlight()
+summary_flights = AsyncSingleFlight()
+_server_timings = contextvars.ContextVar('server_timings', default=None)
+
+
+async def run_in(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Keep the request's context (Server-Timing) in the worker thread
+    call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+def run_sync(fn, *args, **kwargs):
+    """Run blocking work (parsing, disk access) on the stage pool, off the event loop"""
+    return run_in(server.stage_executor, fn, *args, **kwargs)
+
+
+def note_timing(name, seconds):
+    timings = _server_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + seconds
+
+
+@contextmanager
+def timed_stage(stage):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        note_timing(stage, elapsed)
+
+
+async def run_stage(name, awaitable, timeout, fallback, timings):
+    """Await one pipeline stage under StageGraph's timeout, fallback and timing rules
+
+    Unlike a timed-out thread, a timed-out coroutine is cancelled, which
+    closes its Ollama connection and frees the backend slot.
+    """
+    started = time.monotonic()
+    try:
+        # Blocking work the stage hands to threads (pre-summaries) stops at the same deadline
+        with deadline_scope(started + timeout if timeout else None):
+            value = await asyncio.wait_for(awaitable, timeout)
+        status = 'ok'
+    except asyncio.TimeoutError:
+        logger.warning("Stage timed out, using fallback", extra={'stage': name, 'timeout_s': timeout})
+        value, status = fallback, 'timeout'
+    except Exception as e:
+        logger.warning("Stage failed, using fallback", extra={'stage': name, 'error': str(e)})
+        value, status = fallback, 'error'
+    timings[name] = {'ms': round((time.monotonic() - started) * 1000, 1), 'status': status}
+    if status != 'ok':
+        ERRORS.inc(stage=name, kind=status)
+    return value
+
+
+async def resolved(value):
+    return value
+
+
+async def admit_fetch(url, domain):
+    """server.admit_fetch, waiting out the domain's rate limit without blocking the loop"""
+    allowed, reason, wait = server.domain_health.reserve(domain)
+    if not allowed:
+        server.record_fetch_refused(url, reason)
+        return False
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return True
+
+
+async def fetch_page(url):
+    """Download a page once and parse it into a PageResult"""
+    page_cache = server.page_cache
+    cached = await run_sync(page_cache.get, url)
+    if cached and page_cache.is_fresh(cached):
+        CACHE_REQUESTS.inc(cache='page', result='hit')
+        return page_cache.to_page(cached)
+
+    domain = server.get_domain_from_url(url)
+    if not await admit_fetch(url, domain):
+        return None
+    try:
+        headers = page_cache.conditional_headers(cached) if cached else {}
+        with timed_stage('fetch'):
+            async with get_async_client('source').stream('GET', url, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    CACHE_REQUESTS.inc(cache='page', result='revalidated')
+                    server.record_fetch_success(domain)
+                    await run_sync(page_cache.touch, url, cached)
+                    return page_cache.to_page(cached)
+                CACHE_REQUESTS.inc(cache='page', result='miss')
+                response.raise_for_status()
+                reader = await read_page(url, response)
+        with timed_stage('parse'):
+            page = await run_sync(reader.page)
+        server.record_fetch_success(domain)
+
+        await run_sync(
+            server.store_page,
+            url,
+            page,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+
+        return page
+    except httpx.HTTPStatusError as e:
+        server.record_http_error(url, domain, e.response.status_code, e.response.headers.get('Retry-After'), e)
+        return None
+    except UnsupportedContent as e:
+        server.record_unsupported_content(url, domain, e)
+        return None
+    except Exception as e:
+        server.record_fetch_error(url, domain, e)
+        return None
+
+
+async def read_page(url, response):
+    """read_page for an httpx stream; decoding a chunk is quick enough for the loop"""
+    reader = PageReader(url, response.headers.get('Content-Type'), server.PAGE_MAX_BYTES)
+    async for chunk in response.aiter_bytes(server.PAGE_CHUNK_BYTES):
+        if not reader.feed(chunk):
+            break
+    reader.close()
+    if reader.truncated:
+        logger.info("Page truncated", extra={'url': url, 'max_bytes': server.PAGE_MAX_BYTES})
+    return reader
+
+
+async def get_webui_content(model_name, input_source=None, is_url=False, page=None):
+    try:
+        if is_url:
+            # Fitting a long article to the context can pre-summarize it, which blocks
+            prompt, error = await run_sync(server.build_post_prompt, input_source, is_url=True, page=page)
+        else:
+            prompt, error = server.build_post_prompt(input_source)
+        if error:
+            return error
+        payload = server.build_post_payload(model_name, prompt)
+        with timed_stage('generate'):
+            async with server.llm_router.achat(payload, get_async_client('llm')) as response:
+                response.raise_for_status()
+                result = response.json()
+        return server.post_from_result(result)
+    except Exception as e:
+        ERRORS.inc(stage='generate', kind='error')
+        logger.error("Error getting content from OpenWebUI", extra={'error': str(e)})
+        return f"Error generating content: {str(e)}. Please try again."
+
+
+async def request_summary(model_name, content):
+    """Ask the model for a summary JSON string, or None when it fails"""
+    try:
+        payload = server.build_summary_payload(model_name, content)
+        with timed_stage('summarize'):
+            async with server.llm_router.achat(payload, get_async_client('llm'), stream=True) as response:
+                response.raise_for_status()
+                # Leaving the block closes the stream, which stops the generation
+                found_json, cleaned_content = await aread_json_object(
+                    response, on_done=lambda data: observe_llm_response('summary', data)
+                )
+        return server.summary_from_answer(found_json, cleaned_content)
+    except Exception as e:
+        ERRORS.inc(stage='summarize', kind='error')
+        logger.error("Error getting summary from OpenWebUI", extra={'error': str(e)})
+        return None
+
+
+async def get_summary_of_webui_content(model_name, content, force_fresh=False, fresh_field=None):
+    """Summary JSON for content, memoized and coalesced like remote-server's"""
+    if not content:
+        return server.default_summary_json()
+
+    key = server.summary_cache.make_key(model_name, content, server.PROFILES['summary'])
+    if force_fresh:
+        summary_json = await request_summary(model_name, content)
+    else:
+        cached = server.cached_summary(key)
+        if cached:
+            return cached
+        summary_json, shared = await summary_flights.do(key, request_summary, model_name, content)
+        if shared:
+            CACHE_REQUESTS.inc(cache='summary', result='coalesced')
+            return summary_json or server.default_summary_json()
+    return server.store_summary(model_name, content, key, summary_json, fresh_field)
+
+
+async def regenerate_summary_field(model_name, content, field, force_fresh=True):
+    if force_fresh and content:
+        spare = server.spare_summary(model_name, content, field)
+        if spare:
+            return spare
+    return await get_summary_of_webui_content(model_name, content, force_fresh=force_fresh, fresh_field=field)
+
+
+async def run_generate(prompt=None, url=None, allow_duplicate=False):
+    """Run the fetch -> generate -> summarize pipeline, returning (payload, status)"""
+    if url:
+        # The blacklist may need reloading from SQLite
+        rejection = await run_sync(server.check_url_allowed, url)
+        if rejection:
+            return rejection
+
+    timings = {}
+    page = None
+    meta_image_url = ""
+    if url:
+        page = await run_stage('fetch', fetch_page(url), server.FETCH_STAGE_TIMEOUT, None, timings)
+        meta_image_url = await run_stage(
+            'image', resolved(page.image_url if page else ""), server.IMAGE_STAGE_TIMEOUT, "", timings
+        )
+        if page and not allow_duplicate:
+            match = await run_stage(
+                'dedupe', run_sync(server.find_near_duplicate, page), server.FETCH_STAGE_TIMEOUT, None, timings
+            )
+            if match:
+                response_data = server.near_duplicate_response(match)
+                response_data['timings'] = timings
+                return response_data, 200
+        if page:
+            generating = get_webui_content(MODEL_NAME, url, is_url=True, page=page)
+        else:
+            logger.warning("Failed to fetch URL content", extra={'url': url})
+            generating = resolved(server.FETCH_FAILED_MESSAGE)
+    else:
+        generating = get_webui_content(MODEL_NAME, prompt, is_url=False)
+    content = await run_stage(
+        'generate', generating, server.GENERATE_STAGE_TIMEOUT, server.GENERATE_TIMEOUT_MESSAGE, timings
+    )
+
+    if content and not content.startswith(server.GENERATION_ERROR_PREFIXES):
+        summarizing = get_summary_of_webui_content(MODEL_NAME, content)
+    else:
+        summarizing = resolved(server.default_summary_json())
+    summary_json = await run_stage(
+        'summarize', summarizing, server.SUMMARY_STAGE_TIMEOUT, server.default_summary_json(), timings
+    )
+    return await run_sync(server.finish_generate, prompt, url, page, content, meta_image_url, summary_json, timings)
+
+
+async def read_json(request):
+    """The request's JSON body, or None when it has none"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await close_async_clients()
+
+
+app = FastAPI(title='AI Blog Generator', lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+
+
+@app.middleware('http')
+async def record_request(request, call_next):
+    started = time.monotonic()
+    timings = {}
+    token = _server_timings.set(timings)
+    try:
+        response = await call_next(request)
+    finally:
+        _server_timings.reset(token)
+    endpoint = getattr(request.scope.get('endpoint'), '__name__', None)
+    if endpoint is None:
+        # Served by the mounted Flask app, which records its own requests
+        return response
+    elapsed = time.monotonic() - started
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=response.status_code)
+    logger.info("Request handled", extra={
+        'method': request.method,
+        'path': request.url.path,
+        'status': response.status_code,
+        'ms': round(elapsed * 1000, 1)
+    })
+    if server.TIMING_HEADERS:
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers['Server-Timing'] = ', '.join(parts)
+    return response
+
+
+@app.post('/generate')
+async def generate(request: Request):
+    """Generate a post; identical concurrent calls share one run unless "distinct" is set"""
+    try:
+        data = await read_json(request)
+        if not data:
+            return JSONResponse({'error': 'No data provided'}, 400)
+
+        prompt = data.get('prompt')
+        url = data.get('url')
+
+        if not prompt and not url:
+            return JSONResponse({'error': 'Either prompt or url must be provided'}, 400)
+
+        if data.get('distinct'):
+            response_data, status = await run_generate(prompt, url, allow_duplicate=True)
+            return JSONResponse(response_data, status)
+
+        (response_data, status), shared = await generate_flights.do(
+            server.generate_key(MODEL_NAME, prompt, url), run_generate, prompt, url
+        )
+        headers = {}
+        if shared:
+            CACHE_REQUESTS.inc(cache='generate', result='coalesced')
+            headers['X-Coalesced'] = 'true'
+        return JSONResponse(response_data, status, headers=headers)
+
+    except Exception as e:
+        logger.exception("Error in generate endpoint")
+        return JSONResponse({'error': f'Internal server error: {str(e)}'}, 500)
+
+
+@app.post('/regenerate-title')
+async def regenerate_title(request: Request):
+    try:
+        data = await read_json(request) or {}
+        content = data.get('content')
+        if not content:
+            return JSONResponse({'error': 'No content provided'}, 400)
+
+        force_fresh = data.get('force_fresh', False)
+        summary_json = await regenerate_summary_field(MODEL_NAME, content, 'summary', force_fresh=force_fresh)
+        return {'title': server.title_from_summary(summary_json)}
+
+    except Exception as e:
+        logger.exception("Error in regenerate_title endpoint")
+        return JSONResponse({'error': f'Internal server error: {str(e)}'}, 500)
+
+
+@app.post('/regenerate-category')
+async def regenerate_category(request: Request):
+    try:
+        data = await read_json(request) or {}
+        content = data.get('content')
+        if not content:
+            return JSONResponse({'error': 'No content provided'}, 400)
+
+        force_fresh = data.get('force_fresh', False)
+        summary_json = await regenerate_summary_field(MODEL_NAME, content, 'category', force_fresh=force_fresh)
+        return {'category': server.category_from_summary(summary_json)}
+
+    except Exception as e:
+        logger.exception("Error in regenerate_category endpoint")
+        return JSONResponse({'error': f'Internal server error: {str(e)}'}, 500)
+
+
+@app.post('/confirm-post')
+async def confirm_post(request: Request):
+    data = await read_json(request) or {}
+    content = data.get('content')
+    meta_image_url = data.get('meta_image_url', "")
+    title = data.get('title', "")
+    category = data.get('category', "")
+    if not content:
+        return JSONResponse({'error': 'No content provided'}, 400)
+
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    # The WordPress uploader and the publish log block, so this holds one of
+    # the publish pool's threads; WP_MAX_CONCURRENCY caps WordPress anyway
+    post_data, existing = await run_in(
+        server.publish_executor, server.publish_post, content, meta_image_url, title, category, idempotency_key
+    )
+    if not post_data or not post_data.get('link'):
+        return JSONResponse({'error': 'Failed to post to WordPress'}, 500)
+    return {'wordpress_url': post_data['link'], 'existing': existing}
+
+
+@app.get('/blacklist')
+async def get_blacklist_endpoint():
+    """Get current blacklisted domains"""
+    domains = await run_sync(server.load_blacklist)
+    return {
+        'blacklisted_domains': sorted(domains),
+        'count': len(domains),
+        'domain_states': server.domain_health.snapshot()
+    }
+
+
+@app.get('/health')
+async def health():
+    return {
+        'status': 'ok',
+        'message': 'Python server is running',
+        'llm_backends': server.llm_router.snapshot()
+    }
+
+
+# Everything else (/generate-stream, /jobs, /batch, /bulk-publish, /metrics, ...)
+app.mount('/', WSGIMiddleware(server.app))
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Requests are logged by record_request, and uvicorn's own logs go through ours
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=int(os.getenv('REMOTE_SERVER_PORT', '8000')),
+        log_config=None,
+        access_log=False
+    )
@@ -0,0 +1,81 @@
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DomainSlots:
+    """Caps how many fetches may hit the same domain at once"""
+
+    def __init__(self, per_domain):
+        self.per_domain = per_domain
+        self._lock = threading.Lock()
+        self._slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_domain))
+
+    def get(self, domain):
+        with self._lock:
+            return self._slots[domain]
+
+
+def run_pipelined(items, fetch, generate, fetch_workers=8, generate_workers=2, fetch_ahead=None):
+    """Run two-stage items with the stages overlapping, yielding results as they finish
+
+    ``items`` is a list of dicts. Items with a ``url`` go through
+    ``fetch(item)`` on the fetch pool first; ``fetch`` returns either
+    ``(page, None)`` or ``(None, (payload, status))`` to finish the item
+    early. Everything then goes through ``generate(item, page)`` on the
+    generation pool, which returns ``(payload, status)``. Yields
+    ``(index, payload, status)`` in completion order.
+
+    At most ``fetch_ahead`` fetched pages (twice the generation pool by
+    default) are held at once, being fetched, waiting or generating, so a
+    fast fetch pool doesn't pile up pages a slow model can't get to.
+    """
+    results = queue.Queue()
+    ahead = threading.Semaphore(fetch_ahead or 2 * generate_workers)
+    abandoned = threading.Event()
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='batch-fetch')
+    generate_pool = ThreadPoolExecutor(max_workers=generate_workers, thread_name_prefix='batch-generate')
+
+    def run_generate(index, item, page, fetched=False):
+        try:
+            payload, status = generate(item, page)
+        except Exception as e:
+            payload, status = {'error': f'Internal server error: {str(e)}'}, 500
+        finally:
+            if fetched:
+                ahead.release()
+        results.put((index, payload, status))
+
+    def run_fetch(index, item):
+        while not ahead.acquire(timeout=0.5):
+            if abandoned.is_set():
+                return
+        try:
+            page, early = fetch(item)
+        except Exception as e:
+            page, early = None, ({'error': f'Internal server error: {str(e)}'}, 500)
+        if early:
+            ahead.release()
+            results.put((index, early[0], early[1]))
+        else:
+            try:
+                generate_pool.submit(run_generate, index, item, page, fetched=True)
+            except RuntimeError:
+                # The batch was abandoned and the pool shut down
+                ahead.release()
+
+    try:
+        # Prompt items need no fetch, so they can start generating right away
+        for index, item in enumerate(items):
+            if item.get('url'):
+                fetch_pool.submit(run_fetch, index, item)
+            else:
+                generate_pool.submit(run_generate, index, item, None)
+
+        for _ in range(len(items)):
+            yield results.get()
+    finally:
+        abandoned.set()
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        generate_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,77 @@
+"""Deterministic fixture pages for the benchmarks
+
+Pages are generated rather than checked in so the huge ones don't bloat the
+repo. The same seed always gives the same bytes.
+"""
+import random
+
+WORDS = (
+    "the quick brown fox jumps over lazy dog solar panel battery garden coffee "
+    "river mountain city music festival recipe bread oven travel train market "
+    "science ocean robot camera design history museum window winter summer "
+    "bicycle library garden community project weekend family neighbour story"
+).split()
+
+
+def paragraph(rng, sentences=5):
+    out = []
+    for _ in range(sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+        out.append(' '.join(words).capitalize() + '.')
+    return ' '.join(out)
+
+
+def article_page(title, paragraphs, seed=0, image_path='/img/hero.png', boilerplate_links=40):
+    """A news-style page: head metadata, nav/footer boilerplate and an article body"""
+    rng = random.Random(seed)
+    nav = ''.join(f'<li><a href="/section/{i}">Section {i}</a></li>' for i in range(boilerplate_links))
+    body = ''.join(f'<p>{paragraph(rng)}</p>\n' for _ in range(paragraphs))
+    return f"""<!doctype html>
+<html><head>
+<meta charset="utf-8">
+<title>{title}</title>
+<meta property="og:image" content="{image_path}">
+<link rel="canonical" href="/articles/{seed}">
+<style>body {{ font-family: sans-serif; }}</style>
+<script>window.analytics = {{ id: {seed} }};</script>
+</head><body>
+<header><nav><ul>{nav}</ul></nav></header>
+<main><article><h1>{title}</h1>
+{body}</article></main>
+<aside><ul>{nav}</ul></aside>
+<footer><p>Copyright. All rights reserved.</p><ul>{nav}</ul></footer>
+</body></html>""".encode('utf-8')
+
+
+def small_page(seed=0):
+    return article_page(f"Small page {seed}", paragraphs=6, seed=seed)
+
+
+def huge_page(seed=0, target_bytes=3 * 1024 * 1024):
+    """A page of roughly target_bytes, mostly article text"""
+    rng = random.Random(seed)
+    one = len(paragraph(rng)) + 8
+    return article_page(f"Huge page {seed}", paragraphs=max(1, target_bytes // one), seed=seed)
+
+
+def summary_text(seed=0, paragraphs=4):
+    """Plain text shaped like a generated post, for the regenerate/confirm endpoints"""
+    rng = random.Random(seed)
+    return '\n\n'.join(paragraph(rng) for _ in range(paragraphs))
+
+
+def png_image(width=1200, height=800):
+    """A valid PNG for the og:image; Pillow is used when available"""
+    try:
+        import io
+        from PIL import Image
+        image = Image.new('RGB', (width, height), (200, 120, 40))
+        output = io.BytesIO()
+        image.save(output, format='PNG')
+        return output.getvalue()
+    except ImportError:
+        # 1x1 transparent PNG
+        return bytes.fromhex(
+            '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+            '1f15c4890000000d49444154789c63000100000500010d0a2db40000000049454e44ae426082'
+        )
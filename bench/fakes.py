@@ -0,0 +1,329 @@
+"""Local stand-ins for Ollama, WordPress and source websites
+
+Each fake is a small threaded HTTP server that binds to a free port on
+127.0.0.1. Run this file directly to start all three and print their URLs.
+"""
+import argparse
+import itertools
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import corpus
+
+CHARS_PER_TOKEN = 3.5
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def send_bytes(self, status, body, content_type='application/json', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status, data, headers=None):
+        self.send_bytes(status, json.dumps(data).encode('utf-8'), headers=headers)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing keep-alive connections (or streams they stopped reading) isn't an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeServer:
+    handler = _Handler
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.httpd = _Server((host, port), self.handler)
+        self.httpd.fake = self
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _OllamaHandler(_Handler):
+    def do_POST(self):
+        self.fake.count()
+        if self.path != '/api/chat':
+            return self.send_json(404, {'error': 'not found'})
+        body = json.loads(self.read_body() or b'{}')
+        self.fake.chat(self, body)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            return self.send_json(200, {'models': [{'name': name} for name in self.fake.models]})
+        self.send_json(404, {'error': 'not found'})
+
+
+class FakeOllama(FakeServer):
+    """Fake /api/chat that "generates" at a fixed token rate
+
+    Prompts are prefilled at ``prefill_rate`` tokens/s, then tokens come out
+    at ``token_rate`` tokens/s. Post answers open with a ``<think>`` block of
+    ``think_tokens`` tokens. Summary requests (those with a ``format`` schema
+    or asking for JSON) get a JSON object, followed by trailing text that a
+    client is expected to stop reading.
+    """
+    handler = _OllamaHandler
+
+    def __init__(self, token_rate=50.0, prefill_rate=2000.0, think_tokens=40, post_tokens=300,
+                 models=('social-media-influencer-32b',), **kwargs):
+        super().__init__(**kwargs)
+        self.token_rate = token_rate
+        self.prefill_rate = prefill_rate
+        self.think_tokens = think_tokens
+        self.post_tokens = post_tokens
+        self.models = list(models)
+        self._seed = itertools.count()
+
+    def _tokens(self, body):
+        messages = body.get('messages', [])
+        system = next((m['content'] for m in messages if m.get('role') == 'system'), '')
+        seed = next(self._seed)
+        if body.get('format') or 'JSON' in system:
+            answer = json.dumps({'result': {
+                'summary': f"Fake summary number {seed} about a very interesting post",
+                'category': ['Gardening', 'Travel', 'Technology', 'Food'][seed % 4],
+                'category_description': 'Posts about things'
+            }})
+            # Pieces of roughly a token each, then chatter after the object closes
+            return re.findall(r'.{1,4}', answer, re.S) + [' trailing'] * 60
+        if 'key facts' in system:
+            text = corpus.summary_text(seed, paragraphs=1)
+            return [word + ' ' for word in text.split()]
+        think = ['<think>'] + ['hmm '] * self.think_tokens + ['</think>\n']
+        words = corpus.summary_text(seed, paragraphs=6).split()
+        post = [word + ' ' for word in itertools.islice(itertools.cycle(words), self.post_tokens)]
+        return think + ['🎉 '] + post
+
+    def chat(self, handler, body):
+        prompt_chars = sum(len(m.get('content', '')) for m in body.get('messages', []))
+        prompt_tokens = int(prompt_chars / CHARS_PER_TOKEN)
+        prefill = prompt_tokens / self.prefill_rate
+        tokens = self._tokens(body)
+        num_predict = body.get('options', {}).get('num_predict')
+        if num_predict and num_predict > 0:
+            tokens = tokens[:num_predict]
+        delay = 1.0 / self.token_rate if self.token_rate > 0 else 0
+        time.sleep(prefill)
+        stats = {
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prefill * 1e9),
+            'eval_count': len(tokens),
+            'eval_duration': int(len(tokens) * delay * 1e9),
+        }
+
+        if not body.get('stream', True):
+            time.sleep(len(tokens) * delay)
+            return handler.send_json(200, {
+                'model': body.get('model'),
+                'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                'done': True,
+                **stats
+            })
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/x-ndjson')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        try:
+            for token in tokens:
+                time.sleep(delay)
+                self._chunk(handler, {'message': {'role': 'assistant', 'content': token}, 'done': False})
+            self._chunk(handler, {'message': {'role': 'assistant', 'content': ''}, 'done': True, **stats})
+            handler.wfile.write(b'0\r\n\r\n')
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early, as the summary reader does
+            handler.close_connection = True
+
+    @staticmethod
+    def _chunk(handler, data):
+        line = json.dumps(data).encode('utf-8') + b'\n'
+        handler.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+        handler.wfile.flush()
+
+
+class _WordPressHandler(_Handler):
+    def do_GET(self):
+        self.fake.count()
+        self.fake.delay()
+        parts = urlsplit(self.path)
+        if parts.path != '/wp-json/wp/v2/categories':
+            return self.send_json(404, {'code': 'rest_no_route'})
+        query = parse_qs(parts.query)
+        per_page = int(query.get('per_page', ['10'])[0])
+        page = int(query.get('page', ['1'])[0])
+        categories = self.fake.list_categories()
+        total_pages = max(1, -(-len(categories) // per_page))
+        chunk = categories[(page - 1) * per_page:page * per_page]
+        self.send_json(200, chunk, headers={
+            'X-WP-Total': str(len(categories)),
+            'X-WP-TotalPages': str(total_pages)
+        })
+
+    def do_POST(self):
+        self.fake.count()
+        self.fake.delay()
+        path = urlsplit(self.path).path
+        body = self.read_body()
+        if path == '/wp-json/wp/v2/categories':
+            status, data = self.fake.create_category(json.loads(body or b'{}'))
+        elif path == '/wp-json/wp/v2/media':
+            status, data = self.fake.create_media(body)
+        elif path == '/wp-json/wp/v2/posts':
+            status, data = self.fake.create_post(self.headers.get('Content-Type', ''), body)
+        else:
+            status, data = 404, {'code': 'rest_no_route'}
+        self.send_json(status, data)
+
+
+class FakeWordPress(FakeServer):
+    """Just enough of the WP REST API for categories, media and posts"""
+    handler = _WordPressHandler
+
+    def __init__(self, latency=0.05, categories=250, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self._ids = itertools.count(1000)
+        self._data_lock = threading.Lock()
+        self.categories = [
+            {'id': i + 2, 'name': f'Category {i}', 'slug': f'category-{i}'} for i in range(categories)
+        ]
+        self.media = {}
+        self.posts = {}
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def list_categories(self):
+        with self._data_lock:
+            return list(self.categories)
+
+    def create_category(self, data):
+        with self._data_lock:
+            for category in self.categories:
+                if category['slug'] == data.get('slug') or category['name'].lower() == str(data.get('name', '')).lower():
+                    return 400, {'code': 'term_exists', 'data': {'status': 400, 'term_id': category['id']}}
+            category = {'id': next(self._ids), 'name': data.get('name'), 'slug': data.get('slug')}
+            self.categories.append(category)
+            return 201, category
+
+    def create_media(self, body):
+        with self._data_lock:
+            media_id = next(self._ids)
+            self.media[media_id] = len(body)
+        return 201, {'id': media_id, 'source_url': f'{self.url}/wp-content/uploads/{media_id}'}
+
+    def create_post(self, content_type, body):
+        if 'json' in content_type:
+            data = json.loads(body or b'{}')
+        else:
+            data = {key: values[0] for key, values in parse_qs(body.decode('utf-8', 'replace')).items()}
+        with self._data_lock:
+            post_id = next(self._ids)
+            self.posts[post_id] = data.get('title')
+        return 201, {'id': post_id, 'link': f'{self.url}/?p={post_id}', 'status': data.get('status', 'publish')}
+
+
+class _SiteHandler(_Handler):
+    def do_GET(self):
+        self.fake.count()
+        parts = self.path.strip('/').split('/')
+        kind = parts[0]
+        seed = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+        if kind == 'img':
+            return self.send_bytes(200, self.fake.image, content_type='image/png')
+        if kind == 'small':
+            return self.send_bytes(200, corpus.small_page(seed), content_type='text/html; charset=utf-8')
+        if kind == 'huge':
+            return self.send_bytes(200, self.fake.huge(seed), content_type='text/html; charset=utf-8')
+        if kind == 'slow':
+            time.sleep(self.fake.slow_delay)
+            return self.send_bytes(200, corpus.small_page(seed), content_type='text/html; charset=utf-8')
+        self.send_bytes(404, b'<html><body>Not found</body></html>', content_type='text/html')
+
+
+class FixtureSite(FakeServer):
+    """Source website serving /small/<n>, /huge/<n>, /slow/<n> and /img/hero.png"""
+    handler = _SiteHandler
+
+    def __init__(self, slow_delay=5.0, huge_bytes=3 * 1024 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.slow_delay = slow_delay
+        self.huge_bytes = huge_bytes
+        self.image = corpus.png_image()
+        self._huge = {}
+
+    def huge(self, seed):
+        # Building a multi-megabyte page is slower than serving it
+        if seed not in self._huge:
+            self._huge[seed] = corpus.huge_page(seed, self.huge_bytes)
+        return self._huge[seed]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--token-rate', type=float, default=50.0)
+    parser.add_argument('--think-tokens', type=int, default=40)
+    parser.add_argument('--wp-latency', type=float, default=0.05)
+    parser.add_argument('--slow-delay', type=float, default=5.0)
+    args = parser.parse_args()
+
+    ollama = FakeOllama(token_rate=args.token_rate, think_tokens=args.think_tokens).start()
+    wordpress = FakeWordPress(latency=args.wp_latency).start()
+    site = FixtureSite(slow_delay=args.slow_delay).start()
+    print(f"OPENWEBUI_API_URL={ollama.url}/api/chat")
+    print(f"WP_URL={wordpress.url}")
+    print(f"Fixture site: {site.url}/small/1 {site.url}/huge/1 {site.url}/slow/1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""Load test remote-server.py against local fakes
+
+Starts the fake Ollama, WordPress and fixture site from fakes.py, launches
+remote-server.py (or asgi_server.py with --server asgi) in a scratch
+directory pointed at them, then drives each scenario at each concurrency
+level and reports latency percentiles, throughput and the server's peak RSS.
+
+    python bench/load.py --concurrency 1,4,16 --requests 40
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import corpus
+from fakes import FakeOllama, FakeWordPress, FixtureSite
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPTS = {
+    'flask': os.path.join(REPO_ROOT, 'remote-server.py'),
+    'asgi': os.path.join(REPO_ROOT, 'asgi_server.py'),
+}
+
+_seeds = itertools.count(1)
+
+
+def build_scenarios(site_url):
+    """name -> function(seed) returning (path, json body)"""
+    def post_body(seed):
+        return {
+            'content': corpus.summary_text(seed),
+            'title': f'Bench post {seed}',
+            # Mostly existing categories, every tenth one new
+            'category': f'Bench category {seed}' if seed % 10 == 0 else f'Category {seed % 50}',
+            'meta_image_url': f'{site_url}/img/hero.png',
+            'idempotency_key': f'bench-{os.getpid()}-{seed}'
+        }
+
+    return {
+        'generate_prompt': lambda seed: ('/generate', {'prompt': f'Benchmark topic number {seed}'}),
+        'generate_small': lambda seed: ('/generate', {'url': f'{site_url}/small/{seed}'}),
+        'generate_huge': lambda seed: ('/generate', {'url': f'{site_url}/huge/{seed % 4}?n={seed}'}),
+        'generate_slow': lambda seed: ('/generate', {'url': f'{site_url}/slow/{seed}'}),
+        'regenerate_title': lambda seed: ('/regenerate-title', {'content': corpus.summary_text(seed), 'force_fresh': True}),
+        'regenerate_category': lambda seed: ('/regenerate-category', {'content': corpus.summary_text(seed), 'force_fresh': True}),
+        'confirm_post': lambda seed: ('/confirm-post', post_body(seed)),
+    }
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def read_rss_kb(pid, field='VmRSS'):
+    """Resident memory of a process in kB from /proc, or None off Linux"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss // 1024
+    except Exception:
+        return None
+
+
+class RssSampler:
+    """Track the highest RSS of a process while a run is in progress"""
+
+    def __init__(self, pid, interval=0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_kb = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss_kb(self.pid)
+            if rss is not None and (self.peak_kb is None or rss > self.peak_kb):
+                self.peak_kb = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def start_server(port, env_overrides, workdir, script=SERVER_SCRIPTS['flask']):
+    env = dict(os.environ)
+    env.update(env_overrides)
+    env['REMOTE_SERVER_PORT'] = str(port)
+    process = subprocess.Popen(
+        [sys.executable, script],
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=open(os.path.join(workdir, 'server.log'), 'wb')
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{os.path.basename(script)} exited, see {workdir}/server.log")
+        try:
+            if requests.get(base_url + '/health', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{os.path.basename(script)} did not become healthy in 30s")
+
+
+def run_level(base_url, build, concurrency, count, timeout):
+    """Send count requests with concurrency workers, returning latencies and errors"""
+    local = threading.local()
+
+    def one(seed):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        path, body = build(seed)
+        started = time.monotonic()
+        try:
+            response = session.post(base_url + path, json=body, timeout=timeout)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.monotonic() - started, ok
+
+    seeds = [next(_seeds) for _ in range(count)]
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, seeds))
+    wall = time.monotonic() - started
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return latencies, errors, wall
+
+
+def format_ms(seconds):
+    return '-' if seconds is None else f'{seconds * 1000:.0f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default='1,4,16', help='comma separated levels')
+    parser.add_argument('--requests', type=int, default=20, help='requests per scenario and level')
+    parser.add_argument('--scenarios', default='generate_prompt,generate_small,generate_huge,'
+                        'regenerate_title,regenerate_category,confirm_post',
+                        help='comma separated, generate_slow is also available')
+    parser.add_argument('--token-rate', type=float, default=200.0, help='fake Ollama tokens/s')
+    parser.add_argument('--think-tokens', type=int, default=40)
+    parser.add_argument('--wp-latency', type=float, default=0.05, help='fake WordPress seconds per call')
+    parser.add_argument('--slow-delay', type=float, default=5.0, help='slow origin seconds per page')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--server', choices=sorted(SERVER_SCRIPTS), default='flask',
+                        help='remote-server.py (flask) or asgi_server.py (asgi)')
+    parser.add_argument('--timeout', type=float, default=600.0)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the server, repeatable')
+    parser.add_argument('--json', metavar='PATH', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    ollama = FakeOllama(token_rate=args.token_rate, think_tokens=args.think_tokens).start()
+    wordpress = FakeWordPress(latency=args.wp_latency).start()
+    site = FixtureSite(slow_delay=args.slow_delay).start()
+    scenarios = build_scenarios(site.url)
+    unknown = [name for name in args.scenarios.split(',') if name not in scenarios]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    env = {
+        'OPENWEBUI_API_URL': f'{ollama.url}/api/chat',
+        'WP_URL': wordpress.url,
+        'WP_USERNAME': 'bench',
+        'WP_APP_PASSWORD': 'bench',
+        'LOG_LEVEL': 'WARNING',
+        # Every fixture page lives on one host, don't let politeness limits skew the numbers
+        'DOMAIN_RATE_LIMIT': '100000',
+        'DOMAIN_RATE_BURST': '100000',
+    }
+    env.update(item.split('=', 1) for item in args.env)
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='blog-bench-') as workdir:
+        process, base_url = start_server(args.port, env, workdir, SERVER_SCRIPTS[args.server])
+        try:
+            print(f"{'scenario':<22}{'conc':>5}{'reqs':>6}{'err':>5}{'p50 ms':>9}{'p95 ms':>9}"
+                  f"{'p99 ms':>9}{'req/s':>8}{'rss MB':>8}")
+            for name in args.scenarios.split(','):
+                for concurrency in levels:
+                    with RssSampler(process.pid) as sampler:
+                        latencies, errors, wall = run_level(
+                            base_url, scenarios[name], concurrency, args.requests, args.timeout
+                        )
+                    row = {
+                        'scenario': name,
+                        'concurrency': concurrency,
+                        'requests': len(latencies),
+                        'errors': errors,
+                        'p50': percentile(latencies, 50),
+                        'p95': percentile(latencies, 95),
+                        'p99': percentile(latencies, 99),
+                        'rps': len(latencies) / wall if wall else None,
+                        'peak_rss_mb': sampler.peak_kb / 1024 if sampler.peak_kb else None,
+                    }
+                    rows.append(row)
+                    rss = '-' if row['peak_rss_mb'] is None else f"{row['peak_rss_mb']:.0f}"
+                    print(f"{name:<22}{concurrency:>5}{row['requests']:>6}{errors:>5}"
+                          f"{format_ms(row['p50']):>9}{format_ms(row['p95']):>9}{format_ms(row['p99']):>9}"
+                          f"{row['rps']:>8.2f}{rss:>8}")
+            peak = read_rss_kb(process.pid, 'VmHWM')
+            if peak:
+                print(f"server peak RSS over the whole run: {peak / 1024:.0f} MB")
+            print(f"fake calls: ollama={ollama.requests} wordpress={wordpress.requests} site={site.requests}")
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
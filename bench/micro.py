@@ -0,0 +1,101 @@
+"""Micro-benchmarks for the CPU-bound text helpers
+
+    python bench/micro.py [--quick]
+
+Reports the best per-call time over several repeats and, for text
+functions, the throughput in MB/s of input.
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import corpus  # noqa: E402
+from content_extract import extract_main_text  # noqa: E402
+from llm_stream import JsonObjectScanner, ThinkStreamFilter, extract_json_from_text  # noqa: E402
+from page_ingest import HTML_PARSER, clean_text, parse_page  # noqa: E402
+
+
+def bench(name, fn, size=None, repeat=5, min_time=0.2):
+    """Time fn, auto-scaling the loop count so each repeat takes about min_time"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    line = f"{name:<44}{best * 1e6:>12.1f} us"
+    if size:
+        line += f"{size / best / 1e6:>10.1f} MB/s"
+    print(line)
+    return best
+
+
+def summary_answer(prose_words=200):
+    payload = json.dumps({'result': {
+        'summary': 'A short summary with "quotes" and {braces} inside the string',
+        'category': 'Technology',
+        'category_description': 'Posts about technology'
+    }})
+    prose = ' '.join(['word'] * prose_words)
+    return f"<think>{prose}</think>\nSure! Here is the JSON:\n```json\n{payload}\n```\n{prose}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help='fewer repeats, smaller huge page')
+    args = parser.parse_args()
+    repeat = 3 if args.quick else 5
+    huge_bytes = 512 * 1024 if args.quick else 3 * 1024 * 1024
+
+    pages = {
+        'small': corpus.small_page(1),
+        'huge': corpus.huge_page(1, huge_bytes),
+    }
+    print(f"HTML parser: {HTML_PARSER}")
+    for label, html in pages.items():
+        soup = BeautifulSoup(html, HTML_PARSER)
+        raw_text = soup.get_text()
+        size = len(raw_text.encode('utf-8'))
+        bench(f"clean_text ({label}, {size // 1024} KB)", lambda: clean_text(raw_text), size, repeat)
+        bench(f"extract_main_text ({label})",
+              lambda: extract_main_text(BeautifulSoup(html, HTML_PARSER), clean_text), len(html), repeat)
+        bench(f"parse_page ({label}, {len(html) // 1024} KB)",
+              lambda: parse_page('http://bench.local/', html, 'utf-8'), len(html), repeat)
+
+    answer = summary_answer()
+    visible = answer.split('</think>', 1)[1]
+    size = len(answer.encode('utf-8'))
+    bench("extract_json_from_text", lambda: extract_json_from_text(visible), len(visible), repeat)
+
+    def scan_whole():
+        return JsonObjectScanner().feed(visible)
+    bench("JsonObjectScanner.feed (one piece)", scan_whole, len(visible), repeat)
+
+    # Ollama streams roughly a token at a time
+    tokens = [answer[i:i + 4] for i in range(0, len(answer), 4)]
+
+    def scan_stream():
+        think_filter = ThinkStreamFilter()
+        scanner = JsonObjectScanner()
+        for token in tokens:
+            for event, text in think_filter.feed(token):
+                if event == 'reset':
+                    scanner.reset()
+                elif scanner.feed(text):
+                    return
+    bench(f"think filter + scanner ({len(tokens)} tokens)", scan_stream, size, repeat)
+
+    def think_only():
+        think_filter = ThinkStreamFilter()
+        for token in tokens:
+            think_filter.feed(token)
+        return think_filter.content()
+    bench("ThinkStreamFilter.feed (whole answer)", think_only, size, repeat)
+
+
+if __name__ == '__main__':
+    main()
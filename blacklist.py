@@ -0,0 +1,159 @@
+import os
+import atexit
+import tempfile
+import threading
+import time
+import logging
+from datetime import datetime
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+
+def domain_suffixes(domain):
+    """Yield a domain and every parent domain, e.g. a.b.com, b.com, com"""
+    labels = domain.split('.')
+    for i in range(len(labels)):
+        yield '.'.join(labels[i:])
+
+
+class BlacklistIndex:
+    """Process-wide blacklist backed by an XML file or a HistoryStore
+
+    Lookups are answered from an in-memory set and only touch the disk when
+    the file's mtime (or the store's blacklist) has changed. Additions are
+    applied in memory right away and written to disk in batches by a
+    background flush. With a store, the XML file is imported into it once
+    and not written to again.
+    """
+
+    def __init__(self, path='blacklist.xml', flush_delay=1.0, check_interval=1.0, store=None):
+        self.path = path
+        self.store = store
+        self.flush_delay = flush_delay
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._domains = set()
+        self._pending = set()
+        self._mtime = None
+        self._last_check = 0
+        self._flush_timer = None
+        if store is not None and not store.migrated(path):
+            domains = self._read_file()
+            if domains:
+                store.add_blacklisted(domains)
+            store.mark_migrated(path)
+            logger.info("Imported blacklist into history", extra={'file': path, 'domains': len(domains)})
+        self._reload()
+        atexit.register(self.flush)
+
+    def _file_mtime(self):
+        if self.store is not None:
+            return self.store.blacklist_version()
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read_file(self):
+        try:
+            if not os.path.exists(self.path):
+                return set()
+            tree = ET.parse(self.path)
+            root = tree.getroot()
+            return {
+                domain_elem.text.strip().lower()
+                for domain_elem in root.findall('.//domain')
+                if domain_elem.text
+            }
+        except Exception as e:
+            logger.error("Error loading blacklist", extra={'error': str(e)})
+            return set()
+
+    def _reload(self):
+        mtime = self._file_mtime()
+        stored = self.store.blacklisted_domains() if self.store is not None else self._read_file()
+        self._domains = stored | self._pending
+        self._mtime = mtime
+        self._last_check = time.monotonic()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        if self._file_mtime() != self._mtime:
+            with self._lock:
+                if self._file_mtime() != self._mtime:
+                    self._reload()
+
+    def contains(self, domain):
+        """Check a domain, or any of its parent domains, in O(labels)"""
+        if not domain:
+            return False
+        self._refresh()
+        domains = self._domains
+        return any(suffix in domains for suffix in domain_suffixes(domain.lower()))
+
+    def domains(self):
+        self._refresh()
+        return set(self._domains)
+
+    def add(self, domain):
+        if not domain:
+            return
+        domain = domain.lower()
+        with self._lock:
+            if domain in self._domains:
+                return
+            self._domains = self._domains | {domain}
+            self._pending.add(domain)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+        logger.warning("Added domain to blacklist", extra={'domain': domain})
+
+    def flush(self):
+        """Write pending additions to disk with a temp file and rename"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            # Pick up edits made to the file by hand since we last read it
+            if self._file_mtime() != self._mtime:
+                self._reload()
+            try:
+                if self.store is not None:
+                    self.store.add_blacklisted(self._pending)
+                else:
+                    self._write(self._domains)
+                self._pending.clear()
+                self._mtime = self._file_mtime()
+            except Exception as e:
+                logger.error("Error saving blacklist", extra={'error': str(e)})
+
+    def _write(self, domains):
+        root = ET.Element('blacklist')
+        domains_elem = ET.SubElement(root, 'domains')
+
+        for domain in sorted(domains):
+            domain_elem = ET.SubElement(domains_elem, 'domain')
+            domain_elem.text = domain
+
+        last_updated = ET.SubElement(root, 'last_updated')
+        last_updated.text = datetime.now().isoformat() + 'Z'
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.blacklist-', suffix='.xml', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                ET.ElementTree(root).write(f, encoding='UTF-8', xml_declaration=True)
+            mode = os.stat(self.path).st_mode & 0o777 if os.path.exists(self.path) else 0o644
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,127 @@
+import html
+import re
+import threading
+import time
+import logging
+from single_flight import SingleFlight
+from metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORY_ID = 1
+
+
+def normalize_name(name):
+    """Compare category names the way an editor would: case, entities and spacing aside"""
+    return re.sub(r'\s+', ' ', html.unescape(name or '')).strip().lower()
+
+
+def slugify(name):
+    return re.sub(r'[^a-z0-9]+', '-', normalize_name(name)).strip('-')
+
+
+class CategoryIndex:
+    """Local index of WordPress categories by normalized name and slug
+
+    The full category list is loaded across all pages and refreshed once it
+    is older than ``ttl`` seconds. Concurrent requests to create the same
+    category share a single POST.
+    """
+
+    def __init__(self, session, base_url, auth, ttl=600, per_page=100):
+        self.session = session
+        self.endpoint = f"{base_url}/wp-json/wp/v2/categories"
+        self.auth = auth
+        self.ttl = ttl
+        self.per_page = per_page
+        self._lock = threading.Lock()
+        self._by_name = {}
+        self._by_slug = {}
+        self._loaded_at = None
+        self._creates = SingleFlight()
+        self._refreshes = SingleFlight()
+
+    def _add(self, category):
+        self._by_name[normalize_name(category.get('name'))] = category['id']
+        if category.get('slug'):
+            self._by_slug[category['slug']] = category['id']
+
+    def _load(self):
+        by_name = {}
+        by_slug = {}
+        page = 1
+        while True:
+            response = self.session().get(
+                self.endpoint,
+                auth=self.auth,
+                params={'per_page': self.per_page, 'page': page, '_fields': 'id,name,slug'}
+            )
+            response.raise_for_status()
+            categories = response.json()
+            for category in categories:
+                by_name[normalize_name(category.get('name'))] = category['id']
+                if category.get('slug'):
+                    by_slug[category['slug']] = category['id']
+            total_pages = int(response.headers.get('X-WP-TotalPages', page))
+            if not categories or page >= total_pages:
+                break
+            page += 1
+        with self._lock:
+            self._by_name = by_name
+            self._by_slug = by_slug
+            self._loaded_at = time.monotonic()
+        logger.info("Loaded WordPress categories", extra={'count': len(by_name)})
+
+    def refresh(self, force=False):
+        stale = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+        if force or stale:
+            self._refreshes.do('all', self._load)
+
+    def lookup(self, name):
+        key = normalize_name(name)
+        with self._lock:
+            return self._by_name.get(key) or self._by_slug.get(slugify(name))
+
+    def get_or_create(self, name, description=''):
+        """ID of the category with this name, creating it once if needed"""
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error("Error loading WordPress categories", extra={'error': str(e)})
+        category_id = self.lookup(name)
+        if category_id:
+            CACHE_REQUESTS.inc(cache='category', result='hit')
+            return category_id
+        CACHE_REQUESTS.inc(cache='category', result='miss')
+        category_id, _ = self._creates.do(normalize_name(name), self._create, name, description)
+        return category_id
+
+    def _create(self, name, description):
+        # Another request may have created it while we were waiting
+        category_id = self.lookup(name)
+        if category_id:
+            return category_id
+        new_category = {
+            'name': name,
+            'slug': slugify(name),
+            'description': description
+        }
+        response = self.session().post(self.endpoint, auth=self.auth, json=new_category)
+        if response.status_code == 201:
+            category = response.json()
+            with self._lock:
+                self._add(category)
+            return category['id']
+        try:
+            error = response.json()
+        except ValueError:
+            error = {}
+        if error.get('code') == 'term_exists':
+            # Created elsewhere since our last refresh
+            category_id = error.get('data', {}).get('term_id')
+            if category_id:
+                with self._lock:
+                    self._add({'id': category_id, 'name': name, 'slug': slugify(name)})
+                return category_id
+        logger.error("Failed to create category", extra={'category': name, 'response': response.text})
+        return DEFAULT_CATEGORY_ID
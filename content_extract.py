@@ -0,0 +1,127 @@
+import re
+
+BOILERPLATE_TAGS = ['nav', 'footer', 'header', 'aside', 'form', 'noscript', 'iframe', 'svg', 'button', 'select']
+UNLIKELY_RE = re.compile(
+    r'comment|footer|nav|menu|cookie|consent|gdpr|banner|share|social|related|sidebar|'
+    r'promo|subscribe|newsletter|advert|sponsor|popup|modal|breadcrumb|masthead|outbrain|taboola',
+    re.I
+)
+LIKELY_RE = re.compile(r'article|body|content|entry|main|post|story|text|prose', re.I)
+PARAGRAPH_TAGS = ['p', 'pre', 'blockquote', 'td', 'li', 'h2', 'h3']
+BLOCK_TAGS = ['article', 'main', 'section', 'div']
+KEEP_TAGS = ('html', 'body', 'article', 'main')
+
+
+def _class_and_id(tag):
+    classes = tag.get('class') or []
+    if isinstance(classes, str):
+        classes = [classes]
+    return ' '.join(classes) + ' ' + (tag.get('id') or '')
+
+
+def _class_weight(tag):
+    names = _class_and_id(tag)
+    weight = 0
+    if UNLIKELY_RE.search(names):
+        weight -= 25
+    if LIKELY_RE.search(names):
+        weight += 25
+    return weight
+
+
+def link_density(tag, text_length=None):
+    """Share of a node's text that sits inside links"""
+    if text_length is None:
+        text_length = len(tag.get_text(' ', strip=True))
+    if not text_length:
+        return 1.0
+    link_length = sum(len(a.get_text(' ', strip=True)) for a in tag.find_all('a'))
+    return min(1.0, link_length / text_length)
+
+
+def text_density(tag, text_length=None):
+    """Characters of text per descendant tag"""
+    if text_length is None:
+        text_length = len(tag.get_text(' ', strip=True))
+    return text_length / (1 + sum(1 for _ in tag.find_all(True)))
+
+
+def _strip_boilerplate(soup):
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    for tag in soup.find_all(True):
+        if tag.decomposed or tag.name in KEEP_TAGS or tag.attrs is None:
+            continue
+        names = _class_and_id(tag)
+        if UNLIKELY_RE.search(names) and not LIKELY_RE.search(names):
+            tag.decompose()
+
+
+def _score_candidates(soup):
+    """Readability-style scores: paragraphs vote for their parent and grandparent"""
+    scores = {}
+    nodes = {}
+    for paragraph in soup.find_all(PARAGRAPH_TAGS):
+        text = paragraph.get_text(' ', strip=True)
+        if len(text) < 25:
+            continue
+        score = 1 + text.count(',') + min(len(text) // 100, 3)
+        parent = paragraph.parent
+        grandparent = parent.parent if parent is not None else None
+        for node, weight in ((parent, 1.0), (grandparent, 0.5)):
+            if node is None or node.name in (None, '[document]'):
+                continue
+            key = id(node)
+            if key not in nodes:
+                nodes[key] = node
+                scores[key] = _class_weight(node)
+            scores[key] += score * weight
+
+    ranked = []
+    for key, node in nodes.items():
+        text_length = len(node.get_text(' ', strip=True))
+        ranked.append((scores[key] * (1 - link_density(node, text_length)), node))
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked
+
+
+def _densest_block(soup):
+    """Fallback for pages without paragraph markup"""
+    best, best_score = None, 0
+    for node in soup.find_all(BLOCK_TAGS):
+        text_length = len(node.get_text(' ', strip=True))
+        if text_length < 200:
+            continue
+        score = text_density(node, text_length) * (1 - link_density(node, text_length))
+        if score > best_score:
+            best, best_score = node, score
+    return best
+
+
+def extract_main_text(soup, clean, min_length=250):
+    """Text of the article body, or '' when no convincing block is found
+
+    Strips navigation, footers, cookie banners, comment threads and other
+    boilerplate, then picks the block with the best paragraph score weighted
+    by link density, plus any sibling blocks scoring close to it. The soup is
+    modified in place, so call this after everything else has been read.
+    """
+    _strip_boilerplate(soup)
+    ranked = _score_candidates(soup)
+
+    if ranked and ranked[0][0] > 0:
+        best_score, best = ranked[0]
+        threshold = max(10, best_score * 0.2)
+        chosen = {id(node) for score, node in ranked if score >= threshold}
+        parts = [best]
+        if best.parent is not None:
+            parts = [
+                sibling for sibling in best.parent.find_all(True, recursive=False)
+                if sibling is best or id(sibling) in chosen
+            ]
+    else:
+        block = _densest_block(soup)
+        parts = [block] if block is not None else []
+
+    text = clean(' \n'.join(part.get_text('\n') for part in parts))
+    return text if len(text) >= min_length else ''
@@ -0,0 +1,190 @@
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def parse_retry_after(value):
+    """Turn a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class DomainState:
+    def __init__(self, burst):
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self.probe_in_flight = False
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.last_error = ""
+
+
+class DomainHealth:
+    """Per-domain circuit breaker with a token-bucket rate limit
+
+    A domain's circuit opens after ``failure_threshold`` consecutive
+    transient failures (or straight away when the origin sends 429). While
+    open, requests are refused until the cool-down passes; the cool-down
+    doubles on every consecutive trip and is never shorter than the origin's
+    Retry-After. After the cool-down a single half-open probe is let through
+    and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, rate=1.0, burst=5, failure_threshold=3,
+                 base_cooldown=30.0, max_cooldown=3600.0, max_wait=5.0):
+        self.rate = rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def _get(self, domain):
+        state = self._states.get(domain)
+        if state is None:
+            state = DomainState(self.burst)
+            self._states[domain] = state
+        return state
+
+    def _take_token(self, state, now):
+        """Take a token, returning how long the caller must wait for it"""
+        elapsed = now - state.last_refill
+        state.tokens = min(float(self.burst), state.tokens + elapsed * self.rate)
+        state.last_refill = now
+        state.tokens -= 1
+        if state.tokens >= 0:
+            return 0.0
+        return -state.tokens / self.rate
+
+    def acquire(self, domain):
+        """Reserve a request slot for a domain
+
+        Returns ``(allowed, reason)``. Blocks for at most ``max_wait`` seconds
+        when the domain's rate limit is exhausted.
+        """
+        allowed, reason, wait = self.reserve(domain)
+        if wait > 0:
+            time.sleep(wait)
+        return allowed, reason
+
+    def reserve(self, domain):
+        """acquire without the sleep, returning ``(allowed, reason, wait)``
+
+        The caller waits ``wait`` seconds before using the slot, which lets an
+        event loop sleep without blocking.
+        """
+        with self._lock:
+            state = self._get(domain)
+            now = time.monotonic()
+            if state.state == OPEN:
+                if now < state.open_until:
+                    return False, f"circuit open for {domain}", 0.0
+                state.state = HALF_OPEN
+                state.probe_in_flight = False
+            if state.state == HALF_OPEN:
+                if state.probe_in_flight:
+                    return False, f"waiting on half-open probe for {domain}", 0.0
+                state.probe_in_flight = True
+            wait = self._take_token(state, now)
+            if wait > self.max_wait:
+                # Give the token back, we are not going to use it
+                state.tokens += 1
+                if state.state == HALF_OPEN:
+                    state.probe_in_flight = False
+                return False, f"rate limit exceeded for {domain}", 0.0
+        return True, "", wait
+
+    def record_success(self, domain):
+        with self._lock:
+            state = self._get(domain)
+            state.state = CLOSED
+            state.failures = 0
+            state.trips = 0
+            state.probe_in_flight = False
+            state.last_error = ""
+
+    def release(self, domain):
+        """Return a request slot without counting it either way, e.g. for a 404"""
+        with self._lock:
+            self._get(domain).probe_in_flight = False
+
+    def record_failure(self, domain, error="", retry_after=None, trip=False):
+        """Count a transient failure, opening the circuit when warranted"""
+        with self._lock:
+            state = self._get(domain)
+            now = time.monotonic()
+            state.failures += 1
+            state.last_error = str(error)
+            state.probe_in_flight = False
+            if state.state == HALF_OPEN or trip or state.failures >= self.failure_threshold:
+                cooldown = min(self.max_cooldown, self.base_cooldown * (2 ** state.trips))
+                if retry_after:
+                    cooldown = max(cooldown, retry_after)
+                state.trips += 1
+                state.state = OPEN
+                state.open_until = now + cooldown
+                logger.warning("Circuit opened", extra={'domain': domain, 'cooldown_s': int(cooldown), 'error': str(error)})
+            elif retry_after:
+                # Not tripped yet, but still respect what the origin asked for
+                state.open_until = max(state.open_until, now + retry_after)
+                state.state = OPEN
+
+    def retry_at(self, domain):
+        """ISO time a domain's open circuit will let requests through, or None"""
+        with self._lock:
+            state = self._states.get(domain)
+            now = time.monotonic()
+            if state is None or state.state != OPEN or now >= state.open_until:
+                return None
+            return self._wall_time(state.open_until, now)
+
+    @staticmethod
+    def _wall_time(monotonic_at, now):
+        return datetime.fromtimestamp(time.time() + monotonic_at - now, timezone.utc).isoformat()
+
+    def _describe(self, state, now):
+        current = state.state
+        if current == OPEN and now >= state.open_until:
+            current = HALF_OPEN
+        next_retry_at = None
+        if current == OPEN:
+            next_retry_at = self._wall_time(state.open_until, now)
+        return {
+            'state': current,
+            'consecutive_failures': state.failures,
+            'next_retry_at': next_retry_at,
+            'last_error': state.last_error,
+        }
+
+    def state_of(self, domain):
+        """Live state of one domain, as in snapshot"""
+        with self._lock:
+            return self._describe(self._get(domain), time.monotonic())
+
+    def snapshot(self):
+        """Live state of every tracked domain, for the /blacklist endpoint"""
+        now = time.monotonic()
+        with self._lock:
+            return {domain: self._describe(state, now) for domain, state in self._states.items()}
@@ -0,0 +1,97 @@
+import os
+
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "result": {
+            "type": "object",
+            "properties": {
+                "summary": {"type": "string"},
+                "category": {"type": "string"},
+                "category_description": {"type": "string"}
+            },
+            "required": ["summary", "category", "category_description"]
+        }
+    },
+    "required": ["result"]
+}
+
+# Generation settings per task. "options" go to Ollama's options object,
+# "format" (when set) is Ollama's top-level structured-output field. num_ctx
+# is left out on purpose: Ollama reloads a model whenever num_ctx changes, so
+# every call to a model, whatever its profile, passes the same one.
+PROFILES = {
+    'post': {
+        'options': {
+            "num_predict": 2000,
+            "temperature": 0.9,
+            "top_p": 0.9,
+            "top_k": 40,
+            "repeat_penalty": 1.1,
+            "seed": -1,
+            "clear": True
+        },
+        'format': None,
+    },
+    'summary': {
+        # A 32-word summary plus a category fits easily in a few hundred
+        # tokens; the JSON reader also stops as soon as the object closes.
+        'options': {
+            "num_predict": 384,
+            "temperature": 0.2,
+            "top_p": 0.9,
+            "top_k": 40,
+            "repeat_penalty": 1.1,
+            "seed": -1,
+            "clear": True,
+            "stop": ["```\n\n", "\n\n\n"]
+        },
+        'format': SUMMARY_SCHEMA,
+    },
+    'presummary': {
+        'options': {
+            "num_predict": 512,
+            "temperature": 0.2,
+            "top_p": 0.9,
+            "top_k": 40,
+            "repeat_penalty": 1.1,
+            "seed": -1,
+            "clear": True
+        },
+        'format': None,
+    },
+}
+
+
+def _apply_env_overrides():
+    """Allow e.g. SUMMARY_NUM_PREDICT=512 or POST_TEMPERATURE=0.7"""
+    for name, profile in PROFILES.items():
+        for key, value in list(profile['options'].items()):
+            override = os.getenv(f"{name.upper()}_{key.upper()}")
+            if override is None or isinstance(value, (bool, list)):
+                continue
+            profile['options'][key] = type(value)(override)
+    if os.getenv('SUMMARY_JSON_FORMAT', '').lower() in ('0', 'false', 'no'):
+        PROFILES['summary']['format'] = None
+
+
+_apply_env_overrides()
+
+
+def profile_options(name):
+    return dict(PROFILES[name]['options'])
+
+
+def build_payload(name, model_name, messages, num_ctx, stream=False):
+    """Ollama /api/chat payload for a profile"""
+    options = profile_options(name)
+    options['num_ctx'] = num_ctx
+    payload = {
+        "model": model_name,
+        "messages": messages,
+        "stream": stream,
+        "options": options
+    }
+    if PROFILES[name]['format'] is not None:
+        payload["format"] = PROFILES[name]['format']
+    return payload
@@ -0,0 +1,439 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    url TEXT UNIQUE,
+    domain TEXT,
+    title TEXT,
+    canonical_url TEXT,
+    image_url TEXT,
+    text BLOB,
+    text_length INTEGER,
+    legacy_file TEXT UNIQUE,
+    fetched_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sources_domain ON sources (domain, fetched_at);
+CREATE INDEX IF NOT EXISTS sources_fetched_at ON sources (fetched_at);
+
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY,
+    url TEXT,
+    domain TEXT,
+    prompt TEXT,
+    title TEXT,
+    category TEXT,
+    content TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    meta_image_url TEXT,
+    generated_at TEXT,
+    wordpress_id INTEGER,
+    wordpress_url TEXT,
+    idempotency_key TEXT,
+    published_at TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_url ON posts (url, generated_at);
+CREATE INDEX IF NOT EXISTS posts_domain ON posts (domain, generated_at);
+CREATE INDEX IF NOT EXISTS posts_generated_at ON posts (generated_at);
+CREATE INDEX IF NOT EXISTS posts_published_at ON posts (published_at);
+CREATE INDEX IF NOT EXISTS posts_content_hash ON posts (content_hash);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    content_hash TEXT,
+    summary TEXT,
+    category TEXT,
+    summary_json TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS summaries_content_hash ON summaries (content_hash);
+
+CREATE TABLE IF NOT EXISTS media (
+    source_url TEXT PRIMARY KEY,
+    media_id INTEGER NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 1,
+    first_used_at TEXT NOT NULL,
+    last_used_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_media_id ON media (media_id);
+
+CREATE TABLE IF NOT EXISTS domains (
+    domain TEXT PRIMARY KEY,
+    state TEXT,
+    consecutive_failures INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_retry_at TEXT,
+    fetches INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    last_fetched_at TEXT,
+    blacklisted INTEGER NOT NULL DEFAULT 0,
+    blacklisted_at TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS domains_blacklisted ON domains (blacklisted) WHERE blacklisted = 1;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Files written by the old save_url_as_clean_file: <url prefix>_<url suffix>_<unix time>.html
+LEGACY_FILE_RE = re.compile(r'^.*_(\d+)\.html$')
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+def now_iso():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def content_hash(content):
+    return hashlib.sha256((content or '').strip().encode('utf-8')).hexdigest()
+
+
+def _date_bound(value, end=False):
+    """Accept a date or a full ISO time; a bare end date covers the whole day"""
+    if value and end and len(value) == 10:
+        return value + 'T23:59:59'
+    return value
+
+
+class HistoryStore:
+    """SQLite record of fetched sources, generated posts, summaries, media and domains
+
+    The database runs in WAL mode so queries never wait on the writer.
+    Writes are queued and a background thread commits them in batches of
+    up to ``batch_size``, waiting at most ``flush_interval`` seconds to fill
+    one, so the request path never waits on the disk. Reads use one
+    connection per thread.
+    """
+
+    def __init__(self, path='history.db', batch_size=200, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        db = self._connect()
+        db.executescript(SCHEMA)
+        db.close()
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute('PRAGMA journal_mode=WAL')
+        # With WAL a crash can lose the last commits but never corrupts the file
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def _reader(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def _query(self, sql, params=()):
+        return [dict(row) for row in self._reader().execute(sql, params)]
+
+    # Writing
+
+    def _write(self, fn, *args):
+        """Queue fn(db, *args) for the writer thread"""
+        self._queue.put((fn, args))
+
+    def _run(self):
+        db = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1][0] not in (_FLUSH, _CLOSE):
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._commit(db, [item for item in batch if item[0] not in (_FLUSH, _CLOSE)])
+            for fn, args in batch:
+                if fn is _FLUSH:
+                    args[0].set()
+                elif fn is _CLOSE:
+                    db.close()
+                    args[0].set()
+                    return
+
+    def _commit(self, db, batch):
+        if not batch:
+            return
+        try:
+            with db:
+                for fn, args in batch:
+                    try:
+                        fn(db, *args)
+                    except sqlite3.Error as e:
+                        # SQLite keeps the transaction going, only this write is lost
+                        logger.error("Error writing history", extra={'op': fn.__name__, 'error': str(e)})
+        except sqlite3.Error as e:
+            logger.error("Error committing history batch", extra={'writes': len(batch), 'error': str(e)})
+
+    def flush(self, timeout=10):
+        """Wait until every write queued so far is committed"""
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, (done,)))
+        done.wait(timeout)
+
+    def close(self):
+        if not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put((_CLOSE, (done,)))
+        done.wait(10)
+
+    def record_source(self, url, domain, page):
+        self._write(_upsert_source, url, domain, page, now_iso())
+
+    def record_post(self, url, domain, prompt, post):
+        self._write(_insert_post, url, domain, prompt, post, now_iso())
+
+    def record_publication(self, content, title, category, post, idempotency_key=None):
+        self._write(_publish_post, content, title, category, post, idempotency_key, now_iso())
+
+    def record_summary(self, key, model_name, content, summary, category, summary_json):
+        self._write(_upsert_summary, key, model_name, content_hash(content), summary, category, summary_json, now_iso())
+
+    def record_media(self, source_url, media_id):
+        self._write(_upsert_media, source_url, media_id, now_iso())
+
+    def record_domain(self, domain, state, fetched=False, failed=False):
+        """Store a domain's circuit state; state is a DomainHealth.state_of entry"""
+        self._write(_upsert_domain, domain, state, fetched, failed, now_iso())
+
+    def add_blacklisted(self, domains):
+        """Blacklist domains, waiting until it is committed"""
+        self._write(_blacklist_domains, list(domains), now_iso())
+        self.flush()
+
+    # Migrations
+
+    def migrated(self, name):
+        rows = self._query('SELECT value FROM meta WHERE key = ?', ('migrated:' + name,))
+        return bool(rows)
+
+    def mark_migrated(self, name):
+        self._write(_set_meta, 'migrated:' + name, now_iso())
+        self.flush()
+
+    def import_downloads(self, folder='downloads'):
+        """Import the text dumps the old fetcher left in downloads/, once
+
+        Their file names only keep a fragment of the URL, so they become
+        sources with a legacy_file name and no URL or domain.
+        """
+        if self.migrated(folder) or not os.path.isdir(folder):
+            return 0
+        imported = 0
+        for name in sorted(os.listdir(folder)):
+            match = LEGACY_FILE_RE.match(name)
+            if not match:
+                continue
+            try:
+                with open(os.path.join(folder, name), 'r', encoding='utf-8', errors='replace') as f:
+                    text = f.read()
+            except OSError as e:
+                logger.warning("Skipping download", extra={'file': name, 'error': str(e)})
+                continue
+            fetched_at = datetime.fromtimestamp(int(match.group(1))).isoformat(timespec='seconds')
+            self._write(_insert_legacy_source, name, text, fetched_at)
+            imported += 1
+        self.mark_migrated(folder)
+        logger.info("Imported downloads into history", extra={'folder': folder, 'files': imported})
+        return imported
+
+    # Reading
+
+    def blacklisted_domains(self):
+        return {row['domain'] for row in self._query('SELECT domain FROM domains WHERE blacklisted = 1')}
+
+    def blacklist_version(self):
+        """Changes whenever a domain is added to or removed from the blacklist"""
+        row = self._query('SELECT COUNT(*) AS n, MAX(blacklisted_at) AS latest FROM domains WHERE blacklisted = 1')[0]
+        return row['n'], row['latest']
+
+    @staticmethod
+    def _filters(url=None, domain=None, since=None, until=None, time_column='generated_at'):
+        clauses = []
+        params = []
+        if url:
+            clauses.append('url = ?')
+            params.append(url)
+        if domain:
+            # Sources are stored under their exact host, www. or not
+            clauses.append('domain IN (?, ?)')
+            params.extend([domain, 'www.' + domain])
+        if since:
+            clauses.append(f'{time_column} >= ?')
+            params.append(_date_bound(since))
+        if until:
+            clauses.append(f'{time_column} <= ?')
+            params.append(_date_bound(until, end=True))
+        return clauses, params
+
+    def posts(self, url=None, domain=None, since=None, until=None, published=None, limit=50, offset=0):
+        """Generated posts, newest first; published is True/False to filter on WordPress status"""
+        clauses, params = self._filters(url, domain, since, until)
+        if published is not None:
+            clauses.append('published_at IS NOT NULL' if published else 'published_at IS NULL')
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self._query(
+            'SELECT id, url, domain, prompt, title, category, content, meta_image_url, generated_at,'
+            ' wordpress_id, wordpress_url, idempotency_key, published_at'
+            f' FROM posts{where} ORDER BY generated_at DESC, id DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        )
+
+    def sources(self, url=None, domain=None, since=None, until=None, limit=50, offset=0):
+        """Fetched sources, newest first, without their text"""
+        clauses, params = self._filters(url, domain, since, until, time_column='fetched_at')
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self._query(
+            'SELECT id, url, domain, title, canonical_url, image_url, text_length, legacy_file, fetched_at'
+            f' FROM sources{where} ORDER BY fetched_at DESC, id DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        )
+
+    def source_text(self, source_id):
+        rows = self._query('SELECT text FROM sources WHERE id = ?', (source_id,))
+        if not rows or rows[0]['text'] is None:
+            return None
+        return zlib.decompress(rows[0]['text']).decode('utf-8')
+
+    def domains(self, domain=None, blacklisted=None, limit=50, offset=0):
+        clauses = []
+        params = []
+        if domain:
+            clauses.append('domain IN (?, ?)')
+            params.extend([domain, 'www.' + domain])
+        if blacklisted is not None:
+            clauses.append('blacklisted = ?')
+            params.append(1 if blacklisted else 0)
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self._query(
+            f'SELECT * FROM domains{where} ORDER BY updated_at DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        )
+
+
+# Writes, run on the writer thread inside a batch's transaction
+
+def _upsert_source(db, url, domain, page, fetched_at):
+    text = page.article_text or ''
+    db.execute(
+        'INSERT INTO sources (url, domain, title, canonical_url, image_url, text, text_length, fetched_at)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)'
+        ' ON CONFLICT (url) DO UPDATE SET domain = excluded.domain, title = excluded.title,'
+        ' canonical_url = excluded.canonical_url, image_url = excluded.image_url, text = excluded.text,'
+        ' text_length = excluded.text_length, fetched_at = excluded.fetched_at',
+        (url, domain, page.title, page.canonical_url, page.image_url,
+         zlib.compress(text.encode('utf-8')), len(text), fetched_at)
+    )
+
+
+def _insert_legacy_source(db, name, text, fetched_at):
+    db.execute(
+        'INSERT OR IGNORE INTO sources (legacy_file, text, text_length, fetched_at) VALUES (?, ?, ?, ?)',
+        (name, zlib.compress(text.encode('utf-8')), len(text), fetched_at)
+    )
+
+
+def _insert_post(db, url, domain, prompt, post, generated_at):
+    db.execute(
+        'INSERT INTO posts (url, domain, prompt, title, category, content, content_hash, meta_image_url, generated_at)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (url, domain, prompt, post.get('title'), post.get('category'), post.get('content', ''),
+         content_hash(post.get('content')), post.get('meta_image_url'), generated_at)
+    )
+
+
+def _publish_post(db, content, title, category, post, idempotency_key, published_at):
+    digest = content_hash(content)
+    # The latest unpublished generation of this text, if the post wasn't edited
+    updated = db.execute(
+        'UPDATE posts SET wordpress_id = ?, wordpress_url = ?, idempotency_key = ?, published_at = ?,'
+        ' title = COALESCE(NULLIF(?, \'\'), title), category = COALESCE(NULLIF(?, \'\'), category)'
+        ' WHERE id = (SELECT id FROM posts WHERE content_hash = ? AND published_at IS NULL ORDER BY id DESC LIMIT 1)',
+        (post.get('id'), post['link'], idempotency_key, published_at, title, category, digest)
+    ).rowcount
+    if not updated:
+        db.execute(
+            'INSERT INTO posts (title, category, content, content_hash, wordpress_id, wordpress_url,'
+            ' idempotency_key, published_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (title, category, content, digest, post.get('id'), post['link'], idempotency_key, published_at)
+        )
+
+
+def _upsert_summary(db, key, model_name, digest, summary, category, summary_json, created_at):
+    db.execute(
+        'INSERT INTO summaries (key, model, content_hash, summary, category, summary_json, created_at)'
+        ' VALUES (?, ?, ?, ?, ?, ?, ?)'
+        ' ON CONFLICT (key) DO UPDATE SET summary = excluded.summary, category = excluded.category,'
+        ' summary_json = excluded.summary_json, created_at = excluded.created_at',
+        (key, model_name, digest, summary, category, summary_json, created_at)
+    )
+
+
+def _upsert_media(db, source_url, media_id, used_at):
+    db.execute(
+        'INSERT INTO media (source_url, media_id, first_used_at, last_used_at) VALUES (?, ?, ?, ?)'
+        ' ON CONFLICT (source_url) DO UPDATE SET media_id = excluded.media_id, uses = uses + 1,'
+        ' last_used_at = excluded.last_used_at',
+        (source_url, media_id, used_at, used_at)
+    )
+
+
+def _upsert_domain(db, domain, state, fetched, failed, updated_at):
+    db.execute(
+        'INSERT INTO domains (domain, state, consecutive_failures, last_error, next_retry_at, fetches, failures,'
+        ' last_fetched_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        ' ON CONFLICT (domain) DO UPDATE SET state = excluded.state,'
+        ' consecutive_failures = excluded.consecutive_failures, last_error = excluded.last_error,'
+        ' next_retry_at = excluded.next_retry_at, fetches = fetches + excluded.fetches,'
+        ' failures = failures + excluded.failures,'
+        ' last_fetched_at = COALESCE(excluded.last_fetched_at, last_fetched_at), updated_at = excluded.updated_at',
+        (domain, state.get('state'), state.get('consecutive_failures', 0), state.get('last_error'),
+         state.get('next_retry_at'), int(fetched), int(failed), updated_at if fetched else None, updated_at)
+    )
+
+
+def _blacklist_domains(db, domains, blacklisted_at):
+    db.executemany(
+        'INSERT INTO domains (domain, blacklisted, blacklisted_at, updated_at) VALUES (?, 1, ?, ?)'
+        ' ON CONFLICT (domain) DO UPDATE SET blacklisted = 1,'
+        ' blacklisted_at = CASE WHEN blacklisted = 1 THEN blacklisted_at ELSE excluded.blacklisted_at END,'
+        ' updated_at = excluded.updated_at',
+        [(domain, blacklisted_at, blacklisted_at) for domain in domains]
+    )
+
+
+def _set_meta(db, key, value):
+    db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
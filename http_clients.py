@@ -0,0 +1,194 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+BROWSER_HEADERS = {
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Connection": "keep-alive",
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:136.0) Gecko/20100101 Firefox/136.0'
+}
+
+# Defaults per destination class. Every value can be overridden with
+# HTTP_<CLASS>_<SETTING>, e.g. HTTP_LLM_READ_TIMEOUT=600.
+DESTINATIONS = {
+    'source': {
+        'pool_connections': 32,
+        'pool_maxsize': 8,
+        'connect_timeout': 5.0,
+        'read_timeout': 15.0,
+        'retries': 2,
+        'backoff': 0.5,
+        'headers': BROWSER_HEADERS,
+        # Origins' Retry-After is handled by the per-domain circuit breaker
+        'respect_retry_after': False,
+    },
+    'llm': {
+        # One pool per LLM_BACKENDS host
+        'pool_connections': 8,
+        'pool_maxsize': 16,
+        'connect_timeout': 5.0,
+        'read_timeout': 300.0,
+        'retries': 2,
+        'backoff': 1.0,
+        'headers': {},
+        'respect_retry_after': True,
+    },
+    'wordpress': {
+        'pool_connections': 2,
+        'pool_maxsize': 8,
+        'connect_timeout': 5.0,
+        'read_timeout': 60.0,
+        'retries': 3,
+        'backoff': 0.5,
+        'headers': {},
+        'respect_retry_after': True,
+    },
+}
+
+RETRY_STATUSES = (502, 503, 504)
+
+_sessions = {}
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def _setting(destination, name):
+    default = DESTINATIONS[destination][name]
+    value = os.getenv(f"HTTP_{destination.upper()}_{name.upper()}")
+    if value is None:
+        return default
+    return type(default)(value)
+
+
+class TimeoutSession(requests.Session):
+    """Session that applies a default (connect, read) timeout to every call"""
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.default_timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        return super().request(method, url, **kwargs)
+
+
+def _build_session(destination):
+    retries = _setting(destination, 'retries')
+    # Connection failures are retried for every method since nothing reached
+    # the server. Status retries only apply to idempotent methods.
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=_setting(destination, 'backoff'),
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=DESTINATIONS[destination]['respect_retry_after'],
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=_setting(destination, 'pool_connections'),
+        pool_maxsize=_setting(destination, 'pool_maxsize'),
+        max_retries=retry
+    )
+    session = TimeoutSession((
+        _setting(destination, 'connect_timeout'),
+        _setting(destination, 'read_timeout')
+    ))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update(DESTINATIONS[destination]['headers'])
+    return session
+
+
+def get_session(destination):
+    """Return the shared keep-alive session for a destination class"""
+    session = _sessions.get(destination)
+    if session is None:
+        with _lock:
+            session = _sessions.get(destination)
+            if session is None:
+                session = _build_session(destination)
+                _sessions[destination] = session
+    return session
+
+
+def _build_async_client(destination):
+    # Only the ASGI server uses httpx, the Flask server runs without it
+    import httpx
+
+    # httpx retries failed connections only; status retries are left to callers
+    transport = httpx.AsyncHTTPTransport(retries=_setting(destination, 'retries'))
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(
+            _setting(destination, 'read_timeout'),
+            connect=_setting(destination, 'connect_timeout')
+        ),
+        # No cap on open connections, each caller already limits its own concurrency
+        limits=httpx.Limits(
+            max_connections=None,
+            max_keepalive_connections=_setting(destination, 'pool_connections') * _setting(destination, 'pool_maxsize')
+        ),
+        headers=DESTINATIONS[destination]['headers'],
+        follow_redirects=True
+    )
+
+
+def get_async_client(destination):
+    """Return the shared httpx.AsyncClient for a destination class
+
+    The client belongs to the event loop it is first used on; call
+    close_async_clients from that loop when it shuts down.
+    """
+    client = _async_clients.get(destination)
+    if client is None:
+        client = _async_clients[destination] = _build_async_client(destination)
+    return client
+
+
+async def close_async_clients():
+    while _async_clients:
+        _, client = _async_clients.popitem()
+        await client.aclose()
+
+
+class SessionModule:
+    """Stand-in for the requests module that routes calls through a session
+
+    Code written against ``requests.get`` / ``requests.post`` can be pointed
+    at a pooled session by swapping its module-level ``requests`` reference
+    for one of these. Anything other than the HTTP verbs (exceptions, auth
+    helpers, ...) is looked up on the real requests module.
+    """
+
+    def __init__(self, destination):
+        self.destination = destination
+
+    def request(self, method, url, **kwargs):
+        return get_session(self.destination).request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request('PUT', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
@@ -0,0 +1,199 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import nullcontext
+from metrics import CACHE_REQUESTS
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class MediaIdCache:
+    """Persistent map from image URL and content hash to WordPress media ID"""
+
+    def __init__(self, path='media_cache.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._urls = {}
+        self._hashes = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._urls = data.get('urls', {})
+            self._hashes = data.get('hashes', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error("Error loading media cache", extra={'error': str(e)})
+
+    def by_url(self, url):
+        with self._lock:
+            return self._urls.get(url)
+
+    def by_hash(self, digest):
+        with self._lock:
+            return self._hashes.get(digest)
+
+    def record(self, media_id, url=None, digest=None):
+        with self._lock:
+            if url:
+                self._urls[url] = media_id
+            if digest:
+                self._hashes[digest] = media_id
+            self._save()
+
+    def forget(self, media_id):
+        """Drop a media ID that WordPress no longer accepts"""
+        with self._lock:
+            self._urls = {url: mid for url, mid in self._urls.items() if mid != media_id}
+            self._hashes = {digest: mid for digest, mid in self._hashes.items() if mid != media_id}
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.media-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'urls': self._urls, 'hashes': self._hashes}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("Error saving media cache", extra={'error': str(e)})
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+
+class ImagePipeline:
+    """Download, shrink, dedupe and upload featured images
+
+    Images are streamed with a byte cap, resized to ``max_width`` and
+    re-encoded to ``image_format`` when Pillow is installed, and uploaded
+    through the WordPress uploader only when neither the source URL nor the
+    processed image's hash has been uploaded before.
+    """
+
+    def __init__(self, session, uploader, media_cache, max_bytes=10 * 1024 * 1024,
+                 max_width=1600, image_format='WEBP', quality=82, work_dir='images',
+                 upload_slots=None):
+        self.session = session
+        self.uploader = uploader
+        self.media_cache = media_cache
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.image_format = image_format.upper()
+        self.quality = quality
+        self.work_dir = work_dir
+        self.upload_slots = upload_slots or nullcontext()
+        self._uploads = {}
+        self._uploads_lock = threading.Lock()
+
+    def download(self, url):
+        """Stream an image into memory, refusing anything over max_bytes"""
+        with self.session().get(url, stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '')
+            if content_type and not content_type.startswith('image/'):
+                raise ValueError(f"Not an image: {content_type}")
+            declared = response.headers.get('Content-Length')
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise ImageTooLarge(f"{url} is {declared} bytes")
+            buffer = io.BytesIO()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                buffer.write(chunk)
+                if buffer.tell() > self.max_bytes:
+                    raise ImageTooLarge(f"{url} is over {self.max_bytes} bytes")
+        return buffer.getvalue()
+
+    def process(self, data):
+        """Resize and re-encode an image, returning (bytes, extension)"""
+        if Image is None:
+            return data, None
+        with Image.open(io.BytesIO(data)) as image:
+            if getattr(image, 'is_animated', False):
+                # Re-encoding would drop every frame but the first
+                return data, image.format.lower() if image.format else None
+            if image.width > self.max_width:
+                height = round(image.height * self.max_width / image.width)
+                image = image.resize((self.max_width, height), Image.LANCZOS)
+            if self.image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA')
+            output = io.BytesIO()
+            image.save(output, format=self.image_format, quality=self.quality, optimize=True)
+        processed = output.getvalue()
+        if len(processed) >= len(data):
+            return data, None
+        return processed, FORMAT_EXTENSIONS.get(self.image_format)
+
+    def media_id_for(self, url, title='no title'):
+        """WordPress media ID for an image URL, uploading it only if it is new"""
+        media_id = self.media_cache.by_url(url)
+        if media_id:
+            CACHE_REQUESTS.inc(cache='media', result='hit')
+            logger.info("Reusing media", extra={'media_id': media_id, 'url': url})
+            return media_id
+
+        data = self.download(url)
+        data, extension = self.process(data)
+        digest = hashlib.sha256(data).hexdigest()
+        media_id = self.media_cache.by_hash(digest)
+        if media_id:
+            CACHE_REQUESTS.inc(cache='media', result='hit')
+            logger.info("Reusing media for identical image", extra={'media_id': media_id, 'url': url})
+            self.media_cache.record(media_id, url=url)
+            return media_id
+
+        # Two posts uploading the same image at once share one upload
+        with self._uploads_lock:
+            lock = self._uploads.setdefault(digest, threading.Lock())
+        with lock:
+            media_id = self.media_cache.by_hash(digest)
+            if not media_id:
+                CACHE_REQUESTS.inc(cache='media', result='miss')
+                media_id = self._upload(data, digest, extension or self._extension_from_url(url), title)
+            if media_id:
+                # Before the lock is dropped, so a later caller taking a fresh lock finds the upload
+                self.media_cache.record(media_id, url=url, digest=digest)
+            with self._uploads_lock:
+                self._uploads.pop(digest, None)
+        return media_id
+
+    def _upload(self, data, digest, extension, title):
+        os.makedirs(self.work_dir, exist_ok=True)
+        path = os.path.join(self.work_dir, f"{digest[:16]}.{extension}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        try:
+            with self.upload_slots:
+                media_data = self.uploader.upload_to_media_library(path, 'image' + digest[:12], title)
+        finally:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return media_data['id'] if media_data else None
+
+    @staticmethod
+    def _extension_from_url(url):
+        name = url.split('?', 1)[0].rsplit('/', 1)[-1]
+        if '.' in name:
+            extension = name.rsplit('.', 1)[1].lower()
+            if extension.isalnum() and len(extension) <= 4:
+                return extension
+        return 'jpg'
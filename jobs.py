@@ -0,0 +1,175 @@
+import itertools
+import logging
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, params, priority):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.priority = priority
+        self.status = QUEUED
+        self.stage = None
+        self.stages = []
+        self.result = None
+        self.status_code = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        self.changed = threading.Condition()
+        self.version = 0
+
+    def _notify(self):
+        with self.changed:
+            self.version += 1
+            self.changed.notify_all()
+
+    def enter_stage(self, name):
+        """Record progress, aborting the job if it has been cancelled"""
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+        now = time.time()
+        if self.stages and self.stages[-1]['finished_at'] is None:
+            self.stages[-1]['finished_at'] = now
+        self.stage = name
+        self.stages.append({'stage': name, 'started_at': now, 'finished_at': None})
+        self._notify()
+
+    def finish(self, status, result=None, status_code=None, error=None):
+        now = time.time()
+        if self.stages and self.stages[-1]['finished_at'] is None:
+            self.stages[-1]['finished_at'] = now
+        self.status = status
+        self.result = result
+        self.status_code = status_code
+        self.error = error
+        self.finished_at = now
+        self._notify()
+
+    def wait(self, timeout, since_version=None):
+        """Block until the job changes (or finishes) or the timeout passes"""
+        deadline = time.time() + timeout
+        with self.changed:
+            start_version = self.version if since_version is None else since_version
+            while self.status not in FINISHED_STATES and self.version == start_version:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self.changed.wait(remaining)
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'stages': list(self.stages),
+            'priority': self.priority,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'status_code': self.status_code,
+            'error': self.error,
+            'version': self.version,
+        }
+
+
+class JobManager:
+    """Priority queue of pipeline jobs served by a fixed pool of worker threads
+
+    ``handler(job)`` runs the pipeline and returns ``(result, status_code)``.
+    It should call ``job.enter_stage(name)`` between stages so progress is
+    reported and cancellation takes effect. Lower priority numbers run first.
+    """
+
+    def __init__(self, handler, workers=4, retention=3600):
+        self.handler = handler
+        self.retention = retention
+        self._queue = queue.PriorityQueue()
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, params, priority=10):
+        self._prune()
+        job = Job(params, priority)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._queue.put((priority, next(self._counter), job))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        # Under the lock so a worker can't pick the job up between the check and the finish
+        with self._lock:
+            if job.status not in FINISHED_STATES:
+                job.cancel_requested.set()
+                if job.status == QUEUED:
+                    job.finish(CANCELLED)
+        return job
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def _worker(self):
+        while True:
+            _, _, job = self._queue.get()
+            try:
+                with self._lock:
+                    # Cancelled while it waited in the queue
+                    if job.status != QUEUED:
+                        continue
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                job._notify()
+                try:
+                    result, status_code = self.handler(job)
+                    status = SUCCEEDED if status_code < 400 else FAILED
+                    error = result.get('error') if status == FAILED else None
+                    job.finish(status, result=result, status_code=status_code, error=error)
+                except JobCancelled:
+                    job.finish(CANCELLED)
+                except Exception as e:
+                    logger.exception("Error in job", extra={'job_id': job.id})
+                    job.finish(FAILED, status_code=500, error=str(e))
+            finally:
+                self._queue.task_done()
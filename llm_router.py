@@ -0,0 +1,330 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from metrics import STAGE_SECONDS, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BACKEND_REQUESTS = REGISTRY.counter(
+    'blog_llm_backend_requests_total', 'LLM calls per backend, result is ok or failover', ['backend', 'result']
+)
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+class DeadlineExceeded(RuntimeError):
+    pass
+
+
+def _remaining(deadline):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("LLM call deadline passed")
+    return remaining
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Backend:
+    def __init__(self, url, weight=1.0, models=None, max_concurrency=2):
+        self.url = url
+        parts = urlsplit(url)
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+        self.name = parts.netloc
+        self.weight = float(weight) or 1.0
+        self.models = set(models) if models else None
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.outstanding = 0
+        self.healthy = True
+        self.available_models = None
+        self.last_error = None
+        self.last_probe = None
+
+    def serves(self, model):
+        names = self.models if self.models is not None else self.available_models
+        if names is None:
+            return True
+        # Ollama lists "name:latest" for models requested as plain "name"
+        return model in names or f"{model}:latest" in names
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'weight': self.weight,
+            'models': sorted(self.models) if self.models is not None else None,
+            'max_concurrency': self.max_concurrency,
+            'outstanding': self.outstanding,
+            'healthy': self.healthy,
+            'last_error': self.last_error,
+            'last_probe': self.last_probe,
+        }
+
+
+def parse_backends(spec, default_url, default_concurrency=2):
+    """Backends from LLM_BACKENDS: a JSON list of objects, or comma separated chat URLs
+
+    Each JSON object takes ``url`` plus optional ``weight``, ``models`` and
+    ``max_concurrency``. Without a spec the single default URL is used.
+    """
+    spec = (spec or '').strip()
+    if not spec:
+        return [Backend(default_url, max_concurrency=default_concurrency)]
+    if spec.startswith('['):
+        return [
+            Backend(
+                item['url'],
+                weight=item.get('weight', 1.0),
+                models=item.get('models'),
+                max_concurrency=item.get('max_concurrency', default_concurrency)
+            )
+            for item in json.loads(spec)
+        ]
+    return [Backend(url.strip(), max_concurrency=default_concurrency) for url in spec.split(',') if url.strip()]
+
+
+class LLMRouter:
+    """Spread Ollama chat calls over a pool of backends
+
+    Each call goes to the backend serving the model with the fewest
+    outstanding requests relative to its weight, and waits while every such
+    backend is at its max_concurrency. A backend that refuses connections is
+    marked down and the call fails over to the next one; a background probe
+    of ``/api/tags`` marks it up again, and warms its models through
+    ``keep_alive`` when it comes back. Warm-ups load models with ``num_ctx``,
+    which should match the real requests or the first of them reloads.
+    """
+
+    def __init__(self, backends, session, keep_alive=None, probe_interval=15.0,
+                 probe_timeout=3.0, warm_models=(), num_ctx=None):
+        self.backends = backends
+        self.session = session
+        self.keep_alive = keep_alive
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.warm_models = list(warm_models)
+        self.num_ctx = num_ctx
+        self._cond = threading.Condition()
+        # (loop, future) of coroutines waiting in achat for a free backend
+        self._async_waiters = []
+        self._started = False
+
+    def capacity(self):
+        return sum(backend.max_concurrency for backend in self.backends)
+
+    def _pick(self, model, exclude):
+        candidates = [b for b in self.backends if b not in exclude and b.serves(model)]
+        if not candidates:
+            return None, False
+        healthy = [b for b in candidates if b.healthy]
+        # With every candidate marked down, try them anyway rather than fail outright
+        pool = healthy or candidates
+        free = [b for b in pool if b.outstanding < b.max_concurrency]
+        if not free:
+            return None, True
+        best = min((b.outstanding + 1) / b.weight for b in free)
+        return random.choice([b for b in free if (b.outstanding + 1) / b.weight == best]), True
+
+    def _notify(self):
+        """Wake threads and coroutines waiting for a backend; call with _cond held"""
+        self._cond.notify_all()
+        for loop, waiter in self._async_waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+        self._async_waiters = []
+
+    def _acquire(self, model, exclude, deadline=None):
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                backend, exists = self._pick(model, exclude)
+                if backend is not None:
+                    backend.outstanding += 1
+                    break
+                if not exists:
+                    raise NoBackendAvailable(f"No LLM backend available for model {model}")
+                self._cond.wait(_remaining(deadline) if deadline else None)
+        STAGE_SECONDS.observe(time.monotonic() - started, stage='llm_queue')
+        return backend
+
+    async def _acquire_async(self, model, exclude):
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                backend, exists = self._pick(model, exclude)
+                if backend is not None:
+                    backend.outstanding += 1
+                    break
+                if not exists:
+                    raise NoBackendAvailable(f"No LLM backend available for model {model}")
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+        STAGE_SECONDS.observe(time.monotonic() - started, stage='llm_queue')
+        return backend
+
+    def _release(self, backend):
+        with self._cond:
+            backend.outstanding -= 1
+            self._notify()
+
+    def _mark_down(self, backend, error):
+        with self._cond:
+            was_healthy = backend.healthy
+            backend.healthy = False
+            backend.last_error = str(error)
+            self._notify()
+        if was_healthy:
+            logger.warning("LLM backend down", extra={'backend': backend.name, 'error': str(error)})
+
+    def _mark_up(self, backend):
+        with self._cond:
+            was_healthy = backend.healthy
+            backend.healthy = True
+            backend.last_error = None
+            self._notify()
+        if not was_healthy:
+            logger.info("LLM backend up", extra={'backend': backend.name})
+        return not was_healthy
+
+    @contextmanager
+    def chat(self, payload, stream=False, deadline=None):
+        """POST a chat payload to the least loaded backend, yielding the response
+
+        The backend's slot is held until the block exits, so streamed
+        responses should be consumed inside it. Only connection failures
+        fail over; once a backend has answered its response is returned as is.
+        With a time.monotonic() deadline, waiting for a backend gives up with
+        DeadlineExceeded once it passes and the read timeout is cut to the
+        time left, so abandoned requests don't hold on to a GPU slot.
+        """
+        if self.keep_alive and 'keep_alive' not in payload:
+            payload = dict(payload, keep_alive=self.keep_alive)
+        tried = set()
+        while True:
+            backend = self._acquire(payload.get('model'), tried, deadline)
+            try:
+                session = self.session()
+                kwargs = {}
+                if deadline:
+                    connect_timeout = (getattr(session, 'default_timeout', None) or (None, None))[0]
+                    kwargs['timeout'] = (connect_timeout, _remaining(deadline))
+                try:
+                    response = session.post(backend.url, json=payload, stream=stream, **kwargs)
+                except requests.exceptions.ConnectionError as e:
+                    tried.add(backend)
+                    self._mark_down(backend, e)
+                    BACKEND_REQUESTS.inc(backend=backend.name, result='failover')
+                    with self._cond:
+                        remaining = self._pick(payload.get('model'), tried)[1]
+                    if not remaining:
+                        raise
+                    continue
+                BACKEND_REQUESTS.inc(backend=backend.name, result='ok')
+                with response:
+                    yield response
+                return
+            finally:
+                self._release(backend)
+
+    @asynccontextmanager
+    async def achat(self, payload, client, stream=False):
+        """chat for asyncio code, posting through an httpx.AsyncClient
+
+        Waiting for a free backend doesn't block the event loop, and the
+        backend limits are shared with the threads using chat.
+        """
+        # Only the ASGI server uses httpx, the Flask server runs without it
+        import httpx
+
+        if self.keep_alive and 'keep_alive' not in payload:
+            payload = dict(payload, keep_alive=self.keep_alive)
+        tried = set()
+        while True:
+            backend = await self._acquire_async(payload.get('model'), tried)
+            try:
+                try:
+                    request = client.build_request('POST', backend.url, json=payload)
+                    response = await client.send(request, stream=stream)
+                except httpx.ConnectError as e:
+                    tried.add(backend)
+                    self._mark_down(backend, e)
+                    BACKEND_REQUESTS.inc(backend=backend.name, result='failover')
+                    with self._cond:
+                        remaining = self._pick(payload.get('model'), tried)[1]
+                    if not remaining:
+                        raise
+                    continue
+                BACKEND_REQUESTS.inc(backend=backend.name, result='ok')
+                try:
+                    yield response
+                finally:
+                    await response.aclose()
+                return
+            finally:
+                self._release(backend)
+
+    def models_for(self, backend):
+        if backend.models is not None:
+            return sorted(backend.models)
+        return [model for model in self.warm_models if backend.serves(model)]
+
+    def warm_up(self, backend):
+        """Load a backend's models ahead of the first real request"""
+        for model in self.models_for(backend):
+            payload = {'model': model, 'messages': []}
+            if self.num_ctx:
+                payload['options'] = {'num_ctx': self.num_ctx}
+            if self.keep_alive:
+                payload['keep_alive'] = self.keep_alive
+            try:
+                self.session().post(backend.url, json=payload, timeout=(self.probe_timeout, 300)).close()
+                logger.info("Warmed up model", extra={'backend': backend.name, 'model': model})
+            except requests.RequestException as e:
+                logger.warning("Model warm-up failed", extra={'backend': backend.name, 'model': model, 'error': str(e)})
+
+    def probe(self, backend):
+        try:
+            response = self.session().get(backend.base_url + '/api/tags', timeout=self.probe_timeout)
+            response.raise_for_status()
+            models = response.json().get('models', [])
+            backend.available_models = {model.get('name') for model in models if model.get('name')} or None
+        except (requests.RequestException, ValueError) as e:
+            backend.last_probe = time.time()
+            self._mark_down(backend, e)
+            return False
+        backend.last_probe = time.time()
+        return self._mark_up(backend)
+
+    def _probe_loop(self):
+        first = True
+        while True:
+            for backend in self.backends:
+                recovered = self.probe(backend)
+                if backend.healthy and (recovered or first):
+                    # Loading a large model can take minutes, don't hold up the probes
+                    threading.Thread(target=self.warm_up, args=(backend,), daemon=True).start()
+            first = False
+            time.sleep(self.probe_interval)
+
+    def start(self):
+        """Start the background health probe, which also does the first warm-up"""
+        if self._started or self.probe_interval <= 0:
+            return
+        self._started = True
+        threading.Thread(target=self._probe_loop, name='llm-probe', daemon=True).start()
+
+    def snapshot(self):
+        with self._cond:
+            return [backend.to_dict() for backend in self.backends]
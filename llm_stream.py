@@ -0,0 +1,239 @@
+import json
+import re
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+
+
+def _chat_line(line):
+    data = json.loads(line)
+    if data.get('error'):
+        raise RuntimeError(data['error'])
+    return data
+
+
+def iter_chat_stream(response):
+    """Yield the decoded JSON objects of an Ollama streaming chat response"""
+    for line in response.iter_lines():
+        if line:
+            yield _chat_line(line)
+
+
+async def aiter_chat_stream(response):
+    """iter_chat_stream for a streaming httpx response"""
+    async for line in response.aiter_lines():
+        if line:
+            yield _chat_line(line)
+
+
+def sse_event(event, data):
+    """Format one Server-Sent Event carrying a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class ThinkStreamFilter:
+    """Streaming counterpart of remove_before_think_end
+
+    Text is fed in as it arrives and visible pieces come back as
+    ``('token', text)`` events. Output that opens with ``<think>`` is held
+    back until ``</think>``. Output that doesn't is passed straight through,
+    but if a ``</think>`` shows up later a ``('reset', '')`` event is emitted
+    so the client can drop what it has shown, exactly like the non-streaming
+    version drops everything before the tag.
+    """
+
+    def __init__(self):
+        self.raw = ''
+        self.mode = 'undecided'
+        self.emitted = 0
+        self.checked = 0
+        self.started = False
+
+    def _find_close(self):
+        start = max(0, self.checked - len(THINK_CLOSE) + 1)
+        self.checked = len(self.raw)
+        return self.raw.find(THINK_CLOSE, start)
+
+    def feed(self, chunk):
+        self.raw += chunk
+        events = []
+
+        if self.mode == 'undecided':
+            head = self.raw.lstrip()
+            if head.startswith(THINK_OPEN):
+                self.mode = 'thinking'
+            elif not head or THINK_OPEN.startswith(head):
+                return events
+            else:
+                self.mode = 'passthrough'
+
+        if self.mode in ('thinking', 'passthrough'):
+            index = self._find_close()
+            if index != -1:
+                if self.mode == 'passthrough' and self.emitted:
+                    events.append(('reset', ''))
+                self.mode = 'after'
+                self.emitted = index + len(THINK_CLOSE)
+            elif self.mode == 'passthrough':
+                text = self.raw[self.emitted:]
+                self.emitted = len(self.raw)
+                if text:
+                    events.append(('token', text))
+                return events
+            else:
+                return events
+
+        text = self.raw[self.emitted:]
+        self.emitted = len(self.raw)
+        if not self.started:
+            text = text.lstrip()
+            self.started = bool(text)
+        if text:
+            events.append(('token', text))
+        return events
+
+    def content(self):
+        """The full visible text, identical to remove_before_think_end(raw)"""
+        if THINK_CLOSE in self.raw:
+            return self.raw.split(THINK_CLOSE, 1)[1].strip()
+        return self.raw
+
+
+class JsonObjectScanner:
+    """Incremental reader for the first complete top-level JSON object in a stream
+
+    Text before the first ``{`` (prose, a ```json fence) is skipped. Braces
+    inside strings are ignored. A candidate that closes but doesn't parse is
+    dropped and scanning carries on with the rest of the text.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def feed(self, text):
+        """Consume text, returning the object's source once it is complete"""
+        for char in text:
+            if not self.depth:
+                if char != '{':
+                    continue
+                self.buffer = []
+            self.buffer.append(char)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+            if char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if not self.depth:
+                    candidate = ''.join(self.buffer)
+                    try:
+                        json.loads(candidate)
+                        return candidate
+                    except ValueError:
+                        self.reset()
+        return None
+
+
+class _JsonObjectReader:
+    def __init__(self):
+        self.think_filter = ThinkStreamFilter()
+        self.scanner = JsonObjectScanner()
+
+    def feed(self, data):
+        """Consume one chat message, returning the object's source once it is complete"""
+        piece = data.get('message', {}).get('content')
+        if not piece:
+            return None
+        for event, text in self.think_filter.feed(piece):
+            if event == 'reset':
+                self.scanner.reset()
+                continue
+            found = self.scanner.feed(text)
+            if found:
+                return found
+        return None
+
+    def finish(self):
+        # The filter may have held back text it couldn't classify, scan it all once more
+        visible_text = self.think_filter.content()
+        return JsonObjectScanner().feed(visible_text), visible_text
+
+
+def read_json_object(response, on_done=None):
+    """Read a streaming chat response only until its first JSON object closes
+
+    Returns ``(json_text, visible_text)``. json_text is None when the stream
+    ended without a complete object. Returning early closes the response,
+    which makes Ollama stop generating. ``on_done`` is called with the final
+    message when the stream runs to completion.
+    """
+    reader = _JsonObjectReader()
+    for data in iter_chat_stream(response):
+        found = reader.feed(data)
+        if found:
+            return found, reader.think_filter.content()
+        if data.get('done'):
+            if on_done:
+                on_done(data)
+            break
+    return reader.finish()
+
+
+async def aread_json_object(response, on_done=None):
+    """read_json_object for a streaming httpx response"""
+    reader = _JsonObjectReader()
+    async for data in aiter_chat_stream(response):
+        found = reader.feed(data)
+        if found:
+            return found, reader.think_filter.content()
+        if data.get('done'):
+            if on_done:
+                on_done(data)
+            break
+    return reader.finish()
+
+
+def extract_json_from_text(text):
+    """Best-effort JSON extraction from a complete, non-streamed answer"""
+    json_block_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
+    if json_block_match:
+        return json_block_match.group(1)
+    brace_start = text.find('{')
+    if brace_start != -1:
+        brace_count = 0
+        for i, char in enumerate(text[brace_start:], brace_start):
+            if char == '{':
+                brace_count += 1
+            elif char == '}':
+                brace_count -= 1
+                if brace_count == 0:
+                    return text[brace_start:i+1]
+    bracket_start = text.find('[')
+    if bracket_start != -1:
+        bracket_count = 0
+        for i, char in enumerate(text[bracket_start:], bracket_start):
+            if char == '[':
+                bracket_count += 1
+            elif char == ']':
+                bracket_count -= 1
+                if bracket_count == 0:
+                    return text[bracket_start:i+1]
+    cleaned = re.sub(r'```json\s*', '', text)
+    cleaned = re.sub(r'```\s*$', '', cleaned)
+    cleaned = re.sub(r'//.*$', '', cleaned, flags=re.MULTILINE)
+    cleaned = re.sub(r'/\*.*?\*/', '', cleaned, flags=re.DOTALL)
+    return cleaned.strip()
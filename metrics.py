@@ -0,0 +1,191 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Pipeline stages range from a cache lookup to a multi-minute generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._samples(list(zip(self.labels, key)), value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self, pairs, value):
+        yield f"{self.name}{_format_labels(pairs)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def _samples(self, pairs, state):
+        counts, total, count = state
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = pairs + [('le', _format_value(bound))]
+            yield f"{self.name}_bucket{_format_labels(le)} {cumulative}"
+        yield f"{self.name}_sum{_format_labels(pairs)} {_format_value(total)}"
+        yield f"{self.name}_count{_format_labels(pairs)} {count}"
+
+
+class Gauge(_Metric):
+    """A gauge read from a callback when the metrics are scraped"""
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, fn):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def render(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format_value(value)}"
+        ]
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def gauge(self, name, documentation, fn):
+        return self.register(Gauge(name, documentation, fn))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'blog_stage_seconds', 'Time spent in each pipeline stage', ['stage']
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'blog_request_seconds', 'Time until the response starts, by endpoint', ['endpoint', 'status']
+)
+LLM_TOKENS = REGISTRY.counter(
+    'blog_llm_tokens_total', 'Tokens Ollama evaluated, prompt is prefill and eval is decode', ['profile', 'phase']
+)
+LLM_PHASE_SECONDS = REGISTRY.histogram(
+    'blog_llm_phase_seconds', 'Ollama prefill (prompt) and decode (eval) time per call', ['profile', 'phase']
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'blog_cache_requests_total', 'Cache lookups by cache and result', ['cache', 'result']
+)
+REJECTIONS = REGISTRY.counter(
+    'blog_rejections_total', 'URLs refused without fetching, by reason', ['reason']
+)
+ERRORS = REGISTRY.counter(
+    'blog_errors_total', 'Failures by stage, kind is error, http or timeout', ['stage', 'kind']
+)
+
+
+def observe_llm_response(profile, data):
+    """Record the token counts and durations Ollama reports on a finished call"""
+    for phase, prefix in (('prompt', 'prompt_eval'), ('eval', 'eval')):
+        tokens = data.get(f'{prefix}_count')
+        if tokens:
+            LLM_TOKENS.inc(tokens, profile=profile, phase=phase)
+        duration = data.get(f'{prefix}_duration')
+        if duration:
+            # Ollama reports durations in nanoseconds
+            LLM_PHASE_SECONDS.observe(duration / 1e9, profile=profile, phase=phase)
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _hash64(text):
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text, shingle_size=3):
+    """64-bit SimHash over word shingles; similar texts differ in few bits"""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < shingle_size:
+        shingles = [' '.join(words)] if words else []
+    else:
+        shingles = {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+    counts = [0] * FINGERPRINT_BITS
+    for shingle in shingles:
+        value = _hash64(shingle)
+        for bit in range(FINGERPRINT_BITS):
+            counts[bit] += 1 if value >> bit & 1 else -1
+    fingerprint = 0
+    for bit, count in enumerate(counts):
+        if count > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def content_digest(text):
+    return _hash64(text.strip())
+
+
+class NearDuplicateIndex:
+    """SimHash index of generated articles with banded lookup
+
+    Fingerprints are split into ``max_distance + 1`` bands; by the pigeonhole
+    principle two fingerprints within ``max_distance`` bits agree exactly on
+    at least one band, so a lookup only compares against articles sharing a
+    band value, found by binary search in a sorted array per band. Memory
+    holds arrays of integers only (a few dozen bytes per article); the
+    generated results live in an append-only JSON lines file and are read
+    back by offset when a match is found.
+    """
+
+    def __init__(self, path='near_duplicates.jsonl', max_distance=3, min_words=50):
+        self.path = path
+        self.max_distance = max_distance
+        self.min_words = min_words
+        bands = max_distance + 1
+        width = FINGERPRINT_BITS // bands
+        self._bands = [
+            (i * width, FINGERPRINT_BITS - i * width if i == bands - 1 else width) for i in range(bands)
+        ]
+        self._lock = threading.Lock()
+        self._fingerprints = array('Q')
+        self._offsets = array('Q')
+        self._digests = array('Q')
+        self._band_keys = [array('Q') for _ in self._bands]
+        self._band_records = [array('I') for _ in self._bands]
+        self._published = {}
+        self._load()
+
+    def _band_value(self, fingerprint, band):
+        shift, width = self._bands[band]
+        return fingerprint >> shift & ((1 << width) - 1)
+
+    def _append_record(self, fingerprint, offset, digest):
+        self._fingerprints.append(fingerprint)
+        self._offsets.append(offset)
+        self._digests.append(digest)
+
+    def _insert(self, fingerprint, offset, digest):
+        record = len(self._fingerprints)
+        self._append_record(fingerprint, offset, digest)
+        for band, (keys, records) in enumerate(zip(self._band_keys, self._band_records)):
+            value = self._band_value(fingerprint, band)
+            position = bisect_right(keys, value)
+            keys.insert(position, value)
+            records.insert(position, record)
+
+    def _load(self):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            offset = 0
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    if 'published' in entry:
+                        # Published entries point at the article entry's file offset
+                        self._published[entry['published']] = entry['link']
+                    else:
+                        self._append_record(entry['fingerprint'], offset, entry['digest'])
+                except (ValueError, KeyError) as e:
+                    logger.warning("Skipping bad near-duplicate entry", extra={'offset': offset, 'error': str(e)})
+                offset += len(line)
+        # Sort each band once rather than inserting record by record, which is quadratic
+        for band in range(len(self._bands)):
+            values = [self._band_value(fingerprint, band) for fingerprint in self._fingerprints]
+            order = sorted(range(len(values)), key=values.__getitem__)
+            self._band_keys[band] = array('Q', (values[record] for record in order))
+            self._band_records[band] = array('I', order)
+        logger.info("Loaded near-duplicate index", extra={'articles': len(self._fingerprints)})
+
+    def _append(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8')
+        with open(self.path, 'ab') as f:
+            offset = f.tell()
+            f.write(line)
+        return offset
+
+    def _read(self, record):
+        with open(self.path, 'rb') as f:
+            f.seek(self._offsets[record])
+            return json.loads(f.readline())
+
+    def usable(self, text):
+        return bool(text) and len(WORD_RE.findall(text)) >= self.min_words
+
+    def find(self, text):
+        """The closest earlier article within max_distance bits, or None
+
+        Returns a dict with the stored ``url``, ``result`` and
+        ``generated_at`` plus ``distance`` and, once published,
+        ``wordpress_url``.
+        """
+        if not self.usable(text):
+            return None
+        fingerprint = simhash(text)
+        with self._lock:
+            best = None
+            for band, (keys, records) in enumerate(zip(self._band_keys, self._band_records)):
+                value = self._band_value(fingerprint, band)
+                for position in range(bisect_left(keys, value), bisect_right(keys, value)):
+                    record = records[position]
+                    distance = bin(self._fingerprints[record] ^ fingerprint).count('1')
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (record, distance)
+            if best is None:
+                return None
+            record, distance = best
+            try:
+                entry = self._read(record)
+            except (OSError, ValueError) as e:
+                logger.error("Error reading near-duplicate entry", extra={'record': record, 'error': str(e)})
+                return None
+            entry['distance'] = distance
+            entry['wordpress_url'] = self._published.get(self._offsets[record])
+            return entry
+
+    def add(self, text, url, result):
+        """Remember the result generated for an article's text"""
+        if not self.usable(text):
+            return
+        fingerprint = simhash(text)
+        digest = content_digest(result.get('content', ''))
+        entry = {
+            'fingerprint': fingerprint,
+            'digest': digest,
+            'url': url,
+            'generated_at': datetime.now().isoformat(timespec='seconds'),
+            'result': result,
+        }
+        with self._lock:
+            try:
+                offset = self._append(entry)
+            except OSError as e:
+                logger.error("Error saving near-duplicate entry", extra={'url': url, 'error': str(e)})
+                return
+            self._insert(fingerprint, offset, digest)
+
+    def mark_published(self, content, link):
+        """Attach a WordPress link to the article whose generated post this is"""
+        digest = content_digest(content)
+        with self._lock:
+            try:
+                # array.index scans in C, fast enough for the publish path
+                record = len(self._digests) - 1 - self._digests[::-1].index(digest)
+            except ValueError:
+                return
+            offset = self._offsets[record]
+            self._published[offset] = link
+            try:
+                self._append({'published': offset, 'link': link})
+            except OSError as e:
+                logger.error("Error saving near-duplicate entry", extra={'link': link, 'error': str(e)})
+
+    def __len__(self):
+        return len(self._fingerprints)
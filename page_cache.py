@@ -0,0 +1,161 @@
+import os
+import json
+import logging
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from page_ingest import PageResult
+
+logger = logging.getLogger(__name__)
+
+TRACKING_PARAMS = {'fbclid', 'gclid', 'mc_cid', 'mc_eid', 'cmpid', 'ref'}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """Canonical form of a URL used as the cache key"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (key.lower().startswith('utm_') or key.lower() in TRACKING_PARAMS)
+    )
+    path = parts.path or '/'
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def url_key(url):
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+
+class PageCache:
+    """Disk-backed cache of parsed pages keyed by normalized URL
+
+    Each entry stores the PageResult plus the validators (ETag and
+    Last-Modified) needed to revalidate it with a conditional GET once it is
+    older than ``ttl`` seconds. Entries are evicted least recently used first
+    when the cache grows past ``max_bytes``.
+    """
+
+    def __init__(self, folder='page_cache', max_bytes=200 * 1024 * 1024, ttl=3600):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(folder, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _load_index(self):
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total_bytes += size
+
+    def get(self, url):
+        """Return the cached entry for a URL, or None"""
+        key = url_key(url)
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            self._discard(key)
+            return None
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get('fetched_at', 0) < self.ttl
+
+    @staticmethod
+    def to_page(entry):
+        return PageResult(**entry['page'])
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, page, etag=None, last_modified=None):
+        entry = {
+            'url': normalize_url(url),
+            'page': asdict(page),
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+        }
+        try:
+            self._write(url_key(url), entry)
+        except OSError as e:
+            logger.error("Error writing page cache entry", extra={'url': url, 'error': str(e)})
+        return entry
+
+    def touch(self, url, entry):
+        """Mark an entry as revalidated (the origin answered 304)"""
+        entry['fetched_at'] = time.time()
+        try:
+            self._write(url_key(url), entry)
+        except OSError as e:
+            logger.error("Error writing page cache entry", extra={'url': url, 'error': str(e)})
+
+    def _write(self, key, entry):
+        data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(prefix='.page-', dir=self.folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._total_bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            evicted = self._evict()
+        for old_key in evicted:
+            try:
+                os.unlink(self._path(old_key))
+            except OSError:
+                pass
+
+    def _evict(self):
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            evicted.append(key)
+        return evicted
+
+    def _discard(self, key):
+        with self._lock:
+            self._total_bytes -= self._index.pop(key, 0)
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
@@ -0,0 +1,201 @@
+import codecs
+import re
+from dataclasses import dataclass
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from content_extract import extract_main_text
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+META_IMAGE_PROPS = [
+    ("property", "og:image"),
+    ("name", "twitter:image"),
+    ("name", "image"),
+]
+
+PAGE_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain', 'text/xml', 'application/xml')
+# How much of the body to look through for a BOM or <meta charset>
+SNIFF_BYTES = 1024
+META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w-]+)', re.I)
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+class UnsupportedContent(ValueError):
+    """The response isn't a document we can turn into text"""
+
+
+@dataclass
+class PageResult:
+    """Everything later pipeline steps need from a single page download"""
+    url: str
+    text: str
+    image_url: str = ""
+    title: str = ""
+    canonical_url: str = ""
+    charset: str = ""
+    main_text: str = ""
+
+    @property
+    def article_text(self):
+        """The extracted article body, falling back to the whole page text"""
+        return self.main_text or self.text
+
+
+def clean_text(text):
+    """Collapse page text into a single line of visible phrases"""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def extract_meta_image(soup, page_url):
+    for attr, key in META_IMAGE_PROPS:
+        tag = soup.find("meta", attrs={attr: key})
+        if tag and tag.get("content"):
+            return urljoin(page_url, tag["content"])
+    return ""
+
+
+def extract_charset(soup, fallback=""):
+    tag = soup.find("meta", attrs={"charset": True})
+    if tag:
+        return tag["charset"].strip().lower()
+    tag = soup.find("meta", attrs={"http-equiv": re.compile(r'^content-type$', re.I)})
+    if tag and tag.get("content"):
+        match = re.search(r'charset=([\w-]+)', tag["content"], re.I)
+        if match:
+            return match.group(1).lower()
+    return (fallback or "").lower()
+
+
+def parse_page(page_url, html, charset=""):
+    """Parse a downloaded document once and pull out text, image and metadata"""
+    soup = BeautifulSoup(html, HTML_PARSER)
+
+    image_url = extract_meta_image(soup, page_url)
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    canonical_url = ""
+    canonical = soup.find("link", rel="canonical")
+    if canonical and canonical.get("href"):
+        canonical_url = urljoin(page_url, canonical["href"])
+    charset = extract_charset(soup, charset or soup.original_encoding or "")
+
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = clean_text(soup.get_text())
+    main_text = extract_main_text(soup, clean_text)
+
+    return PageResult(
+        url=page_url,
+        text=text,
+        image_url=image_url,
+        title=title,
+        canonical_url=canonical_url,
+        charset=charset,
+        main_text=main_text
+    )
+
+
+def known_charset(name):
+    """The codec name for a declared charset, or "" if Python doesn't know it"""
+    if not name:
+        return ""
+    try:
+        return codecs.lookup(name.strip().strip('"\'')).name
+    except LookupError:
+        return ""
+
+
+def check_content_type(content_type):
+    """Split a Content-Type header into (mime type, charset), refusing non-documents
+
+    A missing header is let through, plenty of origins leave it off.
+    """
+    mime, _, params = (content_type or '').partition(';')
+    mime = mime.strip().lower()
+    if mime and mime not in PAGE_CONTENT_TYPES:
+        raise UnsupportedContent(f"Unsupported content type {mime}")
+    match = re.search(r'charset\s*=\s*["\']?([\w-]+)', params, re.I)
+    return mime, known_charset(match.group(1)) if match else ""
+
+
+def sniff_charset(head, final=False):
+    """Charset from a BOM or an early <meta charset>, else utf-8 unless the bytes say otherwise"""
+    for bom, charset in BOMS:
+        if head.startswith(bom):
+            return charset
+    match = META_CHARSET_RE.search(head)
+    charset = known_charset(match.group(1).decode('ascii')) if match else ""
+    if charset:
+        return charset
+    try:
+        # Unless it's the whole body, a multi-byte character may be cut off at the end
+        codecs.getincrementaldecoder('utf-8')().decode(head, final)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'cp1252'
+
+
+class PageReader:
+    """Decode a page download chunk by chunk within a byte budget
+
+    The Content-Type is checked before any of the body is read, the charset
+    comes from the header, a BOM or an early <meta charset>, and the body
+    is decoded incrementally so the raw bytes are never held in full.
+    Nothing past max_bytes is read.
+    """
+
+    def __init__(self, page_url, content_type, max_bytes):
+        _, self.charset = check_content_type(content_type)
+        self.page_url = page_url
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.truncated = False
+        self._sniffed = bytearray()
+        self._decoder = None
+        self._parts = []
+
+    def _start(self, final=False):
+        self.charset = self.charset or sniff_charset(bytes(self._sniffed), final)
+        self._decoder = codecs.getincrementaldecoder(self.charset)(errors='replace')
+        self._decode(bytes(self._sniffed))
+        self._sniffed = None
+
+    def _decode(self, chunk, final=False):
+        text = self._decoder.decode(chunk, final)
+        if text:
+            self._parts.append(text)
+
+    def feed(self, chunk):
+        """Take the next chunk of the body, returning False once no more is wanted"""
+        if self.received + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.received]
+            self.truncated = True
+        self.received += len(chunk)
+        if self._decoder is None:
+            self._sniffed.extend(chunk)
+            if len(self._sniffed) < SNIFF_BYTES and not self.truncated:
+                return True
+            self._start()
+        else:
+            self._decode(chunk)
+        return not self.truncated
+
+    def close(self):
+        if self._decoder is None:
+            self._start(final=True)
+        self._decode(b'', final=True)
+
+    def page(self):
+        """The PageResult for what was read"""
+        html = ''.join(self._parts)
+        self._parts = []
+        return parse_page(self.page_url, html, self.charset)
@@ -0,0 +1,144 @@
+import math
+import re
+from collections import Counter
+
+# Rough characters-per-token for English prose with llama-style tokenizers.
+# Errs on the side of overestimating so prompts are not cut off by Ollama.
+CHARS_PER_TOKEN = 3.5
+CONTEXT_MARGIN = 64
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'“(])')
+WORD_RE = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have he her his i in is it its of on or our '
+    'she so that the their them they this to was we were will with you your not no do does'.split()
+)
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_messages_tokens(messages):
+    # A few tokens of chat-template framing per message
+    return sum(estimate_tokens(message.get('content', '')) + 4 for message in messages)
+
+
+def split_long(sentence, max_chars):
+    """Cut a sentence longer than max_chars into pieces at whitespace, or anywhere if it has none"""
+    if len(sentence) <= max_chars:
+        return [sentence]
+    pieces = []
+    current = ''
+    for word in sentence.split():
+        while len(word) > max_chars:
+            # CJK and other unspaced scripts: hard cut
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(word[:max_chars])
+            word = word[max_chars:]
+        if current and len(current) + 1 + len(word) > max_chars:
+            pieces.append(current)
+            current = ''
+        current = f'{current} {word}' if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sentences(text, max_chars=None):
+    """Sentences of text; with max_chars, over-long ones are cut into pieces of at most that"""
+    sentences = [sentence.strip() for sentence in SENTENCE_RE.split(text) if sentence.strip()]
+    if not max_chars:
+        return sentences
+    return [piece for sentence in sentences for piece in split_long(sentence, max_chars)]
+
+
+def select_sentences(text, budget_tokens):
+    """Extractive summary: the highest-scoring sentences that fit, in original order
+
+    Sentences score by the document frequency of their content words with a
+    bias towards the lead, which is where news copy puts the facts.
+    """
+    # Leave room for the joining space so any single piece fits the budget
+    max_chars = max(1, int((budget_tokens - 1) * CHARS_PER_TOKEN))
+    sentences = split_sentences(text, max_chars)
+    if not sentences:
+        return text[:int(budget_tokens * CHARS_PER_TOKEN)]
+
+    frequencies = Counter(
+        word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS
+    )
+    top = max(frequencies.values()) if frequencies else 1
+
+    scored = []
+    for position, sentence in enumerate(sentences):
+        words = [word for word in WORD_RE.findall(sentence.lower()) if word not in STOPWORDS]
+        # Text without latin words (CJK, stopwords only) still competes on position
+        relevance = sum(frequencies[word] for word in words) / (top * len(words)) if words else 0.0
+        lead_bonus = 1.0 / (1 + position / 5)
+        scored.append((relevance + lead_bonus, position, sentence))
+    scored.sort(reverse=True)
+
+    chosen = []
+    used = 0
+    for _, position, sentence in scored:
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > budget_tokens:
+            continue
+        chosen.append((position, sentence))
+        used += cost
+    chosen.sort()
+    if not chosen:
+        return text[:max_chars]
+    return ' '.join(sentence for _, sentence in chosen)
+
+
+def chunk_text(text, chunk_tokens):
+    """Split text into sentence-aligned chunks of about chunk_tokens each"""
+    chunks = []
+    current = []
+    used = 0
+    for sentence in split_sentences(text, max(1, int(chunk_tokens * CHARS_PER_TOKEN))):
+        cost = estimate_tokens(sentence) + 1
+        if current and used + cost > chunk_tokens:
+            chunks.append(' '.join(current))
+            current, used = [], 0
+        current.append(sentence)
+        used += cost
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def fit_text(text, budget_tokens, summarize_chunk=None, map_reduce_ratio=4):
+    """Fit article text into a token budget
+
+    Text that already fits is returned unchanged. Text up to
+    ``map_reduce_ratio`` times the budget (or any size when no
+    ``summarize_chunk`` callable is given) is cut down by extractive sentence
+    selection. Longer text is pre-summarized chunk by chunk with
+    ``summarize_chunk(chunk, budget)`` and the joined summaries are then fitted
+    the same way.
+    """
+    if budget_tokens <= 0:
+        return ''
+    tokens = estimate_tokens(text)
+    if tokens <= budget_tokens:
+        return text
+
+    if summarize_chunk and tokens > budget_tokens * map_reduce_ratio:
+        chunks = chunk_text(text, budget_tokens)
+        per_chunk = max(64, budget_tokens // len(chunks))
+        summaries = []
+        for chunk in chunks:
+            summary = summarize_chunk(chunk, per_chunk)
+            summaries.append(summary if summary else select_sentences(chunk, per_chunk))
+        text = ' '.join(summaries)
+        if estimate_tokens(text) <= budget_tokens:
+            return text
+
+    return select_sentences(text, budget_tokens)
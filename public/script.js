@@ -34,6 +34,7 @@ document.addEventListener('DOMContentLoaded', () => {
   let lastPrompt = '';
   let lastTitle = '';
   let lastCategory = '';
+  let lastPublishKey = '';
   let autoPostTimer = null;
   let countdownInterval = null;
 
@@ -268,8 +269,70 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // Read the Server-Sent Events of /generate-stream, showing the post as it is written
+  async function readGenerateStream(res) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let streamed = '';
+    let result = null;
+
+    const handleEvent = (event, payload) => {
+      if (event === 'token') {
+        if (!streamed) {
+          resultDiv.classList.remove('hidden');
+          confirmBtn.disabled = true;
+          updateStatus('loading', 'Writing...');
+        }
+        streamed += payload.text;
+        generatedContent.textContent = streamed;
+      } else if (event === 'reset') {
+        streamed = '';
+        generatedContent.textContent = '';
+      } else if (event === 'content') {
+        generatedContent.textContent = payload.content;
+        updateStatus('loading', 'Generating title and category...');
+      } else if (event === 'done') {
+        result = payload;
+      } else if (event === 'error') {
+        const error = new Error(payload.error || 'Failed to generate content');
+        error.streamError = true;
+        throw error;
+      }
+    };
+
+    try {
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          let event = 'message';
+          let dataText = '';
+          rawEvent.split('\n').forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+          });
+          if (dataText) handleEvent(event, JSON.parse(dataText));
+        }
+      }
+    } finally {
+      confirmBtn.disabled = false;
+    }
+
+    if (!result) {
+      const error = new Error('Content stream ended unexpectedly');
+      error.streamError = true;
+      throw error;
+    }
+    return result;
+  }
+
   // Generate Content
-  async function generateContent(prompt) {
+  async function generateContent(prompt, options = {}) {
     showLoading('Generating content...');
     setButtonLoading(generateBtn, true);
     startThinking();
@@ -281,8 +344,12 @@ document.addEventListener('DOMContentLoaded', () => {
       } else {
         body.prompt = prompt;
       }
+      // Asking again for the same input wants a new post, not the earlier one
+      if (options.distinct) {
+        body.distinct = true;
+      }
 
-      const res = await fetch('/api/generate', {
+      const res = await fetch('/api/generate-stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(body)
@@ -291,10 +358,18 @@ document.addEventListener('DOMContentLoaded', () => {
       let data;
       let responseText = '';
       try {
-        responseText = await res.text();
-        data = JSON.parse(responseText);
+        const contentType = res.headers.get('Content-Type') || '';
+        if (res.ok && contentType.includes('text/event-stream')) {
+          data = await readGenerateStream(res);
+        } else {
+          responseText = await res.text();
+          data = JSON.parse(responseText);
+        }
         console.log('Response data:', data); // Debug log
       } catch (jsonError) {
+        if (jsonError.streamError) {
+          throw jsonError;
+        }
         console.error('JSON parse error:', jsonError);
         console.error('Response text:', responseText);
         
@@ -325,6 +400,10 @@ document.addEventListener('DOMContentLoaded', () => {
       lastTitle = data.title || '';
       lastCategory = data.category || '';
       lastPrompt = prompt;
+      // One key per generated post, so retrying the publish can't post it twice
+      lastPublishKey = window.crypto && crypto.randomUUID
+        ? crypto.randomUUID()
+        : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
 
       // Populate title and category fields
       postTitleInput.value = lastTitle;
@@ -382,7 +461,7 @@ document.addEventListener('DOMContentLoaded', () => {
       const res = await fetch('/api/regenerate-title', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ content: lastContent })
+        body: JSON.stringify({ content: lastContent, force_fresh: true })
       });
 
       console.log('Title regeneration response status:', res.status);
@@ -429,7 +508,7 @@ document.addEventListener('DOMContentLoaded', () => {
       const res = await fetch('/api/regenerate-category', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ content: lastContent })
+        body: JSON.stringify({ content: lastContent, force_fresh: true })
       });
 
       let data;
@@ -475,7 +554,8 @@ document.addEventListener('DOMContentLoaded', () => {
           content: lastContent, 
           meta_image_url: lastMetaImageUrl,
           title: postTitleInput.value.trim() || lastTitle,
-          category: postCategoryInput.value.trim() || lastCategory
+          category: postCategoryInput.value.trim() || lastCategory,
+          idempotency_key: lastPublishKey
         })
       });
 
@@ -528,7 +608,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
   regenerateBtn.addEventListener('click', async () => {
     if (lastPrompt) {
-      await generateContent(lastPrompt);
+      await generateContent(lastPrompt, { distinct: true });
     }
   });
 
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class PublishLog:
+    """Persistent record of published posts keyed by idempotency key
+
+    A key that has already been published returns the stored post instead of
+    publishing again, and concurrent publishes with the same key share one
+    call. Only successful publishes are recorded, so a failed attempt can be
+    retried with the same key.
+    """
+
+    def __init__(self, path='publish_log.json'):
+        self.path = path
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self._posts = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._posts = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.error("Error loading publish log", extra={'error': str(e)})
+
+    def get(self, key):
+        with self._lock:
+            return self._posts.get(key)
+
+    def publish(self, key, fn, *args):
+        """Return ``(post, existing)``, calling fn only if key is new
+
+        fn must return the created post as a dict with at least ``link``,
+        or a falsy value on failure. existing is True only when a stored
+        post is returned, one published earlier or by a concurrent call with
+        the same key; post is None if publishing failed.
+        """
+        post = self.get(key)
+        if post:
+            return post, True
+        (post, created), shared = self._flights.do(key, self._publish, key, fn, *args)
+        return post, post is not None and (shared or not created)
+
+    def _publish(self, key, fn, *args):
+        """Return ``(post, created)``"""
+        # A caller that waited on an earlier flight for this key may land here
+        post = self.get(key)
+        if post:
+            return post, False
+        post_data = fn(*args)
+        if not post_data or not post_data.get('link'):
+            return None, False
+        post = {
+            'id': post_data.get('id'),
+            'link': post_data['link'],
+            'published_at': datetime.now().isoformat(timespec='seconds')
+        }
+        with self._lock:
+            self._posts[key] = post
+            self._save()
+        return post, True
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.publish-', suffix='.json', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._posts, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error("Error saving publish log", extra={'error': str(e)})
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
@@ -1,19 +1,47 @@
 import os
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import requests
 from requests.auth import HTTPBasicAuth
-from bs4 import BeautifulSoup
 import re
-import time
 import json
-from urllib.parse import urljoin, urlparse
+import hashlib
+import logging
+import time
+from urllib.parse import urlparse
 from datetime import datetime
 from wordpress_uploader import WordPressImageUploader
-import xml.etree.ElementTree as ET
+from page_ingest import PageReader, UnsupportedContent
+from http_clients import get_session, SessionModule
+import wordpress_uploader
+from blacklist import BlacklistIndex
+from domain_health import DomainHealth, parse_retry_after
+from page_cache import PageCache, normalize_url
+from single_flight import SingleFlight, StreamFlight
+from near_duplicates import NearDuplicateIndex
+from history_store import HistoryStore
+from summary_cache import SummaryCache
+from llm_router import LLMRouter, parse_backends
+from llm_stream import ThinkStreamFilter, extract_json_from_text, iter_chat_stream, read_json_object, sse_event
+from generation_profiles import PROFILES, build_payload
+from category_index import CategoryIndex
+from image_pipeline import ImagePipeline, MediaIdCache
+from publish_log import PublishLog
+from jobs import JobManager
+from batch import DomainSlots, run_pipelined
+from stage_graph import StageGraph, stage_deadline
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from prompt_budget import CONTEXT_MARGIN, estimate_messages_tokens, estimate_tokens, fit_text
+import threading
+from metrics import (REGISTRY, STAGE_SECONDS, REQUEST_SECONDS, CACHE_REQUESTS, REJECTIONS, ERRORS,
+                     observe_llm_response)
+from structured_log import setup_logging
 
 load_dotenv()
+setup_logging(os.getenv('LOG_LEVEL', 'INFO'), os.getenv('LOG_FORMAT', 'json'))
+logger = logging.getLogger('remote_server')
 
 app = Flask(__name__)
 CORS(app)
@@ -24,7 +52,165 @@ WP_APP_PASSWORD = os.getenv('WP_APP_PASSWORD')
 OPENWEBUI_API_URL = os.getenv('OPENWEBUI_API_URL', 'http://localhost:11434/api/chat')
 MODEL_NAME = os.getenv('MODEL_NAME', 'social-media-influencer-32b')
 
+DOMAIN_RATE_LIMIT = float(os.getenv('DOMAIN_RATE_LIMIT', '1.0'))
+DOMAIN_RATE_BURST = int(os.getenv('DOMAIN_RATE_BURST', '5'))
+DOMAIN_FAILURE_THRESHOLD = int(os.getenv('DOMAIN_FAILURE_THRESHOLD', '3'))
+DOMAIN_BASE_COOLDOWN = float(os.getenv('DOMAIN_BASE_COOLDOWN', '30'))
+DOMAIN_MAX_COOLDOWN = float(os.getenv('DOMAIN_MAX_COOLDOWN', '3600'))
+PERMANENT_BLOCK_STATUSES = [403, 451]
+PAGE_CACHE_DIR = os.getenv('PAGE_CACHE_DIR', 'page_cache')
+PAGE_CACHE_MAX_MB = int(os.getenv('PAGE_CACHE_MAX_MB', '200'))
+PAGE_CACHE_TTL = int(os.getenv('PAGE_CACHE_TTL', '3600'))
+# Source pages are read up to this many bytes (after decompression), the rest is dropped
+PAGE_MAX_BYTES = int(os.getenv('PAGE_MAX_KB', '5120')) * 1024
+PAGE_CHUNK_BYTES = 64 * 1024
+
+IMAGE_MAX_MB = float(os.getenv('IMAGE_MAX_MB', '15'))
+IMAGE_MAX_WIDTH = int(os.getenv('IMAGE_MAX_WIDTH', '1600'))
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'WEBP')
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '82'))
+MEDIA_CACHE_FILE = os.getenv('MEDIA_CACHE_FILE', 'media_cache.json')
+CATEGORY_INDEX_TTL = int(os.getenv('CATEGORY_INDEX_TTL', '600'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '2'))
+LLM_BACKENDS = os.getenv('LLM_BACKENDS', '')
+LLM_KEEP_ALIVE = os.getenv('LLM_KEEP_ALIVE', '30m')
+LLM_PROBE_INTERVAL = float(os.getenv('LLM_PROBE_INTERVAL', '15'))
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '8'))
+JOB_RETENTION = int(os.getenv('JOB_RETENTION', '3600'))
+JOB_MAX_WAIT = 60
+STAGE_WORKERS = int(os.getenv('STAGE_WORKERS', '32'))
+FETCH_STAGE_TIMEOUT = float(os.getenv('FETCH_STAGE_TIMEOUT', '30'))
+IMAGE_STAGE_TIMEOUT = float(os.getenv('IMAGE_STAGE_TIMEOUT', '10'))
+GENERATE_STAGE_TIMEOUT = float(os.getenv('GENERATE_STAGE_TIMEOUT', '300'))
+SUMMARY_STAGE_TIMEOUT = float(os.getenv('SUMMARY_STAGE_TIMEOUT', '120'))
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+BATCH_FETCH_WORKERS = int(os.getenv('BATCH_FETCH_WORKERS', '8'))
+BATCH_PER_DOMAIN = int(os.getenv('BATCH_PER_DOMAIN', '2'))
+WP_MAX_CONCURRENCY = int(os.getenv('WP_MAX_CONCURRENCY', '4'))
+PUBLISH_WORKERS = int(os.getenv('PUBLISH_WORKERS', '8'))
+PUBLISH_LOG_FILE = os.getenv('PUBLISH_LOG_FILE', 'publish_log.json')
+TIMING_HEADERS = os.getenv('TIMING_HEADERS', '').lower() in ('1', 'true', 'yes')
+
+# num_ctx of every call, including warm-ups; a model reloads whenever it changes
+LLM_MAX_CTX = int(os.getenv('LLM_MAX_CTX', '4096'))
+PROMPT_MAP_REDUCE = os.getenv('PROMPT_MAP_REDUCE', '').lower() in ('1', 'true', 'yes')
+
+POST_SYSTEM_PROMPT = "You are a social media influencer who creates fun, engaging posts.\nIMPORTANT: NEVER include your thinking process, analysis, or explanations.\nJUST write the post directly with lots of emojis and enthusiasm!"
+URL_POST_PROMPT = """Create a social media post ABOUT this content (you are NOT the author of this content):\n{content}\n\nIMPORTANT FORMATTING RULES:\n1. Use LOTS of EMOJIS (at least 5-10) 🎨\n2. Use line breaks between paragraphs\n3. Use CAPS for emphasis\n4. NO thinking or analysis\n7. JUST THE POST!\n8. Remember: You are creating a post ABOUT this content, not AS the author"""
+TOPIC_POST_PROMPT = """Write one single social media post about: {topic}\nIMPORTANT FORMATTING RULES:\n1. Use LOTS of EMOJIS (at least 5-10) 🎨\n2. Use line breaks between paragraphs\n3. Use CAPS for emphasis\n4. NO thinking or analysis\n5. NO hashtags at the end\n6. NO explanations\n7. JUST THE POST!"""
+
+
+NEAR_DUP_CHECK = os.getenv('NEAR_DUP_CHECK', 'true').lower() in ('1', 'true', 'yes')
+NEAR_DUP_FILE = os.getenv('NEAR_DUP_FILE', 'near_duplicates.jsonl')
+NEAR_DUP_MAX_DISTANCE = int(os.getenv('NEAR_DUP_MAX_DISTANCE', '3'))
+NEAR_DUP_MIN_WORDS = int(os.getenv('NEAR_DUP_MIN_WORDS', '50'))
+
+HISTORY_DB = os.getenv('HISTORY_DB', 'history.db')
+HISTORY_DOWNLOADS_DIR = os.getenv('HISTORY_DOWNLOADS_DIR', 'downloads')
+HISTORY_MAX_ROWS = 500
+
+SUMMARY_CACHE_SIZE = int(os.getenv('SUMMARY_CACHE_SIZE', '1024'))
+SUMMARY_FIELDS = ['summary', 'category']
+
+FETCH_FAILED_MESSAGE = "Failed to fetch content from the provided URL. Please try again or use a different URL."
+GENERATE_TIMEOUT_MESSAGE = "Error generating content: the AI model took too long to respond. Please try again."
+# get_webui_content reports failures as text, these mark text that isn't a post
+GENERATION_ERROR_PREFIXES = ("Error generating content", "The AI model", FETCH_FAILED_MESSAGE)
+
+# Route the uploader's module-level requests calls through the pooled WordPress session
+wordpress_uploader.requests = SessionModule('wordpress')
 uploader = WordPressImageUploader(WP_URL, WP_USERNAME, WP_APP_PASSWORD)
+history = HistoryStore(HISTORY_DB)
+history.import_downloads(HISTORY_DOWNLOADS_DIR)
+blacklist = BlacklistIndex('blacklist.xml', store=history)
+# Caps concurrent media uploads and post creations against WordPress
+wordpress_slots = threading.BoundedSemaphore(WP_MAX_CONCURRENCY)
+publish_log = PublishLog(PUBLISH_LOG_FILE)
+image_pipeline = ImagePipeline(
+    lambda: get_session('source'),
+    uploader,
+    MediaIdCache(MEDIA_CACHE_FILE),
+    max_bytes=int(IMAGE_MAX_MB * 1024 * 1024),
+    max_width=IMAGE_MAX_WIDTH,
+    image_format=IMAGE_FORMAT,
+    quality=IMAGE_QUALITY,
+    upload_slots=wordpress_slots
+)
+category_index = CategoryIndex(
+    lambda: get_session('wordpress'),
+    WP_URL,
+    HTTPBasicAuth(WP_USERNAME, WP_APP_PASSWORD),
+    ttl=CATEGORY_INDEX_TTL
+)
+domain_health = DomainHealth(
+    rate=DOMAIN_RATE_LIMIT,
+    burst=DOMAIN_RATE_BURST,
+    failure_threshold=DOMAIN_FAILURE_THRESHOLD,
+    base_cooldown=DOMAIN_BASE_COOLDOWN,
+    max_cooldown=DOMAIN_MAX_COOLDOWN
+)
+summary_cache = SummaryCache(max_entries=SUMMARY_CACHE_SIZE)
+near_duplicates = NearDuplicateIndex(
+    NEAR_DUP_FILE,
+    max_distance=NEAR_DUP_MAX_DISTANCE,
+    min_words=NEAR_DUP_MIN_WORDS
+) if NEAR_DUP_CHECK else None
+page_cache = PageCache(PAGE_CACHE_DIR, max_bytes=PAGE_CACHE_MAX_MB * 1024 * 1024, ttl=PAGE_CACHE_TTL)
+# Spreads Ollama calls over LLM_BACKENDS (or just OPENWEBUI_API_URL), capping
+# each backend's concurrent calls across every endpoint and job
+llm_router = LLMRouter(
+    parse_backends(LLM_BACKENDS, OPENWEBUI_API_URL, LLM_MAX_CONCURRENCY),
+    lambda: get_session('llm'),
+    keep_alive=LLM_KEEP_ALIVE or None,
+    probe_interval=LLM_PROBE_INTERVAL,
+    warm_models=[MODEL_NAME],
+    num_ctx=LLM_MAX_CTX
+)
+# Identical requests that arrive while one is running share its result
+generate_flights = SingleFlight()
+summary_flights = SingleFlight()
+stream_flights = StreamFlight()
+stage_executor = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix='stage')
+publish_executor = ThreadPoolExecutor(max_workers=PUBLISH_WORKERS, thread_name_prefix='publish')
+
+def note_timing(name, seconds):
+    """Remember a timing for the current request's Server-Timing header"""
+    if has_request_context():
+        timings = g.setdefault('server_timings', {})
+        timings[name] = timings.get(name, 0) + seconds
+
+@contextmanager
+def timed_stage(stage):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        note_timing(stage, elapsed)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.monotonic()
+
+@app.after_request
+def record_request(response):
+    # For streamed responses this is the time until the stream starts
+    elapsed = time.monotonic() - g.get('request_started', time.monotonic())
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, status=response.status_code)
+    if endpoint != 'metrics':
+        logger.info("Request handled", extra={
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round(elapsed * 1000, 1)
+        })
+    if TIMING_HEADERS:
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in g.get('server_timings', {}).items()]
+        parts.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers['Server-Timing'] = ', '.join(parts)
+    return response
 
 def get_domain_from_url(url):
     """Extract domain from URL"""
@@ -35,341 +221,381 @@ def get_domain_from_url(url):
         return None
 
 def load_blacklist():
-    """Load blacklisted domains from XML file"""
-    try:
-        if not os.path.exists('blacklist.xml'):
-            return set()
-        
-        tree = ET.parse('blacklist.xml')
-        root = tree.getroot()
-        domains = set()
-        
-        for domain_elem in root.findall('.//domain'):
-            domains.add(domain_elem.text.lower())
-        
-        return domains
-    except Exception as e:
-        print(f"Error loading blacklist: {e}")
-        return set()
-
-def save_blacklist(domains):
-    """Save blacklisted domains to XML file"""
-    try:
-        root = ET.Element('blacklist')
-        domains_elem = ET.SubElement(root, 'domains')
-        
-        for domain in sorted(domains):
-            domain_elem = ET.SubElement(domains_elem, 'domain')
-            domain_elem.text = domain
-        
-        last_updated = ET.SubElement(root, 'last_updated')
-        last_updated.text = datetime.now().isoformat() + 'Z'
-        
-        tree = ET.ElementTree(root)
-        tree.write('blacklist.xml', encoding='UTF-8', xml_declaration=True)
-        
-    except Exception as e:
-        print(f"Error saving blacklist: {e}")
+    """Return the current set of blacklisted domains"""
+    return blacklist.domains()
 
 def add_to_blacklist(domain):
     """Add a domain to the blacklist"""
-    if not domain:
-        return
-    
-    domains = load_blacklist()
-    domains.add(domain.lower())
-    save_blacklist(domains)
-    print(f"Added {domain} to blacklist")
+    blacklist.add(domain)
 
 def is_blacklisted(url):
-    """Check if a URL's domain is blacklisted"""
-    domain = get_domain_from_url(url)
-    if not domain:
-        return False
-    
-    blacklisted_domains = load_blacklist()
-    return domain.lower() in blacklisted_domains
-
-def save_url_as_clean_file(url, content, folder="downloads"):
-    # Generate filename
-    timestamp = int(time.time())
-    # Strip non-alphanumerics
-    stripped = re.sub(r'\W+', '', url)
-    # Take first and last 16 characters
-    prefix = stripped[:16]
-    suffix = stripped[-16:] if len(stripped) > 16 else stripped
-    filename = f"{prefix}_{suffix}_{timestamp}.html"
-    
-    # Ensure folder exists
-    os.makedirs(folder, exist_ok=True)
-    filepath = os.path.join(folder, filename)
-    
-    # Save the file
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
-    
-    print(f"Saved to {filepath}")
-    return filepath
+    """Check if a URL's domain, or a parent domain, is blacklisted"""
+    return blacklist.contains(get_domain_from_url(url))
+
+def record_fetch_refused(url, reason):
+    # e.g. "rate limit exceeded for example.com" -> rate_limit_exceeded
+    REJECTIONS.inc(reason=reason.split(' for ', 1)[0].replace(' ', '_').replace('-', '_'))
+    logger.warning("Skipping fetch", extra={'url': url, 'reason': reason})
+
+def admit_fetch(url, domain):
+    """Take a fetch slot from the domain's rate limit and circuit breaker"""
+    allowed, reason = domain_health.acquire(domain)
+    if not allowed:
+        record_fetch_refused(url, reason)
+    return allowed
+
+def record_fetch_success(domain):
+    domain_health.record_success(domain)
+    history.record_domain(domain, domain_health.state_of(domain), fetched=True)
 
-def fetch_url_content(url):
+def record_http_error(url, domain, status_code, retry_after, error):
+    ERRORS.inc(stage='fetch', kind='http')
+    logger.warning("HTTP error fetching URL content", extra={'url': url, 'status': status_code, 'error': str(error)})
+    if status_code in PERMANENT_BLOCK_STATUSES:
+        # The origin is refusing us outright, blacklist the domain
+        domain_health.record_success(domain)
+        add_to_blacklist(domain)
+    elif status_code == 429 or status_code >= 500:
+        domain_health.record_failure(domain, error, retry_after=parse_retry_after(retry_after), trip=status_code == 429)
+    else:
+        # 404, 410, 400, ...: this page is bad, not the domain
+        domain_health.release(domain)
+    history.record_domain(domain, domain_health.state_of(domain), failed=True)
+
+def record_fetch_error(url, domain, error):
+    ERRORS.inc(stage='fetch', kind='error')
+    logger.warning("Error fetching URL content", extra={'url': url, 'error': str(error)})
+    # Connection errors, timeouts, etc. are usually transient
+    domain_health.record_failure(domain, error)
+    history.record_domain(domain, domain_health.state_of(domain), failed=True)
+
+def record_unsupported_content(url, domain, error):
+    # The origin answered fine, it just isn't a page
+    record_fetch_success(domain)
+    REJECTIONS.inc(reason='content_type')
+    logger.warning("Skipping non-HTML response", extra={'url': url, 'error': str(error)})
+
+def store_page(url, page, etag=None, last_modified=None):
+    """Cache a freshly parsed page and add it to the history"""
+    page_cache.put(url, page, etag=etag, last_modified=last_modified)
+    history.record_source(normalize_url(url), get_domain_from_url(url), page)
+
+def fetch_page(url):
+    """Download a page once and parse it into a PageResult"""
+    cached = page_cache.get(url)
+    if cached and page_cache.is_fresh(cached):
+        CACHE_REQUESTS.inc(cache='page', result='hit')
+        return page_cache.to_page(cached)
+    
+    domain = get_domain_from_url(url)
+    if not admit_fetch(url, domain):
+        return None
     try:
-        headers = {
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Connection": "keep-alive",
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:136.0) Gecko/20100101 Firefox/136.0'
-        }
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-        for script in soup(["script", "style"]):
-            script.decompose()
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        joined_chunks = ' '.join(chunk for chunk in chunks if chunk)
+        headers = page_cache.conditional_headers(cached) if cached else {}
+        with timed_stage('fetch'), get_session('source').get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304 and cached:
+                CACHE_REQUESTS.inc(cache='page', result='revalidated')
+                record_fetch_success(domain)
+                page_cache.touch(url, cached)
+                return page_cache.to_page(cached)
+            CACHE_REQUESTS.inc(cache='page', result='miss')
+            response.raise_for_status()
+            reader = read_page(url, response)
+        with timed_stage('parse'):
+            page = reader.page()
+        record_fetch_success(domain)
         
-        # Save the cleaned content to file
-        save_url_as_clean_file(url, joined_chunks)
+        store_page(
+            url,
+            page,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
         
-        return joined_chunks
+        return page
     except requests.exceptions.HTTPError as e:
-        print(f"HTTP Error fetching URL content: {e} - Status Code: {e.response.status_code}")
-        # Add domain to blacklist for 403, 429, 451, and other blocking errors
-        if e.response.status_code in [403, 429, 451, 503, 502, 504]:
-            domain = get_domain_from_url(url)
-            if domain:
-                add_to_blacklist(domain)
+        record_http_error(url, domain, e.response.status_code, e.response.headers.get('Retry-After'), e)
+        return None
+    except UnsupportedContent as e:
+        record_unsupported_content(url, domain, e)
         return None
     except Exception as e:
-        print(f"Error fetching URL content: {e}")
-        # Add domain to blacklist for connection errors, timeouts, etc.
-        domain = get_domain_from_url(url)
-        if domain:
-            add_to_blacklist(domain)
+        record_fetch_error(url, domain, e)
         return None
 
+def read_page(url, response):
+    """Stream a response body into a PageReader, up to PAGE_MAX_BYTES"""
+    reader = PageReader(url, response.headers.get('Content-Type'), PAGE_MAX_BYTES)
+    for chunk in response.iter_content(PAGE_CHUNK_BYTES):
+        if not reader.feed(chunk):
+            break
+    reader.close()
+    if reader.truncated:
+        logger.info("Page truncated", extra={'url': url, 'max_bytes': PAGE_MAX_BYTES})
+    return reader
+
 def remove_before_think_end(text):
     if '</think>' in text:
         return text.split('</think>', 1)[1].strip()
     return text
 
-def get_webui_content(model_name, input_source=None, is_url=False):
-    try:
-        if is_url and input_source:
-            content = fetch_url_content(input_source)
-            if not content:
-                print("Warning: Failed to fetch URL content")
-                return "Failed to fetch content from the provided URL. Please try again or use a different URL."
-            prompt = f"""Create a social media post ABOUT this content (you are NOT the author of this content):\n{content}\n\nIMPORTANT FORMATTING RULES:\n1. Use LOTS of EMOJIS (at least 5-10) 🎨\n2. Use line breaks between paragraphs\n3. Use CAPS for emphasis\n4. NO thinking or analysis\n7. JUST THE POST!\n8. Remember: You are creating a post ABOUT this content, not AS the author"""
-        else:
-            if not input_source:
-                return "Please provide a prompt or URL to generate content."
-            prompt = f"""Write one single social media post about: {input_source}\nIMPORTANT FORMATTING RULES:\n1. Use LOTS of EMOJIS (at least 5-10) 🎨\n2. Use line breaks between paragraphs\n3. Use CAPS for emphasis\n4. NO thinking or analysis\n5. NO hashtags at the end\n6. NO explanations\n7. JUST THE POST!"""
-        
-        messages = [
-            {
-                "role": "system",
-                "content": "You are a social media influencer who creates fun, engaging posts.\nIMPORTANT: NEVER include your thinking process, analysis, or explanations.\nJUST write the post directly with lots of emojis and enthusiasm!"
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-        payload = {
-            "model": model_name,
-            "messages": messages,
-            "stream": False,
-            "options": {
-                "num_ctx": 4096,
-                "num_predict": 2000,
-                "temperature": 0.9,
-                "top_p": 0.9,
-                "top_k": 40,
-                "repeat_penalty": 1.1,
-                "seed": -1,
-                "clear": True
-            }
+def presummarize_chunk(chunk, budget_tokens):
+    """Map step for very long pages: boil one chunk down to its key facts"""
+    messages = [
+        {
+            "role": "system",
+            "content": "Extract the key facts of the text the user sends as a few plain sentences. No commentary."
+        },
+        {
+            "role": "user",
+            "content": chunk
         }
-        response = requests.post(OPENWEBUI_API_URL, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        if not result.get('message', {}).get('content'):
-            print("Warning: Received empty response from model")
-            return "The AI model returned an empty response. Please try again."
-        content = result['message']['content']
-        cleaned_content = remove_before_think_end(content)
-        if not cleaned_content:
-            return "The AI model generated content but it was empty after processing. Please try again."
-        return cleaned_content
+    ]
+    num_predict = min(budget_tokens, PROFILES['presummary']['options']['num_predict'])
+    payload = build_payload('presummary', MODEL_NAME, messages, LLM_MAX_CTX)
+    payload['options']['num_predict'] = num_predict
+    try:
+        with timed_stage('presummarize'), llm_router.chat(payload, deadline=stage_deadline()) as response:
+            response.raise_for_status()
+            result = response.json()
+        observe_llm_response('presummary', result)
+        return remove_before_think_end(result.get('message', {}).get('content', ''))
     except Exception as e:
-        print(f"\nError getting content from OpenWebUI: {e}")
-        return f"Error generating content: {str(e)}. Please try again."
+        ERRORS.inc(stage='presummarize', kind='error')
+        logger.error("Error pre-summarizing chunk", extra={'error': str(e)})
+        return None
 
-def get_summary_of_webui_content(model_name, content):
-    try:
+def fit_article(text):
+    """Trim article text so the post prompt fits the model's context window"""
+    overhead = estimate_messages_tokens([
+        {"content": POST_SYSTEM_PROMPT},
+        {"content": URL_POST_PROMPT.format(content="")}
+    ])
+    budget = LLM_MAX_CTX - PROFILES['post']['options']['num_predict'] - overhead - CONTEXT_MARGIN
+    summarize_chunk = presummarize_chunk if PROMPT_MAP_REDUCE else None
+    fitted = fit_text(text, budget, summarize_chunk=summarize_chunk)
+    if len(fitted) < len(text):
+        logger.info("Fitted article to the context window", extra={
+            'tokens_before': estimate_tokens(text),
+            'tokens_after': estimate_tokens(fitted)
+        })
+    return fitted
+
+def build_post_prompt(input_source, is_url=False, page=None):
+    """Return (prompt, error message) for a post about a page or a topic"""
+    if is_url and input_source:
+        if page is None:
+            page = fetch_page(input_source)
+        content = page.article_text if page else None
         if not content:
-            return json.dumps({
-                'result': {
-                    'summary': 'Blog Post',
-                    'category': 'General',
-                    'category_description': 'General blog posts'
-                }
-            })
-            
-        prompt = f"Summarize this into a SINGLE short 256 character long sentence: {content}"
-        messages = [
-            {
-                "role": "system",
-                "content": """The user will provide the text of a blog post that they would like to summarize. \nPlease respond with a JSON object containing exactly these fields:\n- \"summary\": A 32 word or less summary of the post\n- \"category\": A one or two word category for the post\n- \"category_description\": a short description of the category\nRespond using this JSON schema:\n{\n    \"result\": {\n        \"summary\": {\"type\": \"string\"},\n        \"category\": {\"type\": \"string\"},\n        \"category_description\": {\"type\": \"string\"},\n    }\n}\nReturn a JSON response. The response must:\n- Be valid JSON that can be parsed\n- Include fields: \"summary\", \"category\", \"category_description\"\n- Have no additional text outside the JSON\n- Do NOT include markdown code blocks (```json) or comments"""
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-        payload = {
-            "model": model_name,
-            "messages": messages,
-            "stream": False,
-            "options": {
-                "num_ctx": 4096,
-                "num_predict": 2000,
-                "temperature": 0.2,
-                "top_p": 0.9,
-                "top_k": 40,
-                "repeat_penalty": 1.1,
-                "seed": -1,
-                "clear": True
-            }
+            logger.warning("Failed to fetch URL content", extra={'url': input_source})
+            return None, FETCH_FAILED_MESSAGE
+        prompt = URL_POST_PROMPT.format(content=fit_article(content))
+    else:
+        if not input_source:
+            return None, "Please provide a prompt or URL to generate content."
+        prompt = TOPIC_POST_PROMPT.format(topic=input_source)
+    return prompt, None
+
+def build_post_payload(model_name, prompt, stream=False):
+    messages = [
+        {
+            "role": "system",
+            "content": POST_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
         }
-        response = requests.post(OPENWEBUI_API_URL, json=payload)
-        response.raise_for_status()
-        result = response.json()
-        if not result.get('message', {}).get('content'):
-            print("Warning: Received empty response from model for summary")
-            return json.dumps({
-                'result': {
-                    'summary': 'Blog Post',
-                    'category': 'General',
-                    'category_description': 'General blog posts'
-                }
-            })
-        content = result['message']['content']
-        cleaned_content = remove_before_think_end(content)
-        
-        def extract_json_from_text(text):
-            json_block_match = re.search(r'```(?:json)?\s*(\{.*?\})\s*```', text, re.DOTALL)
-            if json_block_match:
-                return json_block_match.group(1)
-            brace_start = text.find('{')
-            if brace_start != -1:
-                brace_count = 0
-                for i, char in enumerate(text[brace_start:], brace_start):
-                    if char == '{':
-                        brace_count += 1
-                    elif char == '}':
-                        brace_count -= 1
-                        if brace_count == 0:
-                            return text[brace_start:i+1]
-            bracket_start = text.find('[')
-            if bracket_start != -1:
-                bracket_count = 0
-                for i, char in enumerate(text[bracket_start:], bracket_start):
-                    if char == '[':
-                        bracket_count += 1
-                    elif char == ']':
-                        bracket_count -= 1
-                        if bracket_count == 0:
-                            return text[bracket_start:i+1]
-            cleaned = re.sub(r'```json\s*', '', text)
-            cleaned = re.sub(r'```\s*$', '', cleaned)
-            cleaned = re.sub(r'//.*$', '', cleaned, flags=re.MULTILINE)
-            cleaned = re.sub(r'/\*.*?\*/', '', cleaned, flags=re.DOTALL)
-            return cleaned.strip()
-        
-        extracted_json = extract_json_from_text(cleaned_content)
-        if not extracted_json:
-            return json.dumps({
-                'result': {
-                    'summary': 'Blog Post',
-                    'category': 'General',
-                    'category_description': 'General blog posts'
-                }
-            })
-        return extracted_json
-        
+    ]
+    return build_payload('post', model_name, messages, LLM_MAX_CTX, stream=stream)
+
+def post_from_result(result):
+    """The post text of a chat result, or the message to show in its place"""
+    observe_llm_response('post', result)
+    if not result.get('message', {}).get('content'):
+        logger.warning("Received empty response from model")
+        return "The AI model returned an empty response. Please try again."
+    content = result['message']['content']
+    cleaned_content = remove_before_think_end(content)
+    if not cleaned_content:
+        return "The AI model generated content but it was empty after processing. Please try again."
+    return cleaned_content
+
+def get_webui_content(model_name, input_source=None, is_url=False, page=None):
+    try:
+        prompt, error = build_post_prompt(input_source, is_url=is_url, page=page)
+        if error:
+            return error
+        payload = build_post_payload(model_name, prompt)
+        with timed_stage('generate'), llm_router.chat(payload, deadline=stage_deadline()) as response:
+            response.raise_for_status()
+            result = response.json()
+        return post_from_result(result)
     except Exception as e:
-        print(f"Error getting summary from OpenWebUI: {e}")
-        return json.dumps({
-            'result': {
-                'summary': 'Blog Post',
-                'category': 'General',
-                'category_description': 'General blog posts'
-            }
-        })
+        ERRORS.inc(stage='generate', kind='error')
+        logger.error("Error getting content from OpenWebUI", extra={'error': str(e)})
+        return f"Error generating content: {str(e)}. Please try again."
 
-def get_meta_image_url(page_url):
+def stream_webui_content(model_name, prompt):
+    """Yield pieces of the post's text as Ollama generates them"""
+    payload = build_post_payload(model_name, prompt, stream=True)
+    started = time.monotonic()
     try:
-        headers = {
-            "Accept": "*/*",
-            "Accept-Encoding": "gzip, deflate",
-            "Accept-Language": "en-US,en;q=0.9",
-            "Connection": "keep-alive",
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:136.0) Gecko/20100101 Firefox/136.0'
+        with llm_router.chat(payload, stream=True) as response:
+            response.raise_for_status()
+            for data in iter_chat_stream(response):
+                piece = data.get('message', {}).get('content')
+                if piece:
+                    yield piece
+                if data.get('done'):
+                    observe_llm_response('post', data)
+                    break
+    finally:
+        STAGE_SECONDS.observe(time.monotonic() - started, stage='generate')
+
+def build_summary_payload(model_name, content):
+    prompt = f"Summarize this into a SINGLE short 256 character long sentence: {content}"
+    messages = [
+        {
+            "role": "system",
+            "content": """The user will provide the text of a blog post that they would like to summarize. \nPlease respond with a JSON object containing exactly these fields:\n- \"summary\": A 32 word or less summary of the post\n- \"category\": A one or two word category for the post\n- \"category_description\": a short description of the category\nRespond using this JSON schema:\n{\n    \"result\": {\n        \"summary\": {\"type\": \"string\"},\n        \"category\": {\"type\": \"string\"},\n        \"category_description\": {\"type\": \"string\"},\n    }\n}\nReturn a JSON response. The response must:\n- Be valid JSON that can be parsed\n- Include fields: \"summary\", \"category\", \"category_description\"\n- Have no additional text outside the JSON\n- Do NOT include markdown code blocks (```json) or comments"""
+        },
+        {
+            "role": "user",
+            "content": prompt
         }
-        response = requests.get(page_url, headers=headers, timeout=10)
-        if response.status_code != 200:
-            return ""
-        soup = BeautifulSoup(response.text, 'html.parser')
-        meta_props = [
-            ("property", "og:image"),
-            ("name", "twitter:image"),
-            ("name", "image"),
-        ]
-        for attr, key in meta_props:
-            tag = soup.find("meta", attrs={attr: key})
-            if tag and tag.get("content"):
-                return urljoin(page_url, tag["content"])
-        return ""
+    ]
+    budget = LLM_MAX_CTX - PROFILES['summary']['options']['num_predict'] - estimate_messages_tokens(messages) - CONTEXT_MARGIN
+    if estimate_tokens(content) > budget:
+        messages[1]['content'] = prompt.replace(content, fit_text(content, budget))
+    return build_payload('summary', model_name, messages, LLM_MAX_CTX, stream=True)
+
+def summary_from_answer(found_json, cleaned_content):
+    if found_json:
+        return found_json
+    if not cleaned_content:
+        logger.warning("Received empty response from model for summary")
+        return None
+    return extract_json_from_text(cleaned_content) or None
+
+def request_summary(model_name, content):
+    """Ask the model for a summary JSON string, or None when it fails"""
+    try:
+        payload = build_summary_payload(model_name, content)
+        with timed_stage('summarize'), llm_router.chat(payload, stream=True, deadline=stage_deadline()) as response:
+            response.raise_for_status()
+            # Stops reading, and so stops the generation, once the JSON object closes.
+            # Ollama only reports token counts when the stream runs to the end.
+            found_json, cleaned_content = read_json_object(
+                response, on_done=lambda data: observe_llm_response('summary', data)
+            )
+        return summary_from_answer(found_json, cleaned_content)
     except Exception as e:
-        print(f"Error fetching meta image: {e}")
-        return ""
+        ERRORS.inc(stage='summarize', kind='error')
+        logger.error("Error getting summary from OpenWebUI", extra={'error': str(e)})
+        return None
+
+def default_summary_json():
+    return json.dumps({
+        'result': {
+            'summary': 'Blog Post',
+            'category': 'General',
+            'category_description': 'General blog posts'
+        }
+    })
+
+def cached_summary(key):
+    cached = summary_cache.get(key)
+    CACHE_REQUESTS.inc(cache='summary', result='hit' if cached else 'miss')
+    return cached
+
+def store_summary(model_name, content, key, summary_json, fresh_field=None):
+    """Remember a fresh summary answer, returning the JSON to use"""
+    if not summary_json:
+        return default_summary_json()
+    try:
+        result = json.loads(summary_json).get('result') or {}
+    except (json.JSONDecodeError, AttributeError):
+        # Don't remember answers we couldn't parse
+        return summary_json
+    unused = [field for field in SUMMARY_FIELDS if field != fresh_field] if fresh_field else []
+    summary_cache.put(key, summary_json, unused=unused)
+    if isinstance(result, dict):
+        history.record_summary(key, model_name, content, result.get('summary'), result.get('category'), summary_json)
+    return summary_json
+
+def spare_summary(model_name, content, field):
+    """An earlier answer whose field hasn't been shown yet, or None"""
+    key = summary_cache.make_key(model_name, content, PROFILES['summary'])
+    spare = summary_cache.take_unused(key, field)
+    if spare:
+        CACHE_REQUESTS.inc(cache='summary', result='spare')
+    return spare
+
+def get_summary_of_webui_content(model_name, content, force_fresh=False, fresh_field=None):
+    """Summary JSON for content, memoized by content, model and options
+
+    With force_fresh the model is always asked again. fresh_field names the
+    field ('summary' or 'category') the caller actually wanted fresh; the
+    other fields of that answer are kept so a later regenerate of them can
+    be served without another model call. Without force_fresh, concurrent
+    calls for the same content share one model call.
+    """
+    if not content:
+        return default_summary_json()
+    
+    key = summary_cache.make_key(model_name, content, PROFILES['summary'])
+    if force_fresh:
+        summary_json = request_summary(model_name, content)
+    else:
+        cached = cached_summary(key)
+        if cached:
+            return cached
+        summary_json, shared = summary_flights.do(key, request_summary, model_name, content)
+        if shared:
+            CACHE_REQUESTS.inc(cache='summary', result='coalesced')
+            return summary_json or default_summary_json()
+    return store_summary(model_name, content, key, summary_json, fresh_field)
+
+def regenerate_summary_field(model_name, content, field, force_fresh=True):
+    """Summary JSON for regenerating one field of a post's summary"""
+    if force_fresh and content:
+        spare = spare_summary(model_name, content, field)
+        if spare:
+            return spare
+    return get_summary_of_webui_content(model_name, content, force_fresh=force_fresh, fresh_field=field)
 
 def get_or_create_category(category_name, summary_json):
-    categories_endpoint = f"{WP_URL}/wp-json/wp/v2/categories"
-    response = requests.get(
-        categories_endpoint,
-        auth=HTTPBasicAuth(WP_USERNAME, WP_APP_PASSWORD)
-    )
-    categories = response.json()
-    for category in categories:
-        if category['name'].lower() == category_name.lower():
-            return category['id']
     try:
         summary_data = json.loads(summary_json)
         category_description = summary_data['result'].get('category_description', '')
     except (json.JSONDecodeError, KeyError, NameError):
         category_description = ''
-    new_category = {
-        'name': category_name,
-        'slug': category_name.lower().replace(' ', '-'),
-        'description': category_description
-    }
-    response = requests.post(
-        categories_endpoint,
-        auth=HTTPBasicAuth(WP_USERNAME, WP_APP_PASSWORD),
-        json=new_category
-    )
-    if response.status_code == 201:
-        return response.json()['id']
-    else:
-        print(f"Failed to create category: {response.text}")
-        return 1
+    with timed_stage('category'):
+        return category_index.get_or_create(category_name, category_description)
+
+def featured_media_id(meta_image_url):
+    if not meta_image_url:
+        return None
+    try:
+        with timed_stage('image_upload'):
+            media_id = image_pipeline.media_id_for(meta_image_url)
+        if media_id:
+            history.record_media(meta_image_url, media_id)
+        return media_id
+    except Exception as e:
+        ERRORS.inc(stage='image_upload', kind='error')
+        logger.error("Error preparing featured image", extra={'url': meta_image_url, 'error': str(e)})
+        return None
+
+def create_post(title, content, media_id, categories):
+    with wordpress_slots, timed_stage('wordpress_post'):
+        return uploader.create_post(title, content, media_id, 'publish', categories)
 
 def post_to_wordpress(content, meta_image_url, summary_json):
+    # The image upload runs while the category is being resolved
+    media_future = stage_executor.submit(featured_media_id, meta_image_url)
     try:
         summary_data = json.loads(summary_json)
         title = summary_data['result']['summary']
@@ -379,105 +605,507 @@ def post_to_wordpress(content, meta_image_url, summary_json):
         else:
             categories = [1]
     except (json.JSONDecodeError, KeyError) as e:
-        print(f"Error parsing summary JSON: {e}")
+        logger.warning("Error parsing summary JSON", extra={'error': str(e)})
         title = "Blog Post " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         categories = [1]
-    if meta_image_url:
-        image_path = uploader.download_image(meta_image_url)
-        time_stamp = str(int(time.time()))
-        media_data = uploader.upload_to_media_library(image_path, 'image' + time_stamp, 'no title')
+    media_id = media_future.result()
+    if media_id:
         try:
-            post_data = uploader.create_post(title, content, media_data['id'], 'publish', categories)
+            post_data = create_post(title, content, media_id, categories)
         except:
-            post_data = uploader.create_post(title, content, None, 'publish', categories)
+            # The cached attachment may have been deleted from WordPress
+            image_pipeline.media_cache.forget(media_id)
+            post_data = create_post(title, content, None, categories)
     else:
-        post_data = uploader.create_post(title, content, None, 'publish', categories)
+        post_data = create_post(title, content, None, categories)
     return post_data
 
+def build_summary_json(content, title, category):
+    """Summary JSON for a reviewed post, generating it if title or category is missing"""
+    if title and category:
+        return json.dumps({
+            'result': {
+                'summary': title,
+                'category': category,
+                'category_description': f'Posts about {category}'
+            }
+        })
+    return get_summary_of_webui_content(MODEL_NAME, content)
+
+def default_idempotency_key(content, title, meta_image_url):
+    digest = hashlib.sha256()
+    for part in (title, meta_image_url, content):
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\0')
+    return 'content-' + digest.hexdigest()
+
+def publish_post(content, meta_image_url, title, category, idempotency_key=None):
+    """Publish a reviewed post once per idempotency key
+
+    Returns ``(post, existing)``; post is None if publishing failed.
+    """
+    def publish():
+        summary_json = build_summary_json(content, title, category)
+        return post_to_wordpress(content, meta_image_url, summary_json)
+
+    def published(post):
+        if near_duplicates is not None:
+            near_duplicates.mark_published(content, post['link'])
+        history.record_publication(content, title, category, post, idempotency_key)
+
+    if not idempotency_key:
+        post_data = publish()
+        if not post_data or not post_data.get('link'):
+            return None, False
+        published(post_data)
+        return post_data, False
+    post, existing = publish_log.publish(idempotency_key, publish)
+    if not post:
+        return None, False
+    if not existing:
+        published(post)
+    CACHE_REQUESTS.inc(cache='publish', result='hit' if existing else 'miss')
+    if existing:
+        logger.info("Idempotency key already published", extra={'idempotency_key': idempotency_key, 'link': post['link']})
+    return post, existing
+
+def check_url_allowed(url):
+    """Return (error payload, status) if a URL's domain must not be fetched, else None"""
+    domain = get_domain_from_url(url)
+    if is_blacklisted(url):
+        REJECTIONS.inc(reason='blacklisted')
+        logger.info("Domain is blacklisted", extra={'domain': domain})
+        return {
+            'error': f'Domain {domain} is blacklisted due to previous errors',
+            'blacklisted_domain': domain,
+            'error_type': 'blacklisted'
+        }, 400
+    
+    retry_at = domain_health.retry_at(domain)
+    if retry_at:
+        REJECTIONS.inc(reason='circuit_open')
+        logger.info("Domain is cooling down", extra={'domain': domain, 'retry_at': retry_at})
+        return {
+            'error': f'Domain {domain} is temporarily unavailable, retry after {retry_at}',
+            'cooling_down_domain': domain,
+            'retry_at': retry_at,
+            'error_type': 'circuit_open'
+        }, 429
+    return None
+
+def parse_title_and_category(summary_json):
+    """Pull the title and category out of a summary JSON string"""
+    title = ""
+    category = ""
+    try:
+        if summary_json:
+            summary_data = json.loads(summary_json)
+            title = summary_data['result']['summary']
+            category = summary_data['result'].get('category', '')
+    except (json.JSONDecodeError, KeyError) as e:
+        logger.warning("Error parsing summary JSON", extra={'error': str(e)})
+        title = "Blog Post " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        category = "General"
+    return title, category
+
+def title_from_summary(summary_json):
+    try:
+        if summary_json:
+            summary_data = json.loads(summary_json)
+            return summary_data['result']['summary']
+    except (json.JSONDecodeError, KeyError) as e:
+        logger.warning("Error parsing summary JSON", extra={'error': str(e)})
+    return "Blog Post " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def category_from_summary(summary_json):
+    try:
+        if summary_json:
+            summary_data = json.loads(summary_json)
+            return summary_data['result'].get('category', 'General')
+    except (json.JSONDecodeError, KeyError) as e:
+        logger.warning("Error parsing summary JSON", extra={'error': str(e)})
+    return "General"
+
+def build_generate_response(content, meta_image_url, title, category):
+    # Ensure all values are strings and not None
+    return {
+        'content': str(content) if content else '',
+        'meta_image_url': str(meta_image_url) if meta_image_url else '',
+        'title': str(title) if title else 'Blog Post',
+        'category': str(category) if category else 'General'
+    }
+
+def find_near_duplicate(page):
+    """Earlier result generated from (nearly) the same article text, or None"""
+    if near_duplicates is None or not page:
+        return None
+    with timed_stage('dedupe'):
+        match = near_duplicates.find(page.article_text)
+    CACHE_REQUESTS.inc(cache='near_duplicate', result='hit' if match else 'miss')
+    return match
+
+def near_duplicate_response(match):
+    """The earlier result, marked with where it came from"""
+    logger.info("Near-duplicate article", extra={'url': match['url'], 'distance': match['distance']})
+    response_data = dict(match['result'])
+    response_data['near_duplicate_of'] = {
+        'url': match['url'],
+        'generated_at': match['generated_at'],
+        'distance': match['distance'],
+        'wordpress_url': match['wordpress_url']
+    }
+    return response_data
+
+def remember_generation(page, url, prompt, response_data):
+    """Add a generated post to the history, and its article to the near-duplicate index"""
+    content = response_data.get('content', '')
+    if content.startswith(GENERATION_ERROR_PREFIXES):
+        return
+    history.record_post(normalize_url(url) if url else None, get_domain_from_url(url) if url else None, prompt, response_data)
+    if near_duplicates is not None and page:
+        near_duplicates.add(page.article_text, url, response_data)
+
+def run_generate(prompt=None, url=None, on_stage=None, page=None, allow_duplicate=False):
+    """Run the fetch -> generate/image -> summarize pipeline, returning (payload, status)
+
+    Stages run as a dependency graph, so the image lookup and the post
+    generation both start as soon as the page is in. Every stage has its own
+    timeout and fallback and its timing is reported under 'timings'. A page
+    that was already fetched for the URL can be passed in to skip the fetch.
+    Unless allow_duplicate is set, an article whose text nearly matches one
+    generated before returns that earlier result instead of a new post.
+    """
+    if url:
+        rejection = check_url_allowed(url)
+        if rejection:
+            return rejection
+    
+    def fetch():
+        if page is not None:
+            return page
+        return fetch_page(url)
+    
+    def image(fetch):
+        return fetch.image_url if fetch else ""
+    
+    def dedupe(fetch):
+        return None if allow_duplicate else find_near_duplicate(fetch)
+    
+    def generate(fetch=None, dedupe=None):
+        if dedupe:
+            # The earlier result is returned instead
+            return None
+        if url:
+            if not fetch:
+                logger.warning("Failed to fetch URL content", extra={'url': url})
+                return FETCH_FAILED_MESSAGE
+            return get_webui_content(MODEL_NAME, url, is_url=True, page=fetch)
+        return get_webui_content(MODEL_NAME, prompt, is_url=False)
+    
+    def summarize(generate):
+        # Generate title and category along with content, unless there's no post to describe
+        if not generate or generate.startswith(GENERATION_ERROR_PREFIXES):
+            return default_summary_json()
+        return get_summary_of_webui_content(MODEL_NAME, generate)
+    
+    graph = StageGraph(stage_executor)
+    if url:
+        graph.add('fetch', fetch, timeout=FETCH_STAGE_TIMEOUT, fallback=None)
+        graph.add('image', image, deps=['fetch'], timeout=IMAGE_STAGE_TIMEOUT, fallback="")
+        graph.add('dedupe', dedupe, deps=['fetch'], timeout=FETCH_STAGE_TIMEOUT, fallback=None)
+        graph.add('generate', generate, deps=['fetch', 'dedupe'], timeout=GENERATE_STAGE_TIMEOUT,
+                  fallback=GENERATE_TIMEOUT_MESSAGE)
+    else:
+        graph.add('generate', generate, timeout=GENERATE_STAGE_TIMEOUT,
+                  fallback=GENERATE_TIMEOUT_MESSAGE)
+    graph.add('summarize', summarize, deps=['generate'], timeout=SUMMARY_STAGE_TIMEOUT,
+              fallback=default_summary_json())
+    results, timings = graph.run(before_stage=on_stage)
+    for name, timing in timings.items():
+        note_timing(name, timing['ms'] / 1000)
+        if timing['status'] != 'ok':
+            ERRORS.inc(stage=name, kind=timing['status'])
+    
+    if results.get('dedupe'):
+        response_data = near_duplicate_response(results['dedupe'])
+        response_data['timings'] = timings
+        return response_data, 200
+    
+    return finish_generate(
+        prompt, url, results.get('fetch'), results['generate'], results.get('image', ""), results['summarize'], timings
+    )
+
+def finish_generate(prompt, url, page, content, meta_image_url, summary_json, timings):
+    """Build the /generate payload from the pipeline's results, returning (payload, status)"""
+    logger.info("Generated post", extra={
+        'url': url,
+        'content_length': len(content) if content else 0,
+        'meta_image_url': meta_image_url,
+        'timings': timings
+    })
+    
+    if not content:
+        logger.warning("No content generated")
+        return {'error': 'Failed to generate content', 'timings': timings}, 500
+    
+    title, category = parse_title_and_category(summary_json)
+    response_data = build_generate_response(content, meta_image_url, title, category)
+    remember_generation(page, url, prompt, response_data)
+    response_data['timings'] = timings
+    return response_data, 200
+
+def generate_key(model_name, prompt=None, url=None):
+    """Key under which identical in-flight /generate calls are coalesced"""
+    if url:
+        return ('url', model_name, normalize_url(url))
+    return ('prompt', model_name, ' '.join(prompt.split()).casefold())
+
 @app.route('/generate', methods=['POST'])
 def generate():
+    """Generate a post; identical concurrent calls share one run unless "distinct" is set"""
     try:
-        print("=== GENERATE ENDPOINT CALLED ===")
         data = request.json
-        print(f"Request data: {data}")
-        
         if not data:
-            print("No data provided")
             return jsonify({'error': 'No data provided'}), 400
             
         prompt = data.get('prompt')
         url = data.get('url')
-        print(f"Prompt: {prompt}")
-        print(f"URL: {url}")
         
         if not prompt and not url:
-            print("Neither prompt nor URL provided")
             return jsonify({'error': 'Either prompt or url must be provided'}), 400
         
+        if data.get('distinct'):
+            response_data, status = run_generate(prompt, url, allow_duplicate=True)
+            return jsonify(response_data), status
+        
+        (response_data, status), shared = generate_flights.do(
+            generate_key(MODEL_NAME, prompt, url), run_generate, prompt, url
+        )
+        response = jsonify(response_data)
+        if shared:
+            CACHE_REQUESTS.inc(cache='generate', result='coalesced')
+            response.headers['X-Coalesced'] = 'true'
+        return response, status
+        
+    except Exception as e:
+        logger.exception("Error in generate endpoint")
+        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+
+def stream_generate_events(prompt, url, allow_duplicate=False):
+    """The SSE events of one streamed generation, from fetch to the final result"""
+    try:
+        page = None
         if url:
-            # Check if domain is blacklisted
-            if is_blacklisted(url):
-                domain = get_domain_from_url(url)
-                print(f"Domain {domain} is blacklisted")
-                return jsonify({
-                    'error': f'Domain {domain} is blacklisted due to previous errors',
-                    'blacklisted_domain': domain,
-                    'error_type': 'blacklisted'
-                }), 400
-            
-            print("Generating content from URL...")
-            content = get_webui_content(MODEL_NAME, url, is_url=True)
-            meta_image_url = get_meta_image_url(url)
+            page = fetch_page(url)
+            match = None if allow_duplicate else find_near_duplicate(page)
+            if match:
+                result = near_duplicate_response(match)
+                yield sse_event('content', {'content': result['content']})
+                yield sse_event('image', {'meta_image_url': result['meta_image_url']})
+                yield sse_event('summary', {'title': result['title'], 'category': result['category']})
+                yield sse_event('done', result)
+                return
+            post_prompt, error = build_post_prompt(url, is_url=True, page=page)
         else:
-            print("Generating content from prompt...")
-            content = get_webui_content(MODEL_NAME, prompt, is_url=False)
-            meta_image_url = ""
+            post_prompt, error = build_post_prompt(prompt)
+        if error:
+            yield sse_event('error', {'error': error})
+            return
         
-        print(f"Generated content length: {len(content) if content else 0}")
-        print(f"Meta image URL: {meta_image_url}")
+        think_filter = ThinkStreamFilter()
+        for piece in stream_webui_content(MODEL_NAME, post_prompt):
+            for event, text in think_filter.feed(piece):
+                yield sse_event(event, {'text': text})
         
+        content = think_filter.content()
         if not content:
-            print("No content generated")
-            return jsonify({'error': 'Failed to generate content'}), 500
-        
-        # Generate title and category along with content
-        print("Generating summary...")
-        summary_json = get_summary_of_webui_content(MODEL_NAME, content)
-        print(f"Summary JSON: {summary_json}")
-        
-        # Parse the summary JSON to extract title and category
-        title = ""
-        category = ""
-        try:
-            if summary_json:
-                summary_data = json.loads(summary_json)
-                title = summary_data['result']['summary']
-                category = summary_data['result'].get('category', '')
-                print(f"Parsed title: {title}")
-                print(f"Parsed category: {category}")
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Error parsing summary JSON: {e}")
-            title = "Blog Post " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            category = "General"
+            yield sse_event('error', {'error': 'The AI model generated content but it was empty after processing. Please try again.'})
+            return
+        yield sse_event('content', {'content': content})
         
-        # Ensure all values are strings and not None
-        response_data = {
-            'content': str(content) if content else '',
-            'meta_image_url': str(meta_image_url) if meta_image_url else '',
-            'title': str(title) if title else 'Blog Post',
-            'category': str(category) if category else 'General'
-        }
-        
-        print(f"Final response data: {response_data}")
-        print("=== GENERATE ENDPOINT COMPLETED ===")
+        meta_image_url = page.image_url if page else ""
+        yield sse_event('image', {'meta_image_url': meta_image_url})
         
-        return jsonify(response_data)
+        summary_json = get_summary_of_webui_content(MODEL_NAME, content)
+        title, category = parse_title_and_category(summary_json)
+        yield sse_event('summary', {'title': title, 'category': category})
         
+        result = build_generate_response(content, meta_image_url, title, category)
+        remember_generation(page, url, prompt, result)
+        yield sse_event('done', result)
     except Exception as e:
-        print(f"Error in generate endpoint: {e}")
-        import traceback
-        traceback.print_exc()
-        return jsonify({'error': f'Internal server error: {str(e)}'}), 500
+        logger.exception("Error in generate-stream endpoint")
+        yield sse_event('error', {'error': f'Error generating content: {str(e)}. Please try again.'})
+
+@app.route('/generate-stream', methods=['POST'])
+def generate_stream():
+    """Streaming /generate: post text as SSE tokens, then image and summary events
+
+    Identical concurrent calls follow one run, each getting every event
+    from the start, unless "distinct" is set.
+    """
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    prompt = data.get('prompt')
+    url = data.get('url')
+    if not prompt and not url:
+        return jsonify({'error': 'Either prompt or url must be provided'}), 400
+    if url:
+        rejection = check_url_allowed(url)
+        if rejection:
+            return jsonify(rejection[0]), rejection[1]
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    if data.get('distinct'):
+        events = stream_generate_events(prompt, url, allow_duplicate=True)
+    else:
+        # The run lives on its own thread so a leader that disconnects doesn't cut off the
+        # rest; once every subscriber has gone it stops, closing the Ollama stream
+        events, shared = stream_flights.subscribe(
+            generate_key(MODEL_NAME, prompt, url), stream_generate_events, prompt, url
+        )
+        if shared:
+            CACHE_REQUESTS.inc(cache='generate', result='coalesced')
+            headers['X-Coalesced'] = 'true'
+    
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers=headers
+    )
+
+def run_generate_job(job):
+    return run_generate(
+        job.params.get('prompt'),
+        job.params.get('url'),
+        on_stage=job.enter_stage,
+        allow_duplicate=job.params.get('distinct', False)
+    )
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a /generate request and return its job ID immediately"""
+    data = request.json
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+    
+    prompt = data.get('prompt')
+    url = data.get('url')
+    if not prompt and not url:
+        return jsonify({'error': 'Either prompt or url must be provided'}), 400
+    
+    try:
+        priority = int(data.get('priority', 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'priority must be an integer'}), 400
+    
+    job = job_manager.submit({'prompt': prompt, 'url': url, 'distinct': bool(data.get('distinct'))}, priority=priority)
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': f'/jobs/{job.id}',
+        'queue_depth': job_manager.queue_depth()
+    }), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status and result; pass ?wait=<seconds> to long-poll for a change"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    try:
+        wait = min(float(request.args.get('wait', 0)), JOB_MAX_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number'}), 400
+    if wait > 0:
+        since = request.args.get('since', type=int)
+        job.wait(wait, since_version=since)
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+def normalize_batch_item(item):
+    """Accept {"url": ...} / {"prompt": ...} objects or bare strings"""
+    if isinstance(item, str):
+        if re.match(r'^https?://', item, re.I):
+            return {'url': item}
+        return {'prompt': item}
+    if isinstance(item, dict) and (item.get('url') or item.get('prompt')):
+        return {'url': item.get('url'), 'prompt': item.get('prompt')}
+    return None
+
+@app.route('/batch', methods=['POST'])
+def generate_batch():
+    """Generate many posts at once, streaming each item's result as an SSE event"""
+    data = request.json
+    if not data or not isinstance(data.get('items'), list) or not data['items']:
+        return jsonify({'error': 'items must be a non-empty list of URLs or prompts'}), 400
+    if len(data['items']) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'A batch can hold at most {BATCH_MAX_ITEMS} items'}), 400
+    
+    items = [normalize_batch_item(item) for item in data['items']]
+    domain_slots = DomainSlots(BATCH_PER_DOMAIN)
+    
+    def fetch(item):
+        url = item['url']
+        rejection = check_url_allowed(url)
+        if rejection:
+            return None, rejection
+        with domain_slots.get(get_domain_from_url(url)):
+            page = fetch_page(url)
+        if not page:
+            return None, ({'error': FETCH_FAILED_MESSAGE, 'error_type': 'fetch_failed'}, 502)
+        return page, None
+    
+    def generate(item, page):
+        return run_generate(item.get('prompt'), item.get('url'), page=page)
+    
+    def events():
+        # Invalid and blacklisted items are answered up front
+        runnable = []
+        for index, item in enumerate(items):
+            if item is None:
+                yield sse_event('item', {'index': index, 'status': 400, 'result': {'error': 'Item needs a url or prompt'}})
+            elif item.get('url') and is_blacklisted(item['url']):
+                payload, status = check_url_allowed(item['url'])
+                yield sse_event('item', {'index': index, 'url': item['url'], 'status': status, 'result': payload})
+            else:
+                runnable.append((index, item))
+        
+        succeeded = 0
+        pipeline = run_pipelined(
+            [item for _, item in runnable],
+            fetch,
+            generate,
+            fetch_workers=BATCH_FETCH_WORKERS,
+            generate_workers=llm_router.capacity()
+        )
+        for position, payload, status in pipeline:
+            index, item = runnable[position]
+            if status < 400:
+                succeeded += 1
+            yield sse_event('item', {
+                'index': index,
+                'url': item.get('url'),
+                'prompt': item.get('prompt'),
+                'status': status,
+                'result': payload
+            })
+        yield sse_event('done', {'total': len(items), 'succeeded': succeeded, 'failed': len(items) - succeeded})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/regenerate-title', methods=['POST'])
 def regenerate_title():
@@ -488,22 +1116,12 @@ def regenerate_title():
             return jsonify({'error': 'No content provided'}), 400
         
         # Generate new title using the summary function
-        summary_json = get_summary_of_webui_content(MODEL_NAME, content)
-        
-        try:
-            if summary_json:
-                summary_data = json.loads(summary_json)
-                title = summary_data['result']['summary']
-            else:
-                title = "Blog Post " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Error parsing summary JSON: {e}")
-            title = "Blog Post " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        return jsonify({'title': title})
+        force_fresh = data.get('force_fresh', False)
+        summary_json = regenerate_summary_field(MODEL_NAME, content, 'summary', force_fresh=force_fresh)
+        return jsonify({'title': title_from_summary(summary_json)})
         
     except Exception as e:
-        print(f"Error in regenerate_title endpoint: {e}")
+        logger.exception("Error in regenerate_title endpoint")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @app.route('/regenerate-category', methods=['POST'])
@@ -515,22 +1133,12 @@ def regenerate_category():
             return jsonify({'error': 'No content provided'}), 400
         
         # Generate new category using the summary function
-        summary_json = get_summary_of_webui_content(MODEL_NAME, content)
-        
-        try:
-            if summary_json:
-                summary_data = json.loads(summary_json)
-                category = summary_data['result'].get('category', 'General')
-            else:
-                category = "General"
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Error parsing summary JSON: {e}")
-            category = "General"
-        
-        return jsonify({'category': category})
+        force_fresh = data.get('force_fresh', False)
+        summary_json = regenerate_summary_field(MODEL_NAME, content, 'category', force_fresh=force_fresh)
+        return jsonify({'category': category_from_summary(summary_json)})
         
     except Exception as e:
-        print(f"Error in regenerate_category endpoint: {e}")
+        logger.exception("Error in regenerate_category endpoint")
         return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
 @app.route('/confirm-post', methods=['POST'])
@@ -543,28 +1151,73 @@ def confirm_post():
     if not content:
         return jsonify({'error': 'No content provided'}), 400
     
-    # Use provided title and category, or generate if not provided
-    if title and category:
-        # Create summary JSON with provided title and category
-        summary_json = json.dumps({
-            'result': {
-                'summary': title,
-                'category': category,
-                'category_description': f'Posts about {category}'
-            }
-        })
-    else:
-        # Fallback to generating summary if title/category not provided
-        summary_json = get_summary_of_webui_content(MODEL_NAME, content)
-    
-    post_data = post_to_wordpress(content, meta_image_url, summary_json)
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    post_data, existing = publish_post(content, meta_image_url, title, category, idempotency_key)
     if not post_data or not post_data.get('link'):
         return jsonify({'error': 'Failed to post to WordPress'}), 500
-    return jsonify({'wordpress_url': post_data['link']})
+    return jsonify({'wordpress_url': post_data['link'], 'existing': existing})
+
+def publish_item(item):
+    """Publish one bulk item, returning its per-item result"""
+    if not isinstance(item, dict) or not item.get('content'):
+        return {'status': 'failed', 'error': 'No content provided'}
+    title = item.get('title', "")
+    meta_image_url = item.get('meta_image_url', "")
+    idempotency_key = item.get('idempotency_key') or default_idempotency_key(item['content'], title, meta_image_url)
+    result = {'idempotency_key': idempotency_key}
+    try:
+        post_data, existing = publish_post(
+            item['content'], meta_image_url, title, item.get('category', ""), idempotency_key
+        )
+    except Exception as e:
+        ERRORS.inc(stage='publish', kind='error')
+        logger.exception("Error publishing bulk item", extra={'idempotency_key': idempotency_key})
+        post_data, existing = None, False
+        result['error'] = str(e)
+    if not post_data:
+        result['status'] = 'failed'
+        result.setdefault('error', 'Failed to post to WordPress')
+        return result
+    result['status'] = 'existing' if existing else 'published'
+    result['wordpress_url'] = post_data['link']
+    return result
+
+@app.route('/bulk-publish', methods=['POST'])
+def bulk_publish():
+    """Publish many reviewed posts, each at most once per idempotency key
+
+    Items are published concurrently; category lookups and image uploads
+    overlap while WordPress itself sees at most WP_MAX_CONCURRENCY uploads
+    and post creations at a time. Items without an idempotency_key get one
+    derived from their title, image and content.
+    """
+    data = request.json or {}
+    posts = data.get('posts')
+    if not isinstance(posts, list) or not posts:
+        return jsonify({'error': 'No posts provided'}), 400
+    if len(posts) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} posts per request'}), 400
+
+    results = list(publish_executor.map(publish_item, posts))
+    for index, result in enumerate(results):
+        result['index'] = index
+    counts = {status: 0 for status in ('published', 'existing', 'failed')}
+    for result in results:
+        counts[result['status']] += 1
+    return jsonify({'results': results, **counts})
 
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'ok', 'message': 'Python server is running'})
+    return jsonify({
+        'status': 'ok',
+        'message': 'Python server is running',
+        'llm_backends': llm_router.snapshot()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage latencies, token counts and counters"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/test', methods=['GET'])
 def test():
@@ -578,7 +1231,8 @@ def debug():
         'message': 'Debug endpoint working',
         'timestamp': datetime.now().isoformat(),
         'model_name': MODEL_NAME,
-        'openwebui_url': OPENWEBUI_API_URL
+        'openwebui_url': OPENWEBUI_API_URL,
+        'llm_backends': [backend['url'] for backend in llm_router.snapshot()]
     })
 
 @app.route('/blacklist', methods=['GET'])
@@ -586,9 +1240,79 @@ def get_blacklist_endpoint():
     """Get current blacklisted domains"""
     domains = load_blacklist()
     return jsonify({
-        'blacklisted_domains': list(domains),
-        'count': len(domains)
+        'blacklisted_domains': sorted(domains),
+        'count': len(domains),
+        'domain_states': domain_health.snapshot()
     })
 
+def query_flag(name):
+    """A true/false query parameter, or None when it's absent"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+def query_page():
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), HISTORY_MAX_ROWS)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        limit, offset = 50, 0
+    return limit, offset
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """Generated posts, filtered by source url, domain, date range and publish status"""
+    limit, offset = query_page()
+    url = request.args.get('url')
+    posts = history.posts(
+        url=normalize_url(url) if url else None,
+        domain=request.args.get('domain'),
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        published=query_flag('published'),
+        limit=limit,
+        offset=offset
+    )
+    return jsonify({'posts': posts, 'count': len(posts), 'limit': limit, 'offset': offset})
+
+@app.route('/history/sources', methods=['GET'])
+def get_history_sources():
+    """Fetched source pages, without their text"""
+    limit, offset = query_page()
+    url = request.args.get('url')
+    sources = history.sources(
+        url=normalize_url(url) if url else None,
+        domain=request.args.get('domain'),
+        since=request.args.get('since'),
+        until=request.args.get('until'),
+        limit=limit,
+        offset=offset
+    )
+    return jsonify({'sources': sources, 'count': len(sources), 'limit': limit, 'offset': offset})
+
+@app.route('/history/sources/<int:source_id>', methods=['GET'])
+def get_history_source_text(source_id):
+    text = history.source_text(source_id)
+    if text is None:
+        return jsonify({'error': 'Source not found'}), 404
+    return jsonify({'id': source_id, 'text': text})
+
+@app.route('/history/domains', methods=['GET'])
+def get_history_domains():
+    """Per-domain fetch counts, health state and blacklist status"""
+    limit, offset = query_page()
+    domains = history.domains(
+        domain=request.args.get('domain'),
+        blacklisted=query_flag('blacklisted'),
+        limit=limit,
+        offset=offset
+    )
+    return jsonify({'domains': domains, 'count': len(domains), 'limit': limit, 'offset': offset})
+
+llm_router.start()
+job_manager = JobManager(run_generate_job, workers=JOB_WORKERS, retention=JOB_RETENTION)
+REGISTRY.gauge('blog_job_queue_depth', 'Jobs waiting for a worker', job_manager.queue_depth)
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000) 
\ No newline at end of file
+    app.run(host="0.0.0.0", port=int(os.getenv('REMOTE_SERVER_PORT', '8000'))) 
\ No newline at end of file
@@ -44,6 +44,112 @@ router.post('/generate', async (req, res) => {
   }
 });
 
+// Pipe a Server-Sent Events response from the Python server through to the browser
+async function proxyEventStream(path, req, res) {
+  const controller = new AbortController();
+  let upstream = null;
+  // 'close' also fires after a response ends normally; only a browser that went away
+  // before the end should abort the upstream stream. The Python server then stops the
+  // generation, unless another browser is following the same coalesced run.
+  res.on('close', () => {
+    if (!res.writableEnded) {
+      controller.abort();
+      if (upstream) {
+        upstream.destroy();
+      }
+    }
+  });
+  try {
+    console.log('Forwarding stream request to:', `${REMOTE_SERVER_URL}${path}`);
+    console.log('Request body:', req.body);
+    
+    const response = await axios.post(`${REMOTE_SERVER_URL}${path}`, req.body, {
+      responseType: 'stream',
+      timeout: 0, // the stream stays open for as long as the model is generating
+      signal: controller.signal
+    });
+    upstream = response.data;
+    if (controller.signal.aborted) {
+      upstream.destroy();
+      return;
+    }
+    res.setHeader('Content-Type', 'text/event-stream');
+    res.setHeader('Cache-Control', 'no-cache');
+    res.setHeader('X-Accel-Buffering', 'no');
+    res.flushHeaders();
+    upstream.pipe(res);
+  } catch (err) {
+    if (axios.isCancel(err)) {
+      // The browser disconnected before the stream started, nobody to answer
+      return;
+    }
+    console.error('Error streaming content:', err.message);
+    if (err.response) {
+      // Error responses are plain JSON, read the stream back into an object
+      let raw = '';
+      err.response.data.on('data', chunk => { raw += chunk; });
+      err.response.data.on('end', () => {
+        try {
+          res.status(err.response.status).json(JSON.parse(raw));
+        } catch (parseError) {
+          res.status(err.response.status).json({ 
+            error: 'Server returned non-JSON response',
+            original_status: err.response.status
+          });
+        }
+      });
+    } else {
+      res.status(500).json({ error: 'Failed to generate content' });
+    }
+  }
+}
+
+router.post('/generate-stream', (req, res) => proxyEventStream('/generate-stream', req, res));
+
+router.post('/batch', (req, res) => proxyEventStream('/batch', req, res));
+
+// Job queue: submit returns a job ID right away, status supports ?wait= long-polling
+function forwardJobError(err, res, action) {
+  console.error(`Error ${action}:`, err.message);
+  if (err.response) {
+    res.status(err.response.status).json(err.response.data);
+  } else if (err.code === 'ECONNABORTED') {
+    res.status(408).json({ error: 'Request timeout - the AI server is taking too long to respond. Please try again.' });
+  } else {
+    res.status(500).json({ error: `Failed ${action}` });
+  }
+}
+
+router.post('/jobs', async (req, res) => {
+  try {
+    const response = await axios.post(`${REMOTE_SERVER_URL}/jobs`, req.body, { timeout: 10000 });
+    res.status(response.status).json(response.data);
+  } catch (err) {
+    forwardJobError(err, res, 'submitting job');
+  }
+});
+
+router.get('/jobs/:id', async (req, res) => {
+  try {
+    const response = await axios.get(`${REMOTE_SERVER_URL}/jobs/${encodeURIComponent(req.params.id)}`, {
+      params: req.query,
+      timeout: 70000 // long-polls wait up to 60 seconds
+    });
+    res.json(response.data);
+  } catch (err) {
+    forwardJobError(err, res, 'getting job status');
+  }
+});
+
+router.delete('/jobs/:id', async (req, res) => {
+  try {
+    const response = await axios.delete(`${REMOTE_SERVER_URL}/jobs/${encodeURIComponent(req.params.id)}`, { timeout: 10000 });
+    res.json(response.data);
+  } catch (err) {
+    forwardJobError(err, res, 'cancelling job');
+  }
+});
+
 router.post('/regenerate-title', async (req, res) => {
   try {
     console.log('Forwarding regenerate title request to:', `${REMOTE_SERVER_URL}/regenerate-title`);
@@ -29,4 +29,22 @@ router.post('/confirm-post', async (req, res) => {
   }
 });
 
+router.post('/bulk-publish', async (req, res) => {
+  try {
+    const response = await axios.post(`${REMOTE_SERVER_URL}/bulk-publish`, req.body, {
+      timeout: 3600000 // a full day's posts can take a while even in parallel
+    });
+    res.json(response.data);
+  } catch (err) {
+    console.error('Error bulk publishing to WordPress:', err.message);
+    if (err.response) {
+      res.status(err.response.status).json(err.response.data);
+    } else if (err.code === 'ECONNABORTED') {
+      res.status(408).json({ error: 'Request timeout - retry with the same idempotency keys to resume.' });
+    } else {
+      res.status(500).json({ error: 'Failed to bulk publish to WordPress' });
+    }
+  }
+});
+
 module.exports = router; 
\ No newline at end of file
@@ -0,0 +1,193 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight block and receive the same result (or the same exception).
+    Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Return ``(result, shared)``; shared is True for callers that waited"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class _Broadcast:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.items = []
+        self.finished = False
+        self.error = None
+        self.subscribers = 0
+        self.abandoned = False
+
+
+class _Subscription:
+    """One subscriber's view of a run: what it produced so far, then live"""
+
+    def __init__(self, flight, key, run):
+        self._flight = flight
+        self._key = key
+        self._run = run
+        self._position = 0
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        run = self._run
+        with run.cond:
+            while self._position == len(run.items) and not run.finished:
+                run.cond.wait()
+            if self._position < len(run.items):
+                item = run.items[self._position]
+                self._position += 1
+                return item
+        self.close()
+        if run.error is not None:
+            raise run.error
+        raise StopIteration
+
+    def close(self):
+        """Leave the run; the last subscriber to leave stops it"""
+        if not self._closed:
+            self._closed = True
+            self._flight._leave(self._key, self._run)
+
+
+class StreamFlight:
+    """Coalesce concurrent generators that share a key into one run
+
+    The first subscriber for a key starts the generator on a thread of its
+    own; every subscriber, the first included, gets what it has produced so
+    far and then follows it live. A subscriber that goes away doesn't stop
+    the run for the others, but once the last one has closed its iterator
+    the generator is closed at its next item, so nobody's work carries on
+    unwatched.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runs = {}
+
+    def subscribe(self, key, fn, *args, **kwargs):
+        """Return ``(iterator, shared)``; shared is True when joining a run in flight
+
+        Close the iterator when done with it, even part way.
+        """
+        with self._lock:
+            run = self._runs.get(key)
+            shared = run is not None
+            if run is None:
+                run = self._runs[key] = _Broadcast()
+                threading.Thread(
+                    target=self._produce, args=(key, run, fn, args, kwargs), name='stream-flight', daemon=True
+                ).start()
+            run.subscribers += 1
+        return _Subscription(self, key, run), shared
+
+    def _leave(self, key, run):
+        with self._lock:
+            run.subscribers -= 1
+            if run.subscribers or run.finished:
+                return
+            run.abandoned = True
+            # A new subscriber for the key starts a fresh run
+            if self._runs.get(key) is run:
+                del self._runs[key]
+
+    def _produce(self, key, run, fn, args, kwargs):
+        generator = fn(*args, **kwargs)
+        try:
+            for item in generator:
+                if run.abandoned:
+                    break
+                with run.cond:
+                    run.items.append(item)
+                    run.cond.notify_all()
+        except BaseException as e:
+            run.error = e
+        finally:
+            # Raises GeneratorExit at its yield, so with blocks inside it (an
+            # open Ollama response, say) are closed
+            generator.close()
+            with self._lock:
+                if self._runs.get(key) is run:
+                    del self._runs[key]
+            with run.cond:
+                run.finished = True
+                run.cond.notify_all()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._runs)
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop
+
+    Waiters await the leader's task. A waiter that is cancelled doesn't
+    cancel the shared call; it still finishes for everyone else.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Return ``(result, shared)``; shared is True for callers that waited"""
+        task = self._calls.get(key)
+        if task is not None:
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(fn(*args, **kwargs))
+        self._calls[key] = task
+        task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), False
+
+    def in_flight(self):
+        return len(self._calls)
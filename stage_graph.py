@@ -0,0 +1,123 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_deadline = contextvars.ContextVar('stage_deadline', default=None)
+
+
+class StageExpired(RuntimeError):
+    pass
+
+
+def stage_deadline():
+    """time.monotonic() deadline of the stage running in this context, or None"""
+    return _deadline.get()
+
+
+@contextmanager
+def deadline_scope(deadline):
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _run_stage(fn, deadline, kwargs):
+    # Queued behind other work for longer than the stage may take: nobody is waiting any more
+    if deadline and time.monotonic() >= deadline:
+        raise StageExpired("stage deadline passed before it started")
+    with deadline_scope(deadline):
+        return fn(**kwargs)
+
+
+class Stage:
+    def __init__(self, name, fn, deps, timeout, fallback):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class StageGraph:
+    """A small dependency graph of pipeline stages run on a thread pool
+
+    Each stage is called with its dependencies' results as keyword
+    arguments and starts as soon as those are available, so independent
+    stages run side by side. A stage that raises or runs past its timeout
+    resolves to its fallback value instead. Python threads can't be killed,
+    so a stage's deadline is published through stage_deadline() for the
+    blocking calls it makes to honour; a stage still queued at its deadline
+    isn't run at all.
+    """
+
+    def __init__(self, executor):
+        self.executor = executor
+        self.stages = {}
+
+    def add(self, name, fn, deps=(), timeout=None, fallback=None):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+        self.stages[name] = Stage(name, fn, deps, timeout, fallback)
+        return self
+
+    def run(self, before_stage=None):
+        """Run every stage, returning (results, timings)
+
+        ``before_stage(name)`` is called from the calling thread right before
+        a stage is started; an exception it raises aborts the run.
+        """
+        results = {}
+        timings = {}
+        pending = dict(self.stages)
+        running = {}
+
+        def resolve(stage, value, status, started):
+            results[stage.name] = value
+            timings[stage.name] = {
+                'ms': round((time.monotonic() - started) * 1000, 1),
+                'status': status,
+            }
+
+        try:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    if all(dep in results for dep in stage.deps):
+                        del pending[name]
+                        if before_stage:
+                            before_stage(name)
+                        kwargs = {dep: results[dep] for dep in stage.deps}
+                        started = time.monotonic()
+                        deadline = started + stage.timeout if stage.timeout else None
+                        future = self.executor.submit(_run_stage, stage.fn, deadline, kwargs)
+                        running[future] = (stage, started, deadline)
+
+                deadlines = [deadline for _, _, deadline in running.values() if deadline]
+                wait_for = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(list(running), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    stage, started, _ = running.pop(future)
+                    try:
+                        resolve(stage, future.result(), 'ok', started)
+                    except Exception as e:
+                        logger.warning("Stage failed, using fallback", extra={'stage': stage.name, 'error': str(e)})
+                        resolve(stage, stage.fallback, 'error', started)
+
+                now = time.monotonic()
+                for future, (stage, started, deadline) in list(running.items()):
+                    if deadline and now >= deadline:
+                        del running[future]
+                        future.cancel()
+                        logger.warning("Stage timed out, using fallback", extra={'stage': stage.name, 'timeout_s': stage.timeout})
+                        resolve(stage, stage.fallback, 'timeout', started)
+        finally:
+            for future in running:
+                future.cancel()
+        return results, timings
@@ -0,0 +1,48 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class SummaryCache:
+    """Bounded LRU of summary JSON keyed by content, model and options
+
+    Besides the latest answer, each entry remembers which of its fields have
+    not been shown to anyone yet. A regenerate of one of those fields can be
+    answered from the entry instead of asking the model again.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(model_name, content, options):
+        raw = json.dumps([model_name, content, options], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry['summary_json']
+
+    def put(self, key, summary_json, unused=()):
+        with self._lock:
+            self._entries[key] = {'summary_json': summary_json, 'unused': set(unused)}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def take_unused(self, key, field):
+        """Return the cached answer if its ``field`` hasn't been used yet"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or field not in entry['unused']:
+                return None
+            entry['unused'].discard(field)
+            self._entries.move_to_end(key)
+            return entry['summary_json']
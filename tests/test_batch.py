@@ -0,0 +1,80 @@
+import threading
+import time
+
+from batch import DomainSlots, run_pipelined
+
+
+def test_results_cover_every_item():
+    items = [{'url': 'https://example.com/1'}, {'prompt': 'p'}, {'url': 'https://example.com/bad'}]
+
+    def fetch(item):
+        if item['url'].endswith('bad'):
+            return None, ({'error': 'fetch failed'}, 502)
+        return item['url'].upper(), None
+
+    def generate(item, page):
+        return {'page': page, 'prompt': item.get('prompt')}, 200
+
+    results = {index: (payload, status) for index, payload, status in run_pipelined(items, fetch, generate)}
+    assert results == {
+        0: ({'page': 'HTTPS://EXAMPLE.COM/1', 'prompt': None}, 200),
+        1: ({'page': None, 'prompt': 'p'}, 200),
+        2: ({'error': 'fetch failed'}, 502),
+    }
+
+
+def test_exceptions_become_500s():
+    def fetch(item):
+        raise RuntimeError("boom")
+
+    results = list(run_pipelined([{'url': 'u'}], fetch, lambda item, page: ({}, 200)))
+    assert results == [(0, {'error': 'Internal server error: boom'}, 500)]
+
+
+def test_fetching_runs_only_so_far_ahead_of_generation():
+    lock = threading.Lock()
+    held = 0
+    most_held = 0
+
+    def fetch(item):
+        nonlocal held, most_held
+        with lock:
+            held += 1
+            most_held = max(most_held, held)
+        return item, None
+
+    def generate(item, page):
+        nonlocal held
+        time.sleep(0.01)
+        with lock:
+            held -= 1
+        return {}, 200
+
+    items = [{'url': f'https://example.com/{i}'} for i in range(30)]
+    results = list(run_pipelined(items, fetch, generate, fetch_workers=8, generate_workers=2))
+    assert len(results) == 30
+    assert most_held <= 4
+
+
+def test_abandoned_batch_releases_waiting_fetchers():
+    started = threading.Event()
+
+    def generate(item, page):
+        started.set()
+        time.sleep(0.2)
+        return {}, 200
+
+    items = [{'url': f'https://example.com/{i}'} for i in range(10)]
+    pipeline = run_pipelined(items, lambda item: (item, None), generate, generate_workers=1, fetch_ahead=1)
+    next(pipeline)
+    pipeline.close()
+    deadline = time.monotonic() + 3
+    while time.monotonic() < deadline and any(t.name.startswith('batch-fetch') for t in threading.enumerate()):
+        time.sleep(0.05)
+    assert not any(t.name.startswith('batch-fetch') for t in threading.enumerate())
+
+
+def test_domain_slots_are_shared_per_domain():
+    slots = DomainSlots(2)
+    assert slots.get('a.com') is slots.get('a.com')
+    assert slots.get('a.com') is not slots.get('b.com')
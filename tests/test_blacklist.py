@@ -0,0 +1,44 @@
+import os
+
+from blacklist import BlacklistIndex, domain_suffixes
+
+
+def test_domain_suffixes():
+    assert list(domain_suffixes('a.b.com')) == ['a.b.com', 'b.com', 'com']
+
+
+def test_parent_domains_cover_subdomains(tmp_path):
+    index = BlacklistIndex(str(tmp_path / 'blacklist.xml'), flush_delay=60)
+    index.add('Example.com')
+    assert index.contains('example.com')
+    assert index.contains('news.EXAMPLE.com')
+    assert not index.contains('example.org')
+    assert not index.contains('')
+
+
+def test_flush_writes_the_file_and_a_new_index_reads_it(tmp_path):
+    path = str(tmp_path / 'blacklist.xml')
+    index = BlacklistIndex(path, flush_delay=60)
+    index.add('a.com')
+    index.add('b.com')
+    assert not os.path.exists(path)
+    index.flush()
+    assert BlacklistIndex(path).domains() == {'a.com', 'b.com'}
+
+
+def test_hand_edits_are_picked_up_without_losing_pending_additions(tmp_path):
+    path = str(tmp_path / 'blacklist.xml')
+    index = BlacklistIndex(path, flush_delay=60, check_interval=0)
+    index.add('pending.com')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<blacklist><domains><domain>edited.com</domain></domains></blacklist>')
+    assert index.contains('edited.com')
+    assert index.contains('pending.com')
+    index.flush()
+    assert BlacklistIndex(path).domains() == {'edited.com', 'pending.com'}
+
+
+def test_unreadable_file_means_an_empty_blacklist(tmp_path):
+    path = tmp_path / 'blacklist.xml'
+    path.write_text('<blacklist><domains>')
+    assert BlacklistIndex(str(path)).domains() == set()
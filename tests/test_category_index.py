@@ -0,0 +1,112 @@
+import threading
+import time
+
+from category_index import DEFAULT_CATEGORY_ID, CategoryIndex, normalize_name, slugify
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+        self.text = str(body)
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        if self.body is None:
+            raise ValueError("no body")
+        return self.body
+
+
+class FakeWordPress:
+    def __init__(self, categories, per_page=2):
+        self.categories = list(categories)
+        self.per_page = per_page
+        self.gets = 0
+        self.posts = []
+        self.post_response = None
+
+    def get(self, url, auth=None, params=None):
+        self.gets += 1
+        page = params['page']
+        pages = max(1, -(-len(self.categories) // self.per_page))
+        body = self.categories[(page - 1) * self.per_page:page * self.per_page]
+        return FakeResponse(body=body, headers={'X-WP-TotalPages': str(pages)})
+
+    def post(self, url, auth=None, json=None):
+        self.posts.append(json)
+        time.sleep(0.05)
+        if self.post_response:
+            return self.post_response
+        category = {'id': 100 + len(self.posts), 'name': json['name'], 'slug': json['slug']}
+        return FakeResponse(201, category)
+
+
+def make_index(wordpress, **kwargs):
+    return CategoryIndex(lambda: wordpress, 'http://wp', ('u', 'p'), **kwargs)
+
+
+CATEGORIES = [
+    {'id': 2, 'name': 'News', 'slug': 'news'},
+    {'id': 3, 'name': 'Food &amp; Drink', 'slug': 'food-drink'},
+    {'id': 4, 'name': 'Tech', 'slug': 'technology'},
+]
+
+
+def test_names_compare_like_an_editor_would():
+    assert normalize_name('  Food &amp;   Drink ') == 'food & drink'
+    assert slugify('Food & Drink!') == 'food-drink'
+
+
+def test_every_page_is_loaded_and_names_or_slugs_match():
+    wordpress = FakeWordPress(CATEGORIES)
+    index = make_index(wordpress)
+    assert index.get_or_create('food & drink') == 3
+    assert index.get_or_create('NEWS') == 2
+    assert index.get_or_create('Technology') == 4
+    assert wordpress.gets == 2
+    assert wordpress.posts == []
+
+
+def test_concurrent_creates_share_one_post():
+    wordpress = FakeWordPress(CATEGORIES)
+    index = make_index(wordpress)
+    index.refresh()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(index.get_or_create('Gardening'))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(wordpress.posts) == 1
+    assert results == [101] * 5
+    assert index.get_or_create('gardening') == 101
+
+
+def test_term_exists_uses_the_existing_id():
+    wordpress = FakeWordPress([])
+    wordpress.post_response = FakeResponse(400, {'code': 'term_exists', 'data': {'term_id': 42}})
+    index = make_index(wordpress)
+    assert index.get_or_create('Gardening') == 42
+    assert index.lookup('gardening') == 42
+
+
+def test_failed_create_falls_back_to_the_default_category():
+    wordpress = FakeWordPress([])
+    wordpress.post_response = FakeResponse(500)
+    assert make_index(wordpress).get_or_create('Gardening') == DEFAULT_CATEGORY_ID
+
+
+def test_stale_index_is_reloaded():
+    wordpress = FakeWordPress(CATEGORIES, per_page=10)
+    index = make_index(wordpress, ttl=0)
+    index.refresh()
+    time.sleep(0.01)
+    index.refresh()
+    assert wordpress.gets == 2
+    index = make_index(wordpress, ttl=600)
+    index.refresh()
+    index.refresh()
+    assert wordpress.gets == 3
@@ -0,0 +1,44 @@
+from bs4 import BeautifulSoup
+
+from content_extract import extract_main_text, link_density
+from page_ingest import clean_text
+
+PARAGRAPH = "<p>The council approved the budget, adding three bus lines, a tram extension and new cycle lanes across town.</p>"
+
+ARTICLE_PAGE = f"""<html><body>
+<nav><a href="/">Home</a> <a href="/news">News</a></nav>
+<div class="cookie-banner">We use cookies to improve your experience on this website, please accept them.</div>
+<div class="article-body">{PARAGRAPH * 5}</div>
+<div class="comments"><p>First comment, this is a long comment about something else entirely.</p></div>
+<footer>Copyright 2024, all rights reserved, contact us at the address below.</footer>
+</body></html>"""
+
+
+def extract(html):
+    return extract_main_text(BeautifulSoup(html, 'html.parser'), clean_text)
+
+
+def test_article_body_without_boilerplate():
+    text = extract(ARTICLE_PAGE)
+    assert text.startswith("The council approved the budget")
+    assert "cookies" not in text
+    assert "First comment" not in text
+    assert "Copyright" not in text
+    assert "Home" not in text
+
+
+def test_pages_without_paragraphs_use_the_densest_block():
+    sentence = "Plain text without paragraph markup goes on for a while. "
+    text = extract(f"<html><body><div>{sentence * 10}</div><div><a href='/x'>link</a></div></body></html>")
+    assert text.startswith("Plain text without paragraph markup")
+
+
+def test_nothing_convincing_gives_an_empty_string():
+    assert extract("<html><body><p>Too short.</p></body></html>") == ''
+
+
+def test_link_density():
+    soup = BeautifulSoup("<div>plain <a href='/'>link</a></div><div></div>", 'html.parser')
+    first, empty = soup.find_all('div')
+    assert link_density(first) == len('link') / len('plain link')
+    assert link_density(empty) == 1.0
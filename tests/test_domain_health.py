@@ -0,0 +1,96 @@
+import time
+
+from domain_health import CLOSED, HALF_OPEN, OPEN, DomainHealth, parse_retry_after
+
+
+def test_reserve_returns_the_wait_instead_of_sleeping():
+    health = DomainHealth(rate=10.0, burst=1, max_wait=5.0)
+    assert health.reserve('example.com') == (True, "", 0.0)
+    started = time.monotonic()
+    allowed, reason, wait = health.reserve('example.com')
+    assert time.monotonic() - started < 0.05
+    assert allowed and reason == ""
+    assert 0.05 < wait <= 0.1
+
+
+def test_reserve_refuses_past_max_wait():
+    health = DomainHealth(rate=1.0, burst=1, max_wait=0.5)
+    assert health.reserve('example.com')[0]
+    allowed, reason, wait = health.reserve('example.com')
+    assert not allowed
+    assert reason == "rate limit exceeded for example.com"
+    assert wait == 0.0
+
+
+def test_acquire_sleeps_for_the_reserved_wait():
+    health = DomainHealth(rate=20.0, burst=1, max_wait=5.0)
+    health.acquire('example.com')
+    started = time.monotonic()
+    assert health.acquire('example.com') == (True, "")
+    assert time.monotonic() - started >= 0.04
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after('') is None
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+def test_circuit_opens_after_the_failure_threshold():
+    health = DomainHealth(failure_threshold=3, base_cooldown=30.0)
+    for _ in range(2):
+        health.record_failure('example.com', error='boom')
+    assert health.state_of('example.com')['state'] == CLOSED
+    health.record_failure('example.com', error='boom')
+    state = health.state_of('example.com')
+    assert state['state'] == OPEN
+    assert state['last_error'] == 'boom'
+    assert health.retry_at('example.com') is not None
+    assert health.acquire('example.com') == (False, "circuit open for example.com")
+
+
+def test_429_trips_at_once_and_honours_retry_after():
+    health = DomainHealth(base_cooldown=1.0)
+    health.record_failure('example.com', retry_after=600, trip=True)
+    assert health.state_of('example.com')['state'] == OPEN
+    assert health._states['example.com'].open_until - time.monotonic() > 590
+
+
+def test_half_open_lets_one_probe_through():
+    health = DomainHealth(failure_threshold=1, base_cooldown=0.01)
+    health.record_failure('example.com')
+    time.sleep(0.02)
+    assert health.state_of('example.com')['state'] == HALF_OPEN
+    assert health.acquire('example.com')[0]
+    assert health.acquire('example.com') == (False, "waiting on half-open probe for example.com")
+    health.record_success('example.com')
+    assert health.state_of('example.com')['state'] == CLOSED
+    assert health.acquire('example.com')[0]
+
+
+def test_failed_probe_doubles_the_cooldown():
+    health = DomainHealth(failure_threshold=1, base_cooldown=0.01)
+    health.record_failure('example.com')
+    time.sleep(0.02)
+    assert health.acquire('example.com')[0]
+    health.record_failure('example.com')
+    assert health.state_of('example.com')['state'] == OPEN
+    assert health._states['example.com'].trips == 2
+
+
+def test_release_frees_the_probe_without_closing_the_circuit():
+    health = DomainHealth(failure_threshold=1, base_cooldown=0.01)
+    health.record_failure('example.com')
+    time.sleep(0.02)
+    assert health.acquire('example.com')[0]
+    health.release('example.com')
+    assert health.acquire('example.com')[0]
+    assert health.state_of('example.com')['state'] == HALF_OPEN
+
+
+def test_snapshot_lists_every_domain():
+    health = DomainHealth()
+    health.acquire('a.com')
+    health.record_failure('b.com')
+    assert set(health.snapshot()) == {'a.com', 'b.com'}
@@ -0,0 +1,24 @@
+from generation_profiles import PROFILES, SUMMARY_SCHEMA, build_payload
+
+
+def test_every_profile_uses_the_num_ctx_it_is_given():
+    # A model reloads whenever num_ctx changes, so no profile may pick its own
+    messages = [{'role': 'user', 'content': 'hello'}]
+    for name in PROFILES:
+        assert 'num_ctx' not in PROFILES[name]['options']
+        payload = build_payload(name, 'model', messages, 4096)
+        assert payload['options']['num_ctx'] == 4096
+
+
+def test_build_payload_copies_options():
+    payload = build_payload('post', 'model', [], 4096, stream=True)
+    payload['options']['temperature'] = 0
+    assert PROFILES['post']['options']['temperature'] != 0
+    assert payload['stream'] is True
+    assert 'format' not in payload
+
+
+def test_summary_payload_asks_for_json():
+    payload = build_payload('summary', 'model', [], 4096)
+    assert payload['format'] == SUMMARY_SCHEMA
+    assert payload['options']['num_predict'] < PROFILES['post']['options']['num_predict']
@@ -0,0 +1,85 @@
+import pytest
+
+from blacklist import BlacklistIndex
+from history_store import HistoryStore
+from page_ingest import PageResult
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path / 'history.db'), flush_interval=0.01)
+    yield history
+    history.close()
+
+
+def test_sources_keep_their_text_compressed_and_filter_by_domain(store):
+    page = PageResult(url='https://www.example.com/a', text='full page', title='A', main_text='article body')
+    store.record_source('https://www.example.com/a', 'www.example.com', page)
+    store.record_source('https://other.org/b', 'other.org', PageResult(url='https://other.org/b', text='b'))
+    store.flush()
+    (source,) = store.sources(domain='example.com')
+    assert (source['url'], source['title'], source['text_length']) == ('https://www.example.com/a', 'A', 12)
+    assert 'text' not in source
+    assert store.source_text(source['id']) == 'article body'
+    assert store.source_text(12345) is None
+    assert len(store.sources(since='2000-01-01', until='2999-12-31')) == 2
+
+
+def test_publication_is_attached_to_the_generated_post(store):
+    post = {'title': 'T', 'category': 'News', 'content': 'Generated post', 'meta_image_url': ''}
+    store.record_post('https://example.com/a', 'example.com', None, post)
+    store.record_post(None, None, 'a prompt', {'title': 'P', 'content': 'Other post'})
+    store.record_publication('Generated post', 'Edited title', '', {'id': 9, 'link': 'http://wp/p/9'}, 'key-1')
+    # Edited before publishing, so there's no generated post to attach it to
+    store.record_publication('Hand written', 'H', 'News', {'id': 10, 'link': 'http://wp/p/10'})
+    store.flush()
+    published = store.posts(published=True)
+    # The hand-written post was never generated, so it sorts last
+    assert [(row['title'], row['category'], row['wordpress_url']) for row in published] == [
+        ('Edited title', 'News', 'http://wp/p/9'),
+        ('H', 'News', 'http://wp/p/10'),
+    ]
+    assert published[0]['url'] == 'https://example.com/a'
+    assert published[0]['idempotency_key'] == 'key-1'
+    assert [row['prompt'] for row in store.posts(published=False)] == ['a prompt']
+    assert len(store.posts(limit=1, offset=1)) == 1
+
+
+def test_domain_state_and_counters(store):
+    state = {'state': 'open', 'consecutive_failures': 3, 'last_error': '503', 'next_retry_at': None}
+    store.record_domain('example.com', {'state': 'closed'}, fetched=True)
+    store.record_domain('example.com', state, fetched=True, failed=True)
+    store.flush()
+    (row,) = store.domains(domain='example.com')
+    assert (row['state'], row['fetches'], row['failures'], row['last_error']) == ('open', 2, 1, '503')
+    assert store.domains(blacklisted=True) == []
+
+
+def test_blacklist_index_imports_the_xml_once_and_follows_the_store(store, tmp_path):
+    path = tmp_path / 'blacklist.xml'
+    path.write_text('<blacklist><domains><domain>old.com</domain></domains></blacklist>')
+    index = BlacklistIndex(str(path), check_interval=0, store=store)
+    assert index.contains('www.old.com')
+    version = store.blacklist_version()
+
+    index.add('new.com')
+    index.flush()
+    assert store.blacklisted_domains() == {'old.com', 'new.com'}
+    assert store.blacklist_version() != version
+
+    path.write_text('<blacklist><domains><domain>ignored.com</domain></domains></blacklist>')
+    again = BlacklistIndex(str(path), store=store)
+    assert again.domains() == {'old.com', 'new.com'}
+
+
+def test_downloads_are_imported_once(store, tmp_path):
+    folder = tmp_path / 'downloads'
+    folder.mkdir()
+    (folder / 'example.com_a_1700000000.html').write_text('old page text')
+    (folder / 'notes.txt').write_text('not a download')
+    assert store.import_downloads(str(folder)) == 1
+    assert store.import_downloads(str(folder)) == 0
+    (source,) = store.sources()
+    assert source['legacy_file'] == 'example.com_a_1700000000.html'
+    assert source['url'] is None
+    assert store.source_text(source['id']) == 'old page text'
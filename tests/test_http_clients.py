@@ -0,0 +1,52 @@
+import requests
+
+import http_clients
+from http_clients import SessionModule, get_session
+
+
+def test_sessions_are_shared_per_destination():
+    assert get_session('source') is get_session('source')
+    assert get_session('source') is not get_session('llm')
+
+
+def test_settings_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('HTTP_LLM_READ_TIMEOUT', '600')
+    monkeypatch.setenv('HTTP_WORDPRESS_RETRIES', '1')
+    assert http_clients._setting('llm', 'read_timeout') == 600.0
+    assert http_clients._setting('wordpress', 'retries') == 1
+    assert http_clients._setting('source', 'read_timeout') == 15.0
+
+
+def test_built_session_applies_timeouts_retries_and_headers(monkeypatch):
+    monkeypatch.setenv('HTTP_SOURCE_READ_TIMEOUT', '7')
+    session = http_clients._build_session('source')
+    assert session.default_timeout == (5.0, 7.0)
+    assert session.headers['User-Agent'] == http_clients.BROWSER_HEADERS['User-Agent']
+    retry = session.get_adapter('https://example.com').max_retries
+    assert retry.read == 0
+    assert not retry.respect_retry_after_header
+    assert 503 in retry.status_forcelist
+
+
+def test_timeout_session_keeps_an_explicit_timeout(monkeypatch):
+    seen = []
+    monkeypatch.setattr(requests.Session, 'request', lambda self, method, url, **kwargs: seen.append(kwargs))
+    session = http_clients.TimeoutSession((1, 2))
+    session.request('GET', 'http://example.com')
+    session.request('GET', 'http://example.com', timeout=9)
+    assert seen == [{'timeout': (1, 2)}, {'timeout': 9}]
+
+
+def test_session_module_routes_verbs_and_passes_the_rest_through(monkeypatch):
+    calls = []
+
+    class Recorder:
+        def request(self, method, url, **kwargs):
+            calls.append((method, url, kwargs))
+
+    monkeypatch.setitem(http_clients._sessions, 'wordpress', Recorder())
+    module = SessionModule('wordpress')
+    module.post('http://wp/posts', json={'a': 1})
+    module.get('http://wp/posts')
+    assert calls == [('POST', 'http://wp/posts', {'json': {'a': 1}}), ('GET', 'http://wp/posts', {})]
+    assert module.exceptions is requests.exceptions
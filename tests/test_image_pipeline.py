@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from image_pipeline import ImagePipeline, ImageTooLarge, MediaIdCache
+
+
+class FakeResponse:
+    def __init__(self, data, content_type='image/png'):
+        self.data = data
+        self.headers = {'Content-Type': content_type}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.data), chunk_size):
+            yield self.data[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeSession:
+    def __init__(self, data, content_type='image/png'):
+        self.data = data
+        self.content_type = content_type
+
+    def get(self, url, stream=False):
+        return FakeResponse(self.data, self.content_type)
+
+
+class SlowUploader:
+    def __init__(self):
+        self.uploads = 0
+        self._lock = threading.Lock()
+
+    def upload_to_media_library(self, path, name, title):
+        time.sleep(0.05)
+        with self._lock:
+            self.uploads += 1
+            return {'id': 100 + self.uploads}
+
+
+def make_pipeline(tmp_path, data=b'same image bytes', content_type='image/png', **kwargs):
+    uploader = SlowUploader()
+    cache = MediaIdCache(str(tmp_path / 'media_cache.json'))
+    session = FakeSession(data, content_type)
+    pipeline = ImagePipeline(lambda: session, uploader, cache, work_dir=str(tmp_path / 'images'), **kwargs)
+    # The bytes aren't a real image, leave them as they are
+    pipeline.process = lambda data: (data, 'png')
+    return pipeline, uploader, cache
+
+
+def test_same_image_at_once_is_uploaded_once(tmp_path):
+    pipeline, uploader, cache = make_pipeline(tmp_path)
+    results = []
+    threads = [
+        threading.Thread(target=lambda i=i: results.append(pipeline.media_id_for(f'https://cdn{i}.example.com/a.png')))
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert uploader.uploads == 1
+    assert results == [101] * 6
+    assert cache.by_url('https://cdn3.example.com/a.png') == 101
+
+
+class SlowRecordCache(MediaIdCache):
+    def record(self, media_id, url=None, digest=None):
+        if digest:
+            time.sleep(0.1)
+        super().record(media_id, url=url, digest=digest)
+
+
+def test_upload_is_recorded_before_the_next_caller_gets_in(tmp_path):
+    pipeline, uploader, _ = make_pipeline(tmp_path)
+    pipeline.media_cache = SlowRecordCache(str(tmp_path / 'slow_cache.json'))
+    first = threading.Thread(target=pipeline.media_id_for, args=('https://a.example.com/a.png',))
+    first.start()
+    # Arrive while the first upload is done but still being recorded
+    time.sleep(0.08)
+    assert pipeline.media_id_for('https://b.example.com/a.png') == 101
+    first.join()
+    assert uploader.uploads == 1
+
+
+def test_known_url_skips_the_download(tmp_path):
+    pipeline, uploader, cache = make_pipeline(tmp_path)
+    cache.record(7, url='https://example.com/a.png')
+    pipeline.session = None
+    assert pipeline.media_id_for('https://example.com/a.png') == 7
+    assert uploader.uploads == 0
+
+
+def test_cache_survives_a_restart(tmp_path):
+    pipeline, _, _ = make_pipeline(tmp_path)
+    media_id = pipeline.media_id_for('https://example.com/a.png')
+    reloaded = MediaIdCache(str(tmp_path / 'media_cache.json'))
+    assert reloaded.by_url('https://example.com/a.png') == media_id
+    reloaded.forget(media_id)
+    assert reloaded.by_url('https://example.com/a.png') is None
+
+
+def test_download_refuses_oversized_and_non_images(tmp_path):
+    pipeline, _, _ = make_pipeline(tmp_path, data=b'x' * 1000, max_bytes=100)
+    with pytest.raises(ImageTooLarge):
+        pipeline.download('https://example.com/big.png')
+    pipeline, _, _ = make_pipeline(tmp_path, content_type='text/html')
+    with pytest.raises(ValueError):
+        pipeline.download('https://example.com/page')
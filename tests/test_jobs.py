@@ -0,0 +1,90 @@
+import threading
+
+from jobs import CANCELLED, FAILED, QUEUED, SUCCEEDED, JobManager
+
+
+def wait_done(job, timeout=2):
+    for _ in range(100):
+        job.wait(timeout / 100)
+        if job.finished_at is not None:
+            return job
+    raise AssertionError(f"job still {job.status}")
+
+
+def test_job_runs_through_its_stages():
+    def handler(job):
+        job.enter_stage('fetch')
+        job.enter_stage('generate')
+        return {'content': job.params['prompt']}, 200
+
+    manager = JobManager(handler, workers=1)
+    job = wait_done(manager.submit({'prompt': 'hi'}))
+    assert job.status == SUCCEEDED
+    assert job.result == {'content': 'hi'}
+    assert [stage['stage'] for stage in job.stages] == ['fetch', 'generate']
+    assert all(stage['finished_at'] for stage in job.stages)
+    assert manager.get(job.id) is job
+
+
+def test_error_results_and_exceptions_fail_the_job():
+    def handler(job):
+        if job.params.get('raise'):
+            raise RuntimeError("boom")
+        return {'error': 'bad url'}, 400
+
+    manager = JobManager(handler, workers=1)
+    job = wait_done(manager.submit({}))
+    assert (job.status, job.status_code, job.error) == (FAILED, 400, 'bad url')
+    job = wait_done(manager.submit({'raise': True}))
+    assert (job.status, job.status_code, job.error) == (FAILED, 500, 'boom')
+
+
+def test_lower_priority_numbers_run_first():
+    gate = threading.Event()
+    order = []
+
+    def handler(job):
+        gate.wait(2)
+        order.append(job.params['name'])
+        return {}, 200
+
+    manager = JobManager(handler, workers=1)
+    blocker = manager.submit({'name': 'blocker'})
+    blocker.wait(1, since_version=0)
+    low = manager.submit({'name': 'low'}, priority=20)
+    high = manager.submit({'name': 'high'}, priority=1)
+    gate.set()
+    wait_done(low)
+    assert order == ['blocker', 'high', 'low']
+    assert high.status == SUCCEEDED
+
+
+def test_cancel_a_queued_and_a_running_job():
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(job):
+        job.enter_stage('generate')
+        started.set()
+        release.wait(2)
+        job.enter_stage('summarize')
+        return {}, 200
+
+    manager = JobManager(handler, workers=1)
+    running = manager.submit({})
+    assert started.wait(2)
+    queued = manager.submit({})
+    assert queued.status == QUEUED
+    manager.cancel(queued.id)
+    assert queued.status == CANCELLED
+    manager.cancel(running.id)
+    release.set()
+    assert wait_done(running).status == CANCELLED
+    assert manager.cancel('missing') is None
+
+
+def test_finished_jobs_are_pruned_after_retention():
+    manager = JobManager(lambda job: ({}, 200), workers=1, retention=0)
+    job = wait_done(manager.submit({}))
+    manager.submit({})
+    assert manager.get(job.id) is None
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from llm_router import Backend, DeadlineExceeded, LLMRouter, NoBackendAvailable, parse_backends
+
+
+class FakeResponse:
+    def __init__(self, url):
+        self.url = url
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeSession:
+    def __init__(self, refuse=()):
+        self.refuse = set(refuse)
+        self.posts = []
+
+    def post(self, url, json=None, stream=False, timeout=None):
+        self.posts.append((url, json, timeout))
+        if url in self.refuse:
+            raise requests.exceptions.ConnectionError(f"refused {url}")
+        return FakeResponse(url)
+
+
+def make_router(urls, session, **kwargs):
+    backends = [Backend(url, max_concurrency=1) for url in urls]
+    return LLMRouter(backends, lambda: session, probe_interval=0, **kwargs), backends
+
+
+def test_parse_backends():
+    assert [b.url for b in parse_backends('', 'http://a/api/chat')] == ['http://a/api/chat']
+    assert [b.name for b in parse_backends('http://a:1/api/chat, http://b:2/api/chat', None)] == ['a:1', 'b:2']
+    backend = parse_backends('[{"url": "http://a/api/chat", "weight": 2, "models": ["m"]}]', None)[0]
+    assert backend.weight == 2.0
+    assert backend.serves('m') and not backend.serves('other')
+
+
+def test_warm_up_uses_the_real_num_ctx():
+    session = FakeSession()
+    router, backends = make_router(['http://a/api/chat'], session, warm_models=['m'], num_ctx=4096, keep_alive='1h')
+    router.warm_up(backends[0])
+    _, payload, _ = session.posts[0]
+    assert payload['model'] == 'm'
+    assert payload['options'] == {'num_ctx': 4096}
+    assert payload['keep_alive'] == '1h'
+
+
+def test_chat_spreads_over_free_backends():
+    session = FakeSession()
+    router, backends = make_router(['http://a/api/chat', 'http://b/api/chat'], session)
+    with router.chat({'model': 'm'}) as first, router.chat({'model': 'm'}) as second:
+        assert {first.url, second.url} == {'http://a/api/chat', 'http://b/api/chat'}
+        assert all(b.outstanding == 1 for b in backends)
+    assert all(b.outstanding == 0 for b in backends)
+
+
+def test_chat_fails_over_and_marks_the_backend_down():
+    session = FakeSession(refuse=['http://a/api/chat'])
+    router, backends = make_router(['http://a/api/chat', 'http://b/api/chat'], session)
+    # Backends are picked at random among the least loaded, so go on until a has been tried
+    for _ in range(50):
+        with router.chat({'model': 'm'}) as response:
+            assert response.url == 'http://b/api/chat'
+        if not backends[0].healthy:
+            break
+    assert not backends[0].healthy
+    assert backends[0].outstanding == 0
+
+
+def test_chat_raises_when_every_backend_refuses():
+    router, _ = make_router(['http://a/api/chat'], FakeSession(refuse=['http://a/api/chat']))
+    with pytest.raises(requests.exceptions.ConnectionError):
+        with router.chat({'model': 'm'}):
+            pass
+
+
+def test_no_backend_for_model():
+    router, backends = make_router(['http://a/api/chat'], FakeSession())
+    backends[0].models = {'other'}
+    with pytest.raises(NoBackendAvailable):
+        with router.chat({'model': 'm'}):
+            pass
+
+
+def test_waiting_for_a_backend_gives_up_at_the_deadline():
+    session = FakeSession()
+    router, _ = make_router(['http://a/api/chat'], session)
+    with router.chat({'model': 'm'}):
+        started = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            with router.chat({'model': 'm'}, deadline=time.monotonic() + 0.2):
+                pass
+        assert time.monotonic() - started < 2
+    assert len(session.posts) == 1
+
+
+def test_deadline_caps_the_read_timeout():
+    session = FakeSession()
+    router, _ = make_router(['http://a/api/chat'], session)
+    with router.chat({'model': 'm'}, deadline=time.monotonic() + 5):
+        pass
+    _, _, timeout = session.posts[0]
+    assert 0 < timeout[1] <= 5
+
+
+def test_waiter_gets_the_backend_when_it_frees_up():
+    router, _ = make_router(['http://a/api/chat'], FakeSession())
+    got = []
+
+    def second_call():
+        with router.chat({'model': 'm'}) as response:
+            got.append(response.url)
+
+    with router.chat({'model': 'm'}):
+        thread = threading.Thread(target=second_call)
+        thread.start()
+        time.sleep(0.1)
+        assert not got
+    thread.join(2)
+    assert got == ['http://a/api/chat']
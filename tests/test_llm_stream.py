@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from llm_stream import JsonObjectScanner, ThinkStreamFilter, extract_json_from_text, read_json_object, sse_event
+
+
+class FakeStream:
+    def __init__(self, pieces, done=True):
+        self.lines = [json.dumps({'message': {'content': piece}}).encode() for piece in pieces]
+        if done:
+            self.lines.append(json.dumps({'done': True, 'eval_count': 3}).encode())
+        self.read = 0
+
+    def iter_lines(self):
+        for line in self.lines:
+            self.read += 1
+            yield line
+
+
+def run_filter(pieces):
+    think_filter = ThinkStreamFilter()
+    events = [event for piece in pieces for event in think_filter.feed(piece)]
+    return events, think_filter.content()
+
+
+def test_thinking_is_held_back():
+    events, content = run_filter(['<thi', 'nk>hmm', '</th', 'ink>\n Hello', ' world'])
+    assert events == [('token', 'Hello'), ('token', ' world')]
+    assert content == 'Hello world'
+
+
+def test_late_close_tag_resets_what_was_shown():
+    events, content = run_filter(['Draft', ' text</think>', 'Final'])
+    assert events == [('token', 'Draft'), ('reset', ''), ('token', 'Final')]
+    assert content == 'Final'
+
+
+def test_plain_output_passes_straight_through():
+    events, content = run_filter(['Hello', ' there'])
+    assert events == [('token', 'Hello'), ('token', ' there')]
+    assert content == 'Hello there'
+
+
+def test_scanner_skips_prose_strings_and_broken_candidates():
+    scanner = JsonObjectScanner()
+    assert scanner.feed('Sure! ```json\n{"a": "}{", ') is None
+    assert scanner.feed('"b": {"c": 1}}') == '{"a": "}{", "b": {"c": 1}}'
+    scanner = JsonObjectScanner()
+    assert scanner.feed('{not json} then {"ok": true}') == '{"ok": true}'
+
+
+def test_read_json_object_stops_at_the_first_object():
+    response = FakeStream(['<think>x</think>', '{"title": ', '"T"}', ' and more', ' text'])
+    done = []
+    assert read_json_object(response, on_done=done.append) == ('{"title": "T"}', '{"title": "T"}')
+    assert response.read == 3
+    assert done == []
+
+
+def test_read_json_object_without_an_object():
+    done = []
+    assert read_json_object(FakeStream(['no', ' json']), on_done=done.append) == (None, 'no json')
+    assert done[0]['eval_count'] == 3
+
+
+def test_stream_errors_are_raised():
+    response = FakeStream([], done=False)
+    response.lines = [json.dumps({'error': 'model not found'}).encode()]
+    with pytest.raises(RuntimeError):
+        read_json_object(response)
+
+
+def test_sse_event():
+    assert sse_event('token', {'text': 'é'}) == 'event: token\ndata: {"text": "é"}\n\n'
+
+
+def test_extract_json_from_text():
+    assert extract_json_from_text('x ```json\n{"a": 1}\n``` y') == '{"a": 1}'
+    assert extract_json_from_text('answer: {"a": {"b": 2}} done') == '{"a": {"b": 2}}'
+    assert extract_json_from_text('list [1, [2]] end') == '[1, [2]]'
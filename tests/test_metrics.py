@@ -0,0 +1,55 @@
+import pytest
+
+from metrics import Registry
+
+
+def test_counter_renders_in_the_prometheus_text_format():
+    registry = Registry()
+    counter = registry.counter('jobs_total', 'Jobs run', ['status'])
+    counter.inc(status='ok')
+    counter.inc(2, status='ok')
+    counter.inc(status='a "quoted"\nvalue')
+    assert counter.value(status='ok') == 3
+    assert registry.render().splitlines() == [
+        '# HELP jobs_total Jobs run',
+        '# TYPE jobs_total counter',
+        'jobs_total{status="a \\"quoted\\"\\nvalue"} 1',
+        'jobs_total{status="ok"} 3',
+    ]
+
+
+def test_wrong_labels_are_refused():
+    counter = Registry().counter('jobs_total', 'Jobs run', ['status'])
+    with pytest.raises(ValueError):
+        counter.inc(kind='ok')
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 5):
+        histogram.observe(value, stage='fetch')
+    assert registry.render().splitlines()[2:] == [
+        'stage_seconds_bucket{stage="fetch",le="0.1"} 1',
+        'stage_seconds_bucket{stage="fetch",le="1"} 3',
+        'stage_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'stage_seconds_sum{stage="fetch"} 6.25',
+        'stage_seconds_count{stage="fetch"} 4',
+    ]
+
+
+def test_histogram_times_a_block():
+    histogram = Registry().histogram('stage_seconds', 'Stage time', ['stage'])
+    with pytest.raises(RuntimeError):
+        with histogram.time(stage='fetch'):
+            raise RuntimeError("still counted")
+    assert histogram._values[('fetch',)][2] == 1
+
+
+def test_gauge_reads_its_callback_and_hides_failures():
+    registry = Registry()
+    registry.gauge('queue_depth', 'Jobs waiting', lambda: 7)
+    registry.gauge('broken', 'Never rendered', lambda: 1 / 0)
+    assert registry.render().splitlines() == [
+        '# HELP queue_depth Jobs waiting', '# TYPE queue_depth gauge', 'queue_depth 7',
+    ]
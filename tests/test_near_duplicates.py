@@ -0,0 +1,76 @@
+import random
+
+from near_duplicates import NearDuplicateIndex, simhash
+
+WORDS = ('council budget transit tram bus line city vote residents parking plan service '
+         'station fare route week mayor report street district').split()
+
+
+def article(seed, length=200):
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def edited(text, every=40):
+    words = text.split()
+    for i in range(0, len(words), every):
+        words[i] = 'changed'
+    return ' '.join(words)
+
+
+def distance(a, b):
+    return bin(simhash(a) ^ simhash(b)).count('1')
+
+
+def test_simhash_keeps_similar_texts_close():
+    text = article(1)
+    assert simhash(text) == simhash(text.upper())
+    assert distance(text, edited(text, every=100)) < distance(text, article(2))
+
+
+def test_reworded_copy_is_found_and_unrelated_text_is_not(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'index.jsonl'), max_distance=6)
+    original = article(1, length=400)
+    copy = edited(original, every=400)
+    assert 0 < distance(original, copy) <= 6
+    index.add(original, 'https://a.example.com/story', {'content': 'Post about the story'})
+    match = index.find(copy)
+    assert match['url'] == 'https://a.example.com/story'
+    assert match['result'] == {'content': 'Post about the story'}
+    assert match['distance'] == distance(original, copy)
+    assert match['wordpress_url'] is None
+    assert index.find(article(2)) is None
+
+
+def test_short_texts_are_ignored(tmp_path):
+    index = NearDuplicateIndex(str(tmp_path / 'index.jsonl'), min_words=50)
+    index.add('too short', 'https://example.com', {'content': 'x'})
+    assert len(index) == 0
+    assert index.find('too short') is None
+
+
+def test_published_links_and_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'index.jsonl')
+    index = NearDuplicateIndex(path)
+    for seed in range(20):
+        index.add(article(seed), f'https://example.com/{seed}', {'content': f'post {seed}'})
+    index.mark_published('post 7', 'https://wp/p/7')
+    index.mark_published('never generated', 'https://wp/p/0')
+
+    reloaded = NearDuplicateIndex(path)
+    assert len(reloaded) == 20
+    match = reloaded.find(article(7))
+    assert match['url'] == 'https://example.com/7'
+    assert match['wordpress_url'] == 'https://wp/p/7'
+    assert reloaded.find(article(8))['wordpress_url'] is None
+
+
+def test_bad_lines_are_skipped_on_load(tmp_path):
+    path = tmp_path / 'index.jsonl'
+    index = NearDuplicateIndex(str(path))
+    index.add(article(1), 'https://example.com/1', {'content': 'post 1'})
+    with open(path, 'ab') as f:
+        f.write(b'{broken\n')
+    index = NearDuplicateIndex(str(path))
+    index.add(article(2), 'https://example.com/2', {'content': 'post 2'})
+    assert NearDuplicateIndex(str(path)).find(article(2))['url'] == 'https://example.com/2'
@@ -0,0 +1,59 @@
+import os
+
+from page_cache import PageCache, normalize_url
+from page_ingest import PageResult
+
+
+def make_page(url, size=10):
+    return PageResult(url=url, text='x' * size, image_url='https://example.com/i.png', title='T')
+
+
+def test_normalize_url_drops_tracking_and_default_ports():
+    assert normalize_url('HTTPS://Example.com:443/a?utm_source=x&b=2&a=1&fbclid=y#top') == 'https://example.com/a?a=1&b=2'
+    assert normalize_url('http://example.com:8080') == 'http://example.com:8080/'
+
+
+def test_round_trip_under_any_spelling_of_the_url(tmp_path):
+    cache = PageCache(str(tmp_path))
+    page = make_page('https://example.com/a')
+    cache.put('https://example.com/a?utm_medium=mail', page, etag='"v1"', last_modified='Mon, 01 Jan 2024 00:00:00 GMT')
+    entry = cache.get('https://EXAMPLE.com/a')
+    assert cache.to_page(entry) == page
+    assert cache.is_fresh(entry)
+    assert cache.conditional_headers(entry) == {
+        'If-None-Match': '"v1"',
+        'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT',
+    }
+
+
+def test_stale_entries_are_revalidated_by_touch(tmp_path):
+    cache = PageCache(str(tmp_path), ttl=60)
+    entry = cache.put('https://example.com/a', make_page('https://example.com/a'))
+    entry['fetched_at'] -= 120
+    assert not cache.is_fresh(entry)
+    cache.touch('https://example.com/a', entry)
+    assert cache.is_fresh(cache.get('https://example.com/a'))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache.put('https://example.com/a', make_page('https://example.com/a', size=300))
+    # Room for three entries of this size
+    cache.max_bytes = cache._total_bytes * 3
+    for name in 'bc':
+        cache.put(f'https://example.com/{name}', make_page(f'https://example.com/{name}', size=300))
+    cache.get('https://example.com/a')
+    cache.put('https://example.com/d', make_page('https://example.com/d', size=300))
+    assert cache.get('https://example.com/b') is None
+    assert cache.get('https://example.com/a') is not None
+    assert len(os.listdir(tmp_path)) == len(cache._index)
+
+
+def test_index_is_rebuilt_from_disk_and_corrupt_entries_dropped(tmp_path):
+    PageCache(str(tmp_path)).put('https://example.com/a', make_page('https://example.com/a'))
+    cache = PageCache(str(tmp_path))
+    assert cache.get('https://example.com/a') is not None
+    (path,) = tmp_path.iterdir()
+    path.write_text('{not json')
+    assert cache.get('https://example.com/a') is None
+    assert not path.exists()
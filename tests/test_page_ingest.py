@@ -0,0 +1,60 @@
+import pytest
+
+from page_ingest import PageReader, UnsupportedContent, check_content_type, parse_page, sniff_charset
+
+PAGE = """<html><head><title>Hello</title>
+<meta property="og:image" content="/img/cover.png">
+<link rel="canonical" href="https://example.com/post">
+</head><body><script>var x = 1;</script><p>Café text</p></body></html>"""
+
+
+def read(body, content_type='text/html', max_bytes=1 << 20, chunk=7):
+    reader = PageReader('https://example.com/a', content_type, max_bytes)
+    for start in range(0, len(body), chunk):
+        if not reader.feed(body[start:start + chunk]):
+            break
+    reader.close()
+    return reader
+
+
+def test_parse_page_pulls_out_text_and_metadata():
+    page = parse_page('https://example.com/a', PAGE)
+    assert page.title == "Hello"
+    assert page.image_url == "https://example.com/img/cover.png"
+    assert page.canonical_url == "https://example.com/post"
+    assert "Café text" in page.text
+    assert "var x" not in page.text
+
+
+def test_check_content_type_refuses_binaries():
+    assert check_content_type('text/html; charset=ISO-8859-1') == ('text/html', 'iso8859-1')
+    assert check_content_type(None) == ('', '')
+    with pytest.raises(UnsupportedContent):
+        check_content_type('application/octet-stream')
+
+
+def test_sniff_charset():
+    assert sniff_charset(b'\xef\xbb\xbf<html>') == 'utf-8-sig'
+    assert sniff_charset(b'<meta charset="windows-1252">') == 'cp1252'
+    assert sniff_charset('café'.encode('utf-8')) == 'utf-8'
+    assert sniff_charset('café'.encode('cp1252'), final=True) == 'cp1252'
+    # A multi-byte character cut off by the chunk boundary isn't evidence against utf-8
+    assert sniff_charset('café'.encode('utf-8')[:-1]) == 'utf-8'
+
+
+def test_reader_decodes_across_chunk_boundaries():
+    reader = read(PAGE.encode('utf-8'), chunk=3)
+    assert not reader.truncated
+    assert "Café text" in reader.page().text
+
+
+def test_reader_uses_the_header_charset():
+    reader = read(PAGE.encode('cp1252'), content_type='text/html; charset=windows-1252')
+    assert "Café text" in reader.page().text
+
+
+def test_reader_stops_at_max_bytes():
+    body = b'<html><body>' + b'word ' * 1000
+    reader = read(body, max_bytes=100)
+    assert reader.truncated
+    assert reader.received == 100
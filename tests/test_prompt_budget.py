@@ -0,0 +1,67 @@
+from prompt_budget import (
+    chunk_text, estimate_messages_tokens, estimate_tokens, fit_text, select_sentences, split_long, split_sentences,
+)
+
+ARTICLE = (
+    "The city council approved the new transit budget on Monday. "
+    "The budget adds three bus lines and extends tram service. "
+    "Council members debated the transit plan for six hours. "
+    "Some residents asked about parking. "
+    "The weather was sunny. "
+) * 8
+
+
+def test_estimates():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('abcdefg') == 2
+    assert estimate_messages_tokens([{'content': 'abcdefg'}, {'content': ''}]) == 10
+
+
+def test_split_long_prefers_whitespace_and_hard_cuts_unspaced_text():
+    assert split_long('one two three four', 9) == ['one two', 'three', 'four']
+    assert split_long('一二三四五六七', 3) == ['一二三', '四五六', '七']
+    assert all(len(piece) <= 9 for piece in split_sentences('Short. ' + 'word ' * 20, 9))
+
+
+def test_text_that_fits_is_untouched():
+    assert fit_text('A short article.', 100) == 'A short article.'
+    assert fit_text('anything', 0) == ''
+
+
+def test_selection_fits_the_budget_and_keeps_order():
+    selected = select_sentences(ARTICLE, 60)
+    assert estimate_tokens(selected) <= 60
+    assert selected.startswith("The city council approved")
+    sentences = split_sentences(ARTICLE)
+    positions = [sentences.index(sentence) for sentence in split_sentences(selected)]
+    assert positions == sorted(positions)
+
+
+def test_a_single_huge_sentence_still_fits():
+    text = 'x' * 10000
+    assert 0 < estimate_tokens(select_sentences(text, 50)) <= 50
+    assert 0 < estimate_tokens(fit_text('word ' * 5000, 50)) <= 50
+
+
+def test_chunks_cover_the_text():
+    chunks = chunk_text(ARTICLE, 40)
+    assert len(chunks) > 1
+    assert ' '.join(chunks) == ' '.join(split_sentences(ARTICLE))
+    assert all(estimate_tokens(chunk) <= 40 for chunk in chunks)
+
+
+def test_long_text_is_pre_summarized_chunk_by_chunk():
+    calls = []
+
+    def summarize_chunk(chunk, budget):
+        calls.append(budget)
+        return 'Summary.'
+
+    fitted = fit_text(ARTICLE * 4, 64, summarize_chunk=summarize_chunk)
+    assert calls and all(budget == 64 for budget in calls)
+    assert estimate_tokens(fitted) <= 64
+
+
+def test_failed_chunk_summaries_fall_back_to_selection():
+    fitted = fit_text(ARTICLE * 4, 200, summarize_chunk=lambda chunk, budget: None)
+    assert 0 < estimate_tokens(fitted) <= 200
@@ -0,0 +1,57 @@
+import threading
+import time
+
+from publish_log import PublishLog
+
+
+class Publisher:
+    def __init__(self, result=None, delay=0):
+        self.calls = 0
+        self.result = result
+        self.delay = delay
+
+    def __call__(self, content):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.result is not None:
+            return self.result
+        return {'id': self.calls, 'link': f'http://wp/p/{self.calls}'}
+
+
+def test_a_key_is_published_once_and_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'publish_log.json')
+    publisher = Publisher()
+    log = PublishLog(path)
+    post, existing = log.publish('k1', publisher, 'content')
+    assert (post['link'], existing) == ('http://wp/p/1', False)
+    assert log.publish('k1', publisher, 'content') == (post, True)
+    assert PublishLog(path).publish('k1', publisher, 'content') == (post, True)
+    assert publisher.calls == 1
+
+
+def test_concurrent_publishes_share_one_call(tmp_path):
+    publisher = Publisher(delay=0.05)
+    log = PublishLog(str(tmp_path / 'publish_log.json'))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(log.publish('k1', publisher, 'c'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert publisher.calls == 1
+    assert sorted(existing for _, existing in results) == [False, True, True, True]
+    assert len({post['link'] for post, _ in results}) == 1
+
+
+def test_failures_are_not_recorded(tmp_path):
+    log = PublishLog(str(tmp_path / 'publish_log.json'))
+    assert log.publish('k1', Publisher(result={}), 'c') == (None, False)
+    assert log.get('k1') is None
+    post, existing = log.publish('k1', Publisher(), 'c')
+    assert post['link'] == 'http://wp/p/1' and not existing
+
+
+def test_corrupt_log_starts_empty(tmp_path):
+    path = tmp_path / 'publish_log.json'
+    path.write_text('{broken')
+    assert PublishLog(str(path)).get('k1') is None
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import AsyncSingleFlight, SingleFlight, StreamFlight
+
+
+def run_together(count, fn):
+    results = [None] * count
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, fn())) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'answer'
+
+    results = run_together(4, lambda: flights.do('key', slow))
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert {result for result, _ in results} == {'answer'}
+    assert flights.in_flight() == 0
+
+
+def test_single_flight_shares_the_exception():
+    flights = SingleFlight()
+    errors = []
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError('boom')
+
+    def call():
+        try:
+            flights.do('key', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    run_together(3, call)
+    assert len(errors) == 3
+    # Nothing is cached, the next call runs again
+    assert flights.do('key', lambda: 'fresh') == ('fresh', False)
+
+
+def test_async_single_flight_survives_a_cancelled_waiter():
+    async def main():
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def slow():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return 'answer'
+
+        leader = asyncio.ensure_future(flights.do('key', slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flights.do('key', slow))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        assert await leader == ('answer', False)
+        assert len(calls) == 1
+
+    asyncio.run(main())
+
+
+def counting_stream(count, produced, closed, delay=0.02):
+    try:
+        for i in range(count):
+            produced.append(i)
+            yield i
+            time.sleep(delay)
+    finally:
+        closed.set()
+
+
+def test_stream_flight_replays_for_late_subscribers():
+    flights = StreamFlight()
+    produced, closed = [], threading.Event()
+    first, shared = flights.subscribe('key', counting_stream, 10, produced, closed)
+    assert not shared
+    assert next(first) == 0
+    second, shared = flights.subscribe('key', counting_stream, 10, produced, closed)
+    assert shared
+    assert list(second) == list(range(10))
+    assert list(first) == list(range(1, 10))
+    assert len(produced) == 10
+    assert flights.in_flight() == 0
+
+
+def test_stream_flight_stops_when_every_subscriber_disconnects():
+    flights = StreamFlight()
+    produced, closed = [], threading.Event()
+    stream, _ = flights.subscribe('key', counting_stream, 20, produced, closed, 0.05)
+    assert [next(stream), next(stream)] == [0, 1]
+    stream.close()
+    # The generator is closed at its next item, not run to the end
+    assert closed.wait(2)
+    assert len(produced) < 20
+    assert flights.in_flight() == 0
+
+
+def test_stream_flight_keeps_going_while_someone_listens():
+    flights = StreamFlight()
+    produced, closed = [], threading.Event()
+    first, _ = flights.subscribe('key', counting_stream, 10, produced, closed)
+    second, _ = flights.subscribe('key', counting_stream, 10, produced, closed)
+    next(first)
+    first.close()
+    assert list(second) == list(range(10))
+
+
+def test_stream_flight_passes_errors_on():
+    def failing():
+        yield 'first'
+        raise RuntimeError('boom')
+
+    stream, _ = StreamFlight().subscribe('key', failing)
+    assert next(stream) == 'first'
+    with pytest.raises(RuntimeError):
+        next(stream)
@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from stage_graph import StageGraph, deadline_scope, stage_deadline
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        yield pool
+
+
+def test_stages_get_their_dependencies_and_independent_ones_overlap(executor):
+    both_started = threading.Barrier(2, timeout=1)
+
+    def fetch():
+        return 'page'
+
+    def image(fetch):
+        both_started.wait()
+        return fetch + ':image'
+
+    def dedupe(fetch):
+        both_started.wait()
+        return None
+
+    graph = StageGraph(executor)
+    graph.add('fetch', fetch)
+    graph.add('image', image, deps=['fetch'])
+    graph.add('dedupe', dedupe, deps=['fetch'])
+    graph.add('generate', lambda fetch, dedupe: f'post about {fetch}', deps=['fetch', 'dedupe'])
+    results, timings = graph.run()
+    assert results == {'fetch': 'page', 'image': 'page:image', 'dedupe': None, 'generate': 'post about page'}
+    assert {timing['status'] for timing in timings.values()} == {'ok'}
+
+
+def test_failed_and_slow_stages_fall_back(executor):
+    release = threading.Event()
+
+    def broken():
+        raise ValueError("boom")
+
+    graph = StageGraph(executor)
+    graph.add('broken', broken, fallback='default')
+    graph.add('slow', lambda: release.wait(2), timeout=0.05, fallback='late')
+    graph.add('after', lambda slow: slow + '!', deps=['slow'])
+    started = time.monotonic()
+    results, timings = graph.run()
+    release.set()
+    assert time.monotonic() - started < 1
+    assert results == {'broken': 'default', 'slow': 'late', 'after': 'late!'}
+    assert timings['broken']['status'] == 'error'
+    assert timings['slow']['status'] == 'timeout'
+
+
+def test_stage_sees_its_deadline(executor):
+    seen = {}
+
+    def stage():
+        seen['deadline'] = stage_deadline()
+
+    graph = StageGraph(executor)
+    graph.add('timed', stage, timeout=5)
+    before = time.monotonic()
+    graph.run()
+    assert before + 4.9 < seen['deadline'] <= time.monotonic() + 5
+    assert stage_deadline() is None
+
+
+def test_stage_queued_past_its_deadline_is_not_run():
+    ran = []
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        busy = pool.submit(time.sleep, 0.1)
+        graph = StageGraph(pool)
+        graph.add('late', lambda: ran.append(True), timeout=0.02, fallback='skipped')
+        results, _ = graph.run()
+        busy.result()
+    assert results == {'late': 'skipped'}
+    assert ran == []
+
+
+def test_before_stage_can_abort_the_run(executor):
+    graph = StageGraph(executor)
+    graph.add('first', lambda: 1)
+    graph.add('second', lambda first: 2, deps=['first'])
+    seen = []
+
+    def before_stage(name):
+        seen.append(name)
+        if name == 'second':
+            raise RuntimeError("cancelled")
+
+    with pytest.raises(RuntimeError):
+        graph.run(before_stage=before_stage)
+    assert seen == ['first', 'second']
+
+
+def test_unknown_dependency_is_refused(executor):
+    with pytest.raises(ValueError):
+        StageGraph(executor).add('generate', lambda fetch: None, deps=['fetch'])
+
+
+def test_deadline_scope_restores_the_outer_deadline():
+    with deadline_scope(10.0):
+        with deadline_scope(5.0):
+            assert stage_deadline() == 5.0
+        assert stage_deadline() == 10.0
+    assert stage_deadline() is None
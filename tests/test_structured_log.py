@@ -0,0 +1,24 @@
+import json
+import logging
+
+from structured_log import JsonFormatter, KeyValueFormatter
+
+
+def make_record(**extra):
+    record = logging.LogRecord('blog', logging.WARNING, __file__, 1, 'Skipping %s', ('fetch',), None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_log_lines_carry_extra_fields():
+    entry = json.loads(JsonFormatter().format(make_record(url='http://x', timings={'fetch': 1})))
+    assert entry['level'] == 'warning'
+    assert entry['logger'] == 'blog'
+    assert entry['msg'] == 'Skipping fetch'
+    assert entry['url'] == 'http://x'
+    assert entry['timings'] == {'fetch': 1}
+
+
+def test_text_log_lines_append_extra_fields():
+    line = KeyValueFormatter().format(make_record(url='http://x'))
+    assert line.endswith("WARNING blog: Skipping fetch url='http://x'")
@@ -0,0 +1,29 @@
+from summary_cache import SummaryCache
+
+
+def test_key_depends_on_model_content_and_options():
+    key = SummaryCache.make_key('m', 'text', {'temperature': 0.2, 'top_p': 0.9})
+    assert key == SummaryCache.make_key('m', 'text', {'top_p': 0.9, 'temperature': 0.2})
+    assert key != SummaryCache.make_key('other', 'text', {'temperature': 0.2, 'top_p': 0.9})
+    assert key != SummaryCache.make_key('m', 'text!', {'temperature': 0.2, 'top_p': 0.9})
+    assert key != SummaryCache.make_key('m', 'text', {'temperature': 0.7, 'top_p': 0.9})
+
+
+def test_least_recently_used_entry_is_dropped():
+    cache = SummaryCache(max_entries=2)
+    cache.put('a', '{"a": 1}')
+    cache.put('b', '{"b": 1}')
+    assert cache.get('a') == '{"a": 1}'
+    cache.put('c', '{"c": 1}')
+    assert cache.get('b') is None
+    assert cache.get('a') == '{"a": 1}'
+    assert cache.get('c') == '{"c": 1}'
+
+
+def test_unused_fields_are_handed_out_once():
+    cache = SummaryCache()
+    cache.put('a', '{"title": "T", "category": "C"}', unused=['category'])
+    assert cache.take_unused('a', 'title') is None
+    assert cache.take_unused('a', 'category') == '{"title": "T", "category": "C"}'
+    assert cache.take_unused('a', 'category') is None
+    assert cache.take_unused('missing', 'category') is None